@@ -0,0 +1,272 @@
+"""Compile-only benchmarks for the bundled examples and for synthetic scaled workflows.
+
+Run from the root directory of the repository (i.e. where cwl_dirs.txt and yml_dirs.txt are):
+
+    python benchmarks/compile_benchmarks.py --save benchmarks/baseline.json
+    (make some changes)
+    python benchmarks/compile_benchmarks.py --baseline benchmarks/baseline.json
+
+For each workflow, this records the (best) compile time, the total number of
+speculative compilation iterations (i.e. 1 + the number of automatically
+inserted file format conversions, summed over all subworkflows), and the peak
+traced memory allocations during compilation. When comparing against a baseline,
+the exit code is nonzero if there are any regressions.
+"""
+import argparse
+import contextlib
+import io
+import json
+from pathlib import Path
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import networkx as nx
+import yaml
+
+import wic.ast
+import wic.compiler
+import wic.inference
+import wic.main
+import wic.utils
+import wic.utils_yaml
+from wic import profiler
+from wic.schemas import wic_schema
+from wic.wic_types import GraphData, GraphReps, Json, StepId, Tool, Tools, Yaml, YamlTree
+
+# (N steps per leaf workflow, depth D of subworkflows, fan-out F subworkflows per workflow)
+SYNTHETIC_SIZES = [(10, 0, 1), (100, 0, 1), (300, 0, 1), (5, 2, 3), (5, 3, 4), (3, 5, 2)]
+
+
+def synthetic_tool(stem: str, in_format: str, out_format: str) -> Tool:
+    """Creates a (fake) CWL CommandLineTool which reads one file and writes one file.
+
+    Args:
+        stem (str): The name of the tool
+        in_format (str): The edam format of the input file
+        out_format (str): The edam format of the output file
+
+    Returns:
+        Tool: The CWL CommandLineTool
+    """
+    cwl = {'cwlVersion': 'v1.0',
+           'class': 'CommandLineTool',
+           'baseCommand': 'cp',
+           'inputs': {'input_path': {'type': 'File', 'format': [in_format], 'inputBinding': {'position': 1}},
+                      'output_path': {'type': 'string', 'default': f'{stem}.out', 'inputBinding': {'position': 2}}},
+           'outputs': {'output_path': {'type': 'File', 'format': out_format,
+                                       'outputBinding': {'glob': '$(inputs.output_path)'}}},
+           '$namespaces': {'edam': 'https://edamontology.org/'},
+           'stdout': f'{stem}.out',
+           'stderr': f'{stem}.err'}
+    return Tool(f'{stem}.cwl', cwl)
+
+
+def synthetic_workflows(yml_dir: Path, n: int, depth: int, fanout: int) -> Tuple[Tools, Dict[str, Path], str]:
+    """Writes a synthetic workflow with the given size (and its subworkflows) to yml_dir.\n
+    The leaf workflows consist of n steps, the last of which requires a file format conversion.
+    Every other workflow consists of fanout copies of the next workflow (i.e. depth - 1).
+
+    Args:
+        yml_dir (Path): The directory in which to write the yml files
+        n (int): The number of steps in each leaf workflow
+        depth (int): The depth of the subworkflows
+        fanout (int): The number of subworkflows in each (non-leaf) workflow
+
+    Returns:
+        Tuple[Tools, Dict[str, Path], str]: The tools, the yml paths, and the stem of the root workflow.
+    """
+    pdb = 'edam:format_1476'
+    gro = 'edam:format_2033'
+    tools = {StepId('bench_a', 'global'): synthetic_tool('bench_a', pdb, pdb),
+             StepId('bench_b', 'global'): synthetic_tool('bench_b', gro, gro),
+             StepId('conversion_bench_a_b', 'global'): synthetic_tool('conversion_bench_a_b', pdb, gro)}
+    name = f'synth_n{n}_d{depth}_f{fanout}'
+    yml_paths = {}
+    for level in range(depth + 1):
+        stem = f'{name}_level{level}'
+        if level == 0:
+            steps = [{'bench_a': None} for _ in range(n - 1)] + [{'bench_b': None}]
+        else:
+            steps = [{f'{name}_level{level - 1}.yml': None} for _ in range(fanout)]
+        yml_paths[stem] = yml_dir / f'{stem}.yml'
+        with open(yml_paths[stem], mode='w', encoding='utf-8') as f:
+            f.write(yaml.dump({'steps': steps}, sort_keys=False))
+    return (tools, yml_paths, f'{name}_level{depth}')
+
+
+def compile_once(yaml_tree: YamlTree, tools: Tools) -> None:
+    """Compiles the given workflow, discarding the results.
+
+    Args:
+        yaml_tree (YamlTree): The (merged) AST of the workflow
+        tools (Tools): The CWL CommandLineTool definitions
+    """
+    stem = Path(yaml_tree.step_id.stem).stem
+    graph = GraphReps(nx.DiGraph(), GraphData(stem))
+    with contextlib.redirect_stdout(io.StringIO()):
+        wic.compiler.compile_workflow(yaml_tree, wic_schema.get_args(stem), [], [graph], {}, {}, {}, {},
+                                      tools, True, relative_run_path=True, testing=True)
+
+
+def benchmark_workflow(yml_stem: str, yml_path: Path, tools: Tools,
+                       yml_paths: Dict[str, Dict[str, Path]], repeat: int) -> Json:
+    """Benchmarks compiling the given workflow (only, i.e. excluding parsing, running, etc).
+
+    Args:
+        yml_stem (str): The name of the workflow
+        yml_path (Path): The path to the yml file
+        tools (Tools): The CWL CommandLineTool definitions
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions
+        repeat (int): The number of times to compile the workflow. The minimum time is recorded.
+
+    Returns:
+        Json: The compile time, number of iterations, and peak memory allocations, or the error.
+    """
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            yml_stems = wic.utils.flatten([list(p) for p in yml_paths.values()])
+            validator = wic_schema.get_validator(tools, yml_stems, {})
+            root_yaml_tree: Yaml = wic.utils_yaml.load_file(yml_path)
+            y_t = YamlTree(StepId(yml_stem + '.yml', 'global'), root_yaml_tree)
+            yaml_tree_raw = wic.ast.read_ast_from_disk(y_t, yml_paths, tools, validator)
+            yaml_tree = wic.ast.merge_yml_trees(yaml_tree_raw, {}, tools)
+
+        times = []
+        for _ in range(repeat):
+            time_start = time.perf_counter()
+            compile_once(yaml_tree, tools)
+            times.append(time.perf_counter() - time_start)
+
+        # Use a separate (profiled) compilation to get the memory and iterations,
+        # because tracing the memory allocations inflates the compile time.
+        profiler.start()
+        try:
+            with profiler.phase('compile'):
+                compile_once(yaml_tree, tools)
+            stats = dict(profiler.stats)
+        finally:
+            profiler.stop()
+        iterations = sum(phase_stats.annotations.get('iterations', 0) for phase_stats in stats.values())
+        return {'compile_time_s': round(min(times), 6),
+                'iterations': iterations,
+                'peak_alloc_bytes': stats['compile'].alloc_peak}
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def run_benchmarks(examples: bool, synthetic: bool, only: List[str], repeat: int) -> Dict[str, Json]:
+    """Benchmarks the examples (see yml_dirs.txt) and / or the synthetic workflows.
+
+    Args:
+        examples (bool): Benchmark the examples
+        synthetic (bool): Benchmark the synthetic workflows (see SYNTHETIC_SIZES)
+        only (List[str]): If not empty, only benchmark the workflows with these names.
+        repeat (int): The number of times to compile each workflow.
+
+    Returns:
+        Dict[str, Json]: The results for each workflow
+    """
+    results: Dict[str, Json] = {}
+    # NOTE: Otherwise, file format conversions cannot be inserted.
+    wic.compiler.inference_rules.set(dict(wic.utils.read_lines_pairs(Path('inference_rules.txt'))))
+    wic.inference.renaming_conventions.set(wic.utils.read_lines_pairs(Path('renaming_conventions.txt')))
+    if examples:
+        with contextlib.redirect_stdout(io.StringIO()):
+            tools_cwl = wic.main.get_tools_cwl(Path('cwl_dirs.txt'))
+            yml_paths = wic.main.get_yml_paths(Path('yml_dirs.txt'))
+        for yml_namespace, yml_paths_dict in yml_paths.items():
+            for yml_stem, yml_path in sorted(yml_paths_dict.items()):
+                if only and yml_stem not in only:
+                    continue
+                results[yml_stem] = benchmark_workflow(yml_stem, yml_path, tools_cwl, yml_paths, repeat)
+                print(yml_stem, results[yml_stem], flush=True)
+
+    if synthetic:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for (n, depth, fanout) in SYNTHETIC_SIZES:
+                (tools, yml_paths_synth, root_stem) = synthetic_workflows(Path(tmpdir), n, depth, fanout)
+                if only and root_stem not in only:
+                    continue
+                yml_paths_ = {'global': yml_paths_synth}
+                results[root_stem] = benchmark_workflow(root_stem, yml_paths_synth[root_stem], tools,
+                                                        yml_paths_, repeat)
+                print(root_stem, results[root_stem], flush=True)
+    return results
+
+
+def compare_to_baseline(results: Dict[str, Json], baseline: Dict[str, Json],
+                        tolerance: float, min_time: float) -> List[str]:
+    """Compares the results to a previously saved baseline.
+
+    Args:
+        results (Dict[str, Json]): The results for each workflow
+        baseline (Dict[str, Json]): The baseline results for each workflow
+        tolerance (float): The allowed relative increase in the compile time and peak memory
+        min_time (float): Increases in the compile time (in seconds) less than this are considered noise.
+
+    Returns:
+        List[str]: A description of each regression (if any)
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if 'error' in result or 'error' in base:
+            if 'error' in result and 'error' not in base:
+                regressions.append(f"{name}: now fails with {result['error']}")
+            continue
+        time_new, time_base = result['compile_time_s'], base['compile_time_s']
+        if time_new > time_base * (1 + tolerance) and time_new - time_base > min_time:
+            regressions.append(f'{name}: compile time {time_base:.4f}s -> {time_new:.4f}s')
+        if result['iterations'] != base['iterations']:
+            regressions.append(f"{name}: iterations {base['iterations']} -> {result['iterations']}")
+        alloc_new, alloc_base = result['peak_alloc_bytes'], base['peak_alloc_bytes']
+        if alloc_new > alloc_base * (1 + tolerance):
+            regressions.append(f'{name}: peak allocations {alloc_base} -> {alloc_new} bytes')
+    return regressions
+
+
+def main() -> None:
+    """See the module docstring"""
+    parser = argparse.ArgumentParser(prog='compile_benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--no_examples', default=False, action="store_true",
+                        help='Do not benchmark the examples (i.e. in yml_dirs.txt)')
+    parser.add_argument('--no_synthetic', default=False, action="store_true",
+                        help='Do not benchmark the synthetic scaled workflows')
+    parser.add_argument('--only', type=str, nargs='*', default=[],
+                        help='Only benchmark the workflows with these names.')
+    parser.add_argument('--repeat', type=int, required=False, default=3,
+                        help='The number of times to compile each workflow. The minimum time is recorded.')
+    parser.add_argument('--save', type=str, required=False, default='',
+                        help='Save the results (i.e. as a new baseline) to this json file.')
+    parser.add_argument('--baseline', type=str, required=False, default='',
+                        help='Compare the results against this json file, and exit with code 1 on regressions.')
+    parser.add_argument('--tolerance', type=float, required=False, default=0.2,
+                        help='The allowed relative increase in compile time and peak memory.')
+    parser.add_argument('--min_time', type=float, required=False, default=0.01,
+                        help='Increases in compile time (in seconds) less than this are considered noise.')
+    args = parser.parse_args()
+
+    results = run_benchmarks(not args.no_examples, not args.no_synthetic, args.only, args.repeat)
+
+    if args.save:
+        with open(args.save, mode='w', encoding='utf-8') as f:
+            f.write(json.dumps(results, indent=2, sort_keys=True))
+
+    if args.baseline:
+        with open(args.baseline, mode='r', encoding='utf-8') as f:
+            baseline = json.loads(f.read())
+        regressions = compare_to_baseline(results, baseline, args.tolerance, args.min_time)
+        for regression in regressions:
+            print('Regression!', regression)
+        if regressions:
+            sys.exit(1)
+        print(f'No regressions w.r.t. {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Benchmarks validating yml workflows against the main schema with large numbers of (synthetic) tools.
+
+Run from the root directory of the repository:
+
+    python benchmarks/validation_benchmarks.py
+    python benchmarks/validation_benchmarks.py --sizes 100 1000 --steps 50
+
+For each number of tools, this compares the time to validate a workflow using
+the anyOf over all of the tools (i.e. as in wic.json) with the time using the
+validator returned by get_validator(), which dispatches each step on its name.
+"""
+import argparse
+import time
+
+from jsonschema import Draft202012Validator, RefResolver
+
+from wic.schemas import wic_schema
+from wic.wic_types import Json, StepId, Tools, Yaml
+
+from compile_benchmarks import synthetic_tool
+
+
+def synthetic_tools(num_tools: int) -> Tools:
+    """Creates the given number of (fake) CWL CommandLineTools.
+
+    Args:
+        num_tools (int): The number of tools
+
+    Returns:
+        Tools: The CWL CommandLineTool definitions
+    """
+    pdb = 'edam:format_1476'
+    return {StepId(f'bench_{i}', 'global'): synthetic_tool(f'bench_{i}', pdb, pdb) for i in range(num_tools)}
+
+
+def synthetic_workflow(num_tools: int, num_steps: int) -> Yaml:
+    """Creates a yml workflow which uses tools spread evenly throughout the given tools.
+
+    Args:
+        num_tools (int): The number of tools
+        num_steps (int): The number of steps in the workflow
+
+    Returns:
+        Yaml: The yml workflow
+    """
+    steps = [{f'bench_{(i * num_tools) // num_steps}': {'in': {'input_path': f'input_{i}.pdb'}}}
+             for i in range(num_steps)]
+    return {'steps': steps}
+
+
+def best_time(validator: Draft202012Validator, yml: Yaml, repeat: int) -> float:
+    """Validates the given workflow repeatedly and records the minimum time.
+
+    Args:
+        validator (Draft202012Validator): The validator
+        yml (Yaml): The yml workflow
+        repeat (int): The number of times to validate the workflow
+
+    Returns:
+        float: The minimum time (in seconds)
+    """
+    times = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        validator.validate(yml)
+        times.append(time.perf_counter() - time_start)
+    return min(times)
+
+
+def main() -> None:
+    """See the module docstring"""
+    parser = argparse.ArgumentParser(prog='validation_benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='*', default=[100, 1000, 10000],
+                        help='The numbers of synthetic tools')
+    parser.add_argument('--steps', type=int, required=False, default=20,
+                        help='The number of steps in the workflow which is validated.')
+    parser.add_argument('--max_anyof', type=int, required=False, default=1000,
+                        help='Skip the anyOf validator for more than this many tools (it is very slow).')
+    parser.add_argument('--repeat', type=int, required=False, default=3,
+                        help='The number of times to validate the workflow. The minimum time is recorded.')
+    args = parser.parse_args()
+
+    for num_tools in args.sizes:
+        tools = synthetic_tools(num_tools)
+        yml = synthetic_workflow(num_tools, args.steps)
+        schema_store: Json = {}
+        # NOTE: check_schema() is skipped; it is slow with many tools and it
+        # is cached by get_validator() anyway.
+        wic_schema.assemble_schema_store(tools, [], schema_store)
+        schema = schema_store['wic_main']
+        validator_anyof = Draft202012Validator(schema, resolver=RefResolver.from_schema(schema, store=schema_store))
+        validator_dispatch = wic_schema.get_validator_from_schema_store(schema_store)
+
+        time_dispatch = best_time(validator_dispatch, yml, args.repeat)
+        if num_tools > args.max_anyof:
+            print(f'{num_tools} tools, {args.steps} steps  anyOf (skipped)  dispatch {time_dispatch:.4f}s',
+                  flush=True)
+            continue
+        time_anyof = best_time(validator_anyof, yml, args.repeat)
+        print(f'{num_tools} tools, {args.steps} steps  anyOf {time_anyof:.4f}s  dispatch {time_dispatch:.4f}s  '
+              f'speedup {time_anyof / time_dispatch:.1f}x', flush=True)
+
+
+if __name__ == '__main__':
+    main()
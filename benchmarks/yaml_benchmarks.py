@@ -0,0 +1,123 @@
+"""Microbenchmarks for parsing and dumping yaml, i.e. the pure-Python vs libyaml
+loaders and dumpers, and the per-process parse cache in wic.utils_yaml.load_file()
+
+Run from the root directory of the repository (i.e. where the biobb adapters are cloned):
+
+    python benchmarks/yaml_benchmarks.py
+    python benchmarks/yaml_benchmarks.py --dirs cwl_adapters/ examples/
+
+By default, this parses every cwl file in the biobb adapter tree. This also
+checks that the pure-Python and libyaml implementations produce the same
+parsed documents, and that the dumped yml files round-trip.
+"""
+import argparse
+import glob
+from pathlib import Path
+import sys
+import time
+from typing import Any, Callable, List, Tuple
+
+import yaml
+
+import wic.utils_yaml
+
+
+class PyNoAliasDumper(yaml.SafeDumper):
+    """The pure-Python equivalent of wic.utils_yaml.NoAliasDumper"""
+    def ignore_aliases(self, data: Any) -> bool:
+        return True
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """Calls func repeatedly and records the minimum time.
+
+    Args:
+        func (Callable[[], Any]): The function to be timed
+        repeat (int): The number of times to call func
+
+    Returns:
+        Tuple[float, Any]: The minimum time (in seconds) and the return value of func
+    """
+    times = []
+    result = None
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - time_start)
+    return (min(times), result)
+
+
+def find_files(dirs: List[str]) -> List[Path]:
+    """Finds all of the cwl and yml files within any subdirectory of the given directories.
+
+    Args:
+        dirs (List[str]): The directories in which to search
+
+    Returns:
+        List[Path]: The cwl and yml files
+    """
+    paths = []
+    for dir_ in dirs:
+        if not Path(dir_).exists():
+            print(f'Warning! {dir_} does not exist. Skipping.')
+            continue
+        for ext in ['cwl', 'yml']:
+            paths += [Path(p) for p in sorted(glob.glob(str(Path(dir_) / f'**/*.{ext}'), recursive=True))]
+    return paths
+
+
+def main() -> None:
+    """See the module docstring"""
+    parser = argparse.ArgumentParser(prog='yaml_benchmarks', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--dirs', type=str, nargs='*', default=['biobb/biobb_adapters/'],
+                        help='The directories in which to search for cwl and yml files.')
+    parser.add_argument('--repeat', type=int, required=False, default=3,
+                        help='The number of times to run each benchmark. The minimum time is recorded.')
+    args = parser.parse_args()
+
+    paths = find_files(args.dirs)
+    texts = []
+    for path in paths:
+        with open(path, mode='r', encoding='utf-8') as f:
+            texts.append(f.read())
+    # Like get_tools_cwl(), ignore the (legacy) files which cannot be parsed.
+    parseable = []
+    for path, text in zip(paths, texts):
+        try:
+            yaml.load(text, Loader=yaml.SafeLoader)
+            parseable.append((path, text))
+        except yaml.YAMLError:
+            print(f'Warning! Cannot parse {path}. Skipping.')
+    if not parseable:
+        print('Error! No cwl or yml files found.')
+        sys.exit(1)
+    print(f'{len(parseable)} files, {sum(len(text) for _, text in parseable)} bytes')
+    print(f'libyaml available: {wic.utils_yaml.SafeLoader is not yaml.SafeLoader}')
+
+    (time_py, docs_py) = best_time(lambda: [yaml.load(text, Loader=yaml.SafeLoader) for _, text in parseable],
+                                   args.repeat)
+    (time_c, docs_c) = best_time(lambda: [wic.utils_yaml.safe_load(text) for _, text in parseable], args.repeat)
+    assert docs_py == docs_c
+    print(f'load  pure-Python {time_py:.4f}s  wic.utils_yaml {time_c:.4f}s  speedup {time_py / time_c:.1f}x')
+
+    kwargs = {'sort_keys': False, 'line_break': '\n', 'indent': 2}
+    (time_py, dumps_py) = best_time(lambda: [yaml.dump(doc, Dumper=PyNoAliasDumper, **kwargs) for doc in docs_py],
+                                    args.repeat)
+    (time_c, dumps_c) = best_time(lambda: [wic.utils_yaml.dump(doc, Dumper=wic.utils_yaml.NoAliasDumper, **kwargs)
+                                           for doc in docs_py], args.repeat)
+    # NOTE: libyaml folds long double-quoted strings differently, so only compare the parsed documents.
+    assert [wic.utils_yaml.safe_load(dump) for dump in dumps_c] == docs_py
+    print(f'dump  pure-Python {time_py:.4f}s  wic.utils_yaml {time_c:.4f}s  speedup {time_py / time_c:.1f}x')
+
+    # The first call populates the cache; the remaining calls only copy the cached documents.
+    (time_uncached, _) = best_time(lambda: [wic.utils_yaml.load_file(path, use_cache=False)
+                                            for path, _ in parseable], args.repeat)
+    (time_cached, _) = best_time(lambda: [wic.utils_yaml.load_file(path) for path, _ in parseable],
+                                 args.repeat + 1)
+    print(f'load_file  uncached {time_uncached:.4f}s  cached {time_cached:.4f}s  '
+          f'speedup {time_uncached / time_cached:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
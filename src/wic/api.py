@@ -0,0 +1,136 @@
+import argparse
+import contextvars
+from pathlib import Path
+import threading
+from typing import Any, Dict, Optional, Union
+
+from jsonschema import Draft202012Validator
+import networkx as nx
+
+from . import ast, cli, compiler, inference, main, speculation, utils, utils_yaml
+from .schemas import wic_schema
+from .wic_types import GraphData, GraphReps, RoseTree, StepId, Tools, Yaml, YamlTree
+
+
+class Compiler:
+    """Compiles yml workflows in-process, i.e. without using the command line
+    interface (sys.argv) or mutating any global variables.\n
+    Each Compiler holds its own configuration, tools, yml paths, inference
+    rules, file format conversions index, and validator, which are loaded
+    once. compile() is reentrant and thread-safe, so a single Compiler can
+    compile many workflows concurrently.
+
+    Example:
+        wic_compiler = Compiler(inference_use_naming_conventions=True)
+        rose_tree = wic_compiler.compile(Path('docs/tutorials/helloworld.yml'))
+        utils.write_to_disk(rose_tree, Path('autogenerated/'), relative_run_path=True)
+    """
+
+    def __init__(self, tools_cwl: Optional[Tools] = None,
+                 yml_paths: Optional[Dict[str, Dict[str, Path]]] = None, **options: Any) -> None:
+        """Loads the tools, yml paths, inference rules, and validator, and indexes the file format conversions.\n
+        NOTE: Like the command line interface, the configuration files (i.e.
+        cwl_dirs.txt, inference_rules.txt) are w.r.t. the current working directory.
+
+        Args:
+            tools_cwl (Optional[Tools]): The CWL CommandLineTool definitions. By default, use get_tools_cwl()
+            yml_paths (Optional[Dict[str, Dict[str, Path]]]): The yml workflow definitions.\n
+            By default, use get_yml_paths()
+            options (Any): Any of the command line arguments, i.e. inference_max_conversion_steps=2
+
+        Raises:
+            ValueError: If any of the options are not command line arguments.
+        """
+        self.args = cli.get_args()
+        for key, val in options.items():
+            if not hasattr(self.args, key):
+                raise ValueError(f'Error! Unknown option {key}')
+            setattr(self.args, key, val)
+
+        utils.copy_config_files()
+        if tools_cwl is None:
+            tools_cwl = main.get_tools_cwl(Path(self.args.cwl_dirs_file), not self.args.no_tools_cache)
+        if yml_paths is None:
+            yml_paths = main.get_yml_paths(Path(self.args.yml_dirs_file))
+        self.tools_cwl = tools_cwl
+        self.yml_paths = yml_paths
+        self.inference_rules = dict(utils.read_lines_pairs(Path('inference_rules.txt')))
+        self.renaming_conventions = utils.read_lines_pairs(Path('renaming_conventions.txt'))
+        yml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+        self.validator = wic_schema.get_validator(tools_cwl, yml_stems, {}, use_cache=not self.args.no_schema_cache)
+        # NOTE: Each compilation uses a copy of tools_cwl (see compile()), so build the index once here.
+        self.conversions_index = inference.get_conversions_index(tools_cwl)
+        # Each thread uses its own copy of the validator. See wic_schema.copy_validator()
+        self.thread_local = threading.local()
+
+    def get_validator(self) -> Draft202012Validator:
+        """Returns the validator for the current thread.
+
+        Returns:
+            Draft202012Validator: Used to validate the yml files against the autogenerated schema.
+        """
+        if not hasattr(self.thread_local, 'validator'):
+            self.thread_local.validator = wic_schema.copy_validator(self.validator)
+        validator: Draft202012Validator = self.thread_local.validator
+        return validator
+
+    def compile(self, yml: Union[Path, str, Yaml], yaml_path: str = 'workflow.yml') -> RoseTree:
+        """Compiles a root workflow (and all of its subworkflows).
+
+        Args:
+            yml (Union[Path, str, Yaml]): The path to the root workflow yml file, or its (parsed) contents.
+            yaml_path (str): The path of the root workflow, if yml is its contents. The name of the\n
+            compiled CWL file and any relative paths in the workflow (i.e. python_script) are based on this.
+
+        Returns:
+            RoseTree: The compiled root workflow and all of its subworkflows.\n
+            Use utils.write_to_disk() to write the CWL files and inputs files to disk.
+        """
+        if isinstance(yml, dict):
+            root_yaml_tree: Yaml = utils_yaml.copy_yaml(yml)
+        else:
+            yaml_path = str(yml)
+            root_yaml_tree = utils_yaml.load_file(Path(yml))
+        args = argparse.Namespace(**vars(self.args))
+        args.yaml = yaml_path
+        # NOTE: The compiler adds tools (i.e. python_script) to tools, so use a (shallow) copy.
+        tools = dict(self.tools_cwl)
+        # NOTE: Use a copy of the current context so that the inference rules
+        # (and the executor for --compile_jobs) are local to this compilation.
+        return contextvars.copy_context().run(self.compile_, root_yaml_tree, args, tools)
+
+    def compile_(self, root_yaml_tree: Yaml, args: argparse.Namespace, tools: Tools) -> RoseTree:
+        """See compile(). This must be run in its own context.
+
+        Args:
+            root_yaml_tree (Yaml): The contents of the root workflow yml file
+            args (argparse.Namespace): The command line arguments
+            tools (Tools): The CWL CommandLineTool definitions
+
+        Returns:
+            RoseTree: The compiled root workflow and all of its subworkflows.
+        """
+        compiler.inference_rules.set(self.inference_rules)
+        inference.renaming_conventions.set(self.renaming_conventions)
+        inference.tools_conversions_index.set(self.conversions_index)
+
+        plugin_ns = root_yaml_tree.get('wic', {}).get('namespace', 'global')
+        y_t = YamlTree(StepId(args.yaml, plugin_ns), root_yaml_tree)
+        yaml_tree_raw = ast.read_ast_from_disk(y_t, self.yml_paths, tools, self.get_validator())
+        yaml_tree = ast.merge_yml_trees(yaml_tree_raw, {}, tools)
+
+        if args.cwl_inline_subworkflows:
+            while True:
+                # Inlineing changes the namespaces, so we have to get new namespaces after each inlineing operation.
+                namespaces_list = ast.get_inlineable_subworkflows(yaml_tree, tools, False, [])
+                if namespaces_list == []:
+                    break
+                yaml_tree = ast.inline_subworkflow(yaml_tree, tools, namespaces_list[0])
+
+        label = yaml_tree.yml.get('wic', {}).get('graphviz', {}).get('label', args.yaml)
+        graphdata = GraphData(args.yaml, attrs={'label': label, 'color': 'lightblue'})
+        graph = GraphReps(nx.DiGraph(), graphdata)
+        with speculation.parallel_compilation(args.compile_jobs, tools):
+            compiler_info = compiler.compile_workflow(yaml_tree, args, [], [graph], {}, {}, {}, {},
+                                                      tools, True, relative_run_path=True, testing=False)
+        return compiler_info.rose
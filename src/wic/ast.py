@@ -1,14 +1,14 @@
 import copy
 from pathlib import Path
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from mergedeep import merge, Strategy
 from jsonschema import Draft202012Validator
-import yaml
 
-from . import utils
-from .wic_types import Namespaces, Yaml, Tools, YamlTree, YamlForest, StepId, NodeData, RoseTree
+from . import utils, utils_yaml
+from .wic_types import (AstCache, Namespaces, NamespacePath, Yaml, Tools, YamlTree, YamlForest, StepId, NodeData,
+                        RoseTree)
 
 # NOTE: AST = Abstract Syntax Tree
 
@@ -18,7 +18,8 @@ from .wic_types import Namespaces, Yaml, Tools, YamlTree, YamlForest, StepId, No
 def read_ast_from_disk(yaml_tree_tuple: YamlTree,
                        yml_paths: Dict[str, Dict[str, Path]],
                        tools: Tools,
-                       validator: Draft202012Validator) -> YamlTree:
+                       validator: Draft202012Validator,
+                       ast_cache: Optional[AstCache] = None) -> YamlTree:
     """Reads the yml workflow definition files from disk (recursively) and inlines them into an AST
 
     Args:
@@ -26,6 +27,9 @@ def read_ast_from_disk(yaml_tree_tuple: YamlTree,
         yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
         tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
         validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ast_cache (Optional[AstCache]): The subworkflows which have already been read and validated.\n
+        Each distinct yml file is read and validated once per call. To do so only once across multiple\n
+        calls, pass the same ast_cache to each call. (The yml_paths, tools, and validator must be the same!)
 
     Raises:
         Exception: If the yml file(s) do not exist
@@ -34,6 +38,8 @@ def read_ast_from_disk(yaml_tree_tuple: YamlTree,
         YamlTree: A tuple of the root filepath and the associated yml AST
     """
     (step_id, yaml_tree) = yaml_tree_tuple
+    if ast_cache is None:
+        ast_cache = {}
 
     wic = {'wic': yaml_tree.get('wic', {})}
     if 'backends' in wic['wic']:
@@ -43,7 +49,7 @@ def read_ast_from_disk(yaml_tree_tuple: YamlTree,
         for back_name, back in wic['wic']['backends'].items():
             plugin_ns = wic['wic'].get('namespace', 'global')
             stepid = StepId(back_name, plugin_ns)
-            backends_tree = read_ast_from_disk(YamlTree(stepid, back), yml_paths, tools, validator)
+            backends_tree = read_ast_from_disk(YamlTree(stepid, back), yml_paths, tools, validator, ast_cache)
             backends_trees.append(backends_tree)
         yaml_tree['wic']['backends'] = dict(backends_trees)
         return YamlTree(step_id, yaml_tree)
@@ -81,24 +87,31 @@ def read_ast_from_disk(yaml_tree_tuple: YamlTree,
             if not (yaml_path.exists() and yaml_path.suffix == '.yml'):
                 raise Exception(f'Error! {yaml_path} does not exist or is not a .yml file.')
 
-            # Load the high-level yaml sub workflow file.
-            with open(yaml_path, mode='r', encoding='utf-8') as y:
-                sub_yaml_tree_raw: Yaml = yaml.safe_load(y.read())
-
-            try:
-                validator.validate(sub_yaml_tree_raw)
-            except Exception as e:
-                print('Failed to validate', yaml_path)
-                print(f'See validation_{yaml_path.stem}.txt for detailed technical information.')
-                # Do not display a nasty stack trace to the user; hide it in a file.
-                with open(f'validation_{yaml_path.stem}.txt', mode='w', encoding='utf-8') as f:
-                    import traceback
-                    traceback.print_exception(e, file=f)
-                import sys
-                sys.exit(1)
-
-            y_t = YamlTree(StepId(step_key, plugin_ns), sub_yaml_tree_raw)
-            (step_id_, sub_yml_tree) = read_ast_from_disk(y_t, yml_paths, tools, validator)
+            # A subworkflow is typically used many times (i.e. within a workflow
+            # and/or its subworkflows), but only read and validate it once.
+            yaml_path_resolved = yaml_path.resolve()
+            if yaml_path_resolved not in ast_cache:
+                # Load the high-level yaml sub workflow file.
+                sub_yaml_tree_raw: Yaml = utils_yaml.load_file(yaml_path)
+
+                try:
+                    validator.validate(sub_yaml_tree_raw)
+                except Exception as e:
+                    print('Failed to validate', yaml_path)
+                    print(f'See validation_{yaml_path.stem}.txt for detailed technical information.')
+                    # Do not display a nasty stack trace to the user; hide it in a file.
+                    with open(f'validation_{yaml_path.stem}.txt', mode='w', encoding='utf-8') as f:
+                        import traceback
+                        traceback.print_exception(e, file=f)
+                    import sys
+                    sys.exit(1)
+
+                y_t = YamlTree(StepId(step_key, plugin_ns), sub_yaml_tree_raw)
+                (step_id_, sub_yml_tree_cached) = read_ast_from_disk(y_t, yml_paths, tools, validator, ast_cache)
+                ast_cache[yaml_path_resolved] = sub_yml_tree_cached
+            # NOTE: The AST transformations (i.e. merge_yml_trees) modify the
+            # subtrees in-place, so each use of the subworkflow needs its own copy.
+            sub_yml_tree = utils_yaml.copy_yaml(ast_cache[yaml_path_resolved])
 
             step_i_dict = {} if steps[i][step_key] is None else steps[i][step_key]
             # Do not merge these two dicts; use subtree and parentargs so we can
@@ -302,7 +315,7 @@ def inline_subworkflow(yaml_tree_tuple: YamlTree, tools: Tools, namespaces: Name
     if 'backends' in wic['wic']:
         if len(namespaces) == 1: # and namespaces[0] == yaml_name ?
             (back_name_, yaml_tree) = utils.extract_backend(yaml_tree, wic['wic'], Path(''))
-            yaml_tree = {'steps': yaml_tree['steps']} # Remove wic tag
+            yaml_tree = {'steps': copy.deepcopy(yaml_tree['steps'])} # Remove wic tag
             return YamlTree(step_id, yaml_tree) # TODO: check step_id
         else:
             # Pass namespaces through unmodified
@@ -364,10 +377,8 @@ def move_slash_last(source_new: str) -> str:
         str: source_new with / moved to the last ___ position
     """
     if '/' in source_new:
-        source_new = source_new.replace('/', '___')
-        source_split = source_new.split('___')
-        source_new = '___'.join(source_split[:-1]) + '/' + source_split[-1]
-        return source_new
+        source_path = NamespacePath.parse(source_new.replace('/', '___'))
+        return f'{source_path.init()}/{source_path.segment}'
     else:
         return source_new
 
@@ -0,0 +1,195 @@
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import json
+import multiprocessing
+from pathlib import Path
+import time
+import traceback
+from typing import Any, Dict, Iterator, List, MutableMapping, Tuple
+
+from jsonschema import Draft202012Validator
+
+from . import compiler, inference, main, profiler, reuse, utils
+from .schemas import wic_schema
+from .wic_types import Json, Tools
+
+
+# The summary of the timings and failures of the most recent batch. See run_batch()
+batch_summary_file = Path('autogenerated/batch_summary.json')
+
+# The state of each worker process used by compile_batch()
+# NOTE: The Tools and the validator are (relatively) expensive to pickle / create,
+# so we only want to do this once per process, not once per root workflow.
+worker_state: Dict[str, Any] = {}
+
+
+def read_yamls_file(yamls_file: Path) -> List[str]:
+    """Reads a file which lists the paths of root workflows, one per line.
+
+    Args:
+        yamls_file (Path): The file to be read (see --yamls_file)
+
+    Returns:
+        List[str]: The paths of the root workflows, with blank lines and comments removed.
+    """
+    with open(yamls_file, mode='r', encoding='utf-8') as f:
+        return [line.strip() for line in f.readlines() if line.strip() != '' and not line.startswith('#')]
+
+
+def compile_batch_root(args: argparse.Namespace, yaml_path: str, tools_cwl: Tools,
+                       yml_paths: Dict[str, Dict[str, Path]], validator: Draft202012Validator) -> Json:
+    """Compiles one of the root workflows of a batch, and writes the results to autogenerated/\n
+    NOTE: Failures are recorded in the summary, not raised.
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        yaml_path (str): The path of the root workflow
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+
+    Returns:
+        Json: The summary of the compilation, i.e. the status and the time (in seconds).
+    """
+    args_root = argparse.Namespace(**vars(args))
+    args_root.yaml = yaml_path
+    summary: Json = {'yaml': yaml_path, 'status': 'succeeded'}
+    time_start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        try:
+            main.compile_root_workflow(args_root, tools_cwl, yml_paths, validator)
+        except SystemExit:
+            # i.e. user errors in the yml files. The error message has already been printed.
+            summary['status'] = 'failed'
+        except Exception:
+            summary['status'] = 'failed'
+            traceback.print_exc(file=stdout)
+    summary['time'] = round(time.perf_counter() - time_start, 3)
+    if summary['status'] == 'failed':
+        summary['output'] = stdout.getvalue()
+    return summary
+
+
+def compile_batch_init(args: argparse.Namespace, tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]],
+                       inference_rules: Dict[str, str], renaming_conventions: List[Tuple[str, str]],
+                       cache: MutableMapping[str, bytes]) -> None:
+    """Initializes a worker process used by compile_batch()
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        inference_rules (Dict[str, str]): The contents of inference_rules.txt
+        renaming_conventions (List[Tuple[str, str]]): The contents of renaming_conventions.txt
+        cache (MutableMapping[str, bytes]): The compiled subworkflows shared between all of the processes.
+    """
+    # Perform initialization via mutating global variables (This is not ideal)
+    # NOTE: This is necessary when using the spawn start method.
+    compiler.inference_rules.set(inference_rules)
+    inference.renaming_conventions.set(renaming_conventions)
+    reuse.subworkflow_cache.set(cache)
+    # NOTE: When using the fork start method, the workers inherit the profiler of the parent process.
+    profiler.stop()
+    yml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    worker_state['args'] = args
+    worker_state['tools_cwl'] = tools_cwl
+    worker_state['yml_paths'] = yml_paths
+    worker_state['validator'] = wic_schema.get_validator(tools_cwl, yml_stems, {}, use_cache=not args.no_schema_cache)
+
+
+def compile_batch_worker(yaml_path: str) -> Json:
+    """Calls compile_batch_root() using the state of the current worker process.
+
+    Args:
+        yaml_path (str): The path of the root workflow
+
+    Returns:
+        Json: The summary of the compilation. See compile_batch_root()
+    """
+    return compile_batch_root(worker_state['args'], yaml_path, worker_state['tools_cwl'],
+                              worker_state['yml_paths'], worker_state['validator'])
+
+
+def compile_batch(args: argparse.Namespace, yaml_paths: List[str], tools_cwl: Tools,
+                  yml_paths: Dict[str, Dict[str, Path]], validator: Draft202012Validator,
+                  cache: MutableMapping[str, bytes]) -> Iterator[Json]:
+    """Compiles the given root workflows, using a pool of --batch_jobs worker processes (if --batch_jobs > 1).\n
+    The independent subworkflows of the root workflows are only compiled once. See reuse.subworkflow_cache
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        yaml_paths (List[str]): The paths of the root workflows
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        cache (MutableMapping[str, bytes]): The compiled subworkflows. If --batch_jobs > 1, this must be\n
+        shared between processes, i.e. a multiprocessing.Manager().dict()
+
+    Yields:
+        Iterator[Json]: The summaries of the compilations, in the same order as yaml_paths
+    """
+    if args.batch_jobs <= 1:
+        token = reuse.subworkflow_cache.set(cache)
+        try:
+            for yaml_path in yaml_paths:
+                yield compile_batch_root(args, yaml_path, tools_cwl, yml_paths, validator)
+        finally:
+            reuse.subworkflow_cache.reset(token)
+        return
+    initargs = (args, tools_cwl, yml_paths, compiler.inference_rules.get(), inference.renaming_conventions.get(),
+                cache)
+    with ProcessPoolExecutor(max_workers=args.batch_jobs, initializer=compile_batch_init,
+                             initargs=initargs) as executor:
+        # NOTE: executor.map() returns the results in order.
+        yield from executor.map(compile_batch_worker, yaml_paths)
+
+
+def run_batch(args: argparse.Namespace, tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]],
+              validator: Draft202012Validator) -> int:
+    """Compiles all of the root workflows in --yamls and --yamls_file, writes the compiled
+    CWL files and inputs files to autogenerated/ (as if each were compiled using --yaml),
+    and writes the summary of the timings and failures to autogenerated/batch_summary.json
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+
+    Returns:
+        int: The exit code, i.e. 0 if all of the root workflows were compiled successfully.
+    """
+    yaml_paths = list(args.yamls) + (read_yamls_file(Path(args.yamls_file)) if args.yamls_file else [])
+    # The outputs of each root workflow are written to autogenerated/ based on the stem of its filename.
+    stems = Counter(Path(yaml_path).stem for yaml_path in yaml_paths)
+    duplicates = [yaml_path for yaml_path in yaml_paths if stems[Path(yaml_path).stem] > 1]
+    if duplicates:
+        print(f'Error! The filenames of the root workflows must be unique: {" ".join(duplicates)}')
+        return 1
+
+    time_start = time.perf_counter()
+    summaries = []
+    with contextlib.ExitStack() as stack:
+        cache: MutableMapping[str, bytes] = {}
+        if args.batch_jobs > 1:
+            cache = stack.enter_context(multiprocessing.Manager()).dict()
+        Path('autogenerated/').mkdir(parents=True, exist_ok=True)
+        for summary in compile_batch(args, yaml_paths, tools_cwl, yml_paths, validator, cache):
+            summaries.append(summary)
+            print(f"{summary['status']} {summary['yaml']} ({summary['time']:.2f}s)")
+            if summary['status'] == 'failed':
+                print(summary['output'], end='')
+        num_shared = len(cache)
+
+    num_failed = sum(1 for summary in summaries if summary['status'] == 'failed')
+    batch_summary = {'num_workflows': len(summaries), 'num_failed': num_failed,
+                     'num_shared_subworkflows': num_shared,
+                     'time': round(time.perf_counter() - time_start, 3), 'workflows': summaries}
+    with open(batch_summary_file, mode='w', encoding='utf-8') as f:
+        f.write(json.dumps(batch_summary, indent=2))
+    print(f"Compiled {len(summaries) - num_failed} of {len(summaries)} workflows in {batch_summary['time']:.2f}s "
+          f'({num_failed} failed). See {batch_summary_file}')
+    return int(num_failed > 0)
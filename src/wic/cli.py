@@ -1,14 +1,43 @@
 import argparse
 import sys
+from typing import List, Optional
 
 parser = argparse.ArgumentParser(prog='main', description='Convert a high-level yaml workflow file to CWL.')
-parser.add_argument('--yaml', type=str, required=('--generate_schemas_only' not in sys.argv),
+# These arguments do not compile a single root workflow, so they do not require --yaml.
+yaml_optional_args = ['--generate_schemas_only', '--serve', '--yamls', '--yamls_file']
+parser.add_argument('--yaml', type=str, required=not any(arg in sys.argv for arg in yaml_optional_args),
                     help='Yaml workflow file')
+parser.add_argument('--yamls', type=str, nargs='+', required=False, default=[],
+                    help='''Compile many root yml workflow files (instead of --yaml) in one process, i.e. loading the
+                    \ntools and the validator only once. See --batch_jobs and autogenerated/batch_summary.json''')
+parser.add_argument('--yamls_file', type=str, required=False, default=None,
+                    help='Like --yamls, but using a file which lists the root yml workflow files, one per line.')
+
+parser.add_argument('--sweep_file', type=str, required=False, default=None,
+                    help='''Compile --yaml once, then write one inputs file autogenerated/{yaml_stem}_inputs_{n}.yml
+                    \nfor each row of the given .csv or .jsonl file, whose columns are inputs of the root workflow.''')
 
 parser.add_argument('--generate_schemas_only', default=False, action="store_true",
                     help='Generate schemas for the files in --cwl_dirs_file and --yml_dirs_file.')
+parser.add_argument('--generate_schemas_incremental', default=False, action="store_true",
+                    help='''Only regenerate the schemas of workflows whose yml files or (transitive) dependencies
+                    have changed since the previous run. See autogenerated/schemas/dependency_graph.json''')
+parser.add_argument('--jobs', type=int, required=False, default=1,
+                    help='''The number of processes to use for compiling the workflows with --generate_schemas_only
+                    \n(i.e. to generate their schemas). Does not affect --yamls, see --batch_jobs''')
+parser.add_argument('--batch_jobs', type=int, required=False, default=1,
+                    help='''The number of processes to use for compiling the root workflows with --yamls.
+                    \nEach root workflow is compiled by a single process, see --compile_jobs''')
+parser.add_argument('--compile_jobs', type=int, required=False, default=1,
+                    help='''The number of processes to use for compiling independent sibling subworkflows
+                    \nwithin a single root workflow, i.e. subworkflows which do not (recursively) contain
+                    \nexplicit edges or python_script steps.''')
 parser.add_argument('--cwl_dirs_file', type=str, required=False, default='cwl_dirs.txt',
                     help='Configuration file which lists the directories which contains the CWL CommandLineTools')
+parser.add_argument('--no_tools_cache', default=False, action="store_true",
+                    help='Do not use the cache of parsed CWL CommandLineTools in autogenerated/tools_cache.pickle')
+parser.add_argument('--no_schema_cache', default=False, action="store_true",
+                    help='Do not use the cache of assembled schemas in autogenerated/schemas/schema_cache.pickle')
 parser.add_argument('--yml_dirs_file', type=str, required=False, default='yml_dirs.txt',
                     help='Configuration file which lists the directories which contains the YAML Workflows')
 # Change default to True for now. See comment in compiler.py
@@ -21,6 +50,18 @@ parser.add_argument('--parallel', default=False, action="store_true",
                     \nhanging (particularly when scattering). See user guide for details.''')
 parser.add_argument('--quiet', default=False, action="store_true",
                     help='''Disable verbose output. This will not print out the commands used for each step.''')
+parser.add_argument('--profile', default=False, action="store_true",
+                    help='''Record the wall time, number of calls, and memory allocations of each phase
+                    \nand each subworkflow in autogenerated/{yaml_stem}_profile.json and (for flame graphs)
+                    \nautogenerated/{yaml_stem}_profile.folded. NOTE: Tracing allocations inflates the times.''')
+group_serve = parser.add_mutually_exclusive_group()
+group_serve.add_argument('--serve', default=False, action="store_true",
+                    help='''Start a long-running compile server, which loads the tools, yml paths, and validator once
+                    \n(and reloads them when the files in --cwl_dirs_file or --yml_dirs_file change).''')
+group_serve.add_argument('--client', default=False, action="store_true",
+                    help='''Compile --yaml using the compile server (see --serve) running in the same directory.''')
+parser.add_argument('--socket', type=str, required=False, default='autogenerated/wic.sock',
+                    help='The unix socket used by --serve and --client.')
 parser.add_argument('--cwl_runner', type=str, required=False, default='cwltool', choices=['cwltool', 'toil-cwl-runner'],
                     help='The CWL runner to use for running workflows locally.')
 
@@ -40,10 +81,21 @@ parser.add_argument('--cwl_inline_subworkflows', default=('--run_compute' in sys
                     help='Before generating the cwl file, inline all subworkflows. Required for --run_compute')
 parser.add_argument('--inference_use_naming_conventions', default=False, action="store_true",
                     help='Enables the use of naming conventions in the inference algorithm')
+parser.add_argument('--inference_max_conversion_steps', type=int, required=False, default=1,
+                    help='The maximum number of file format conversions to insert between two steps.')
 parser.add_argument('--cwl_validate', default=False, action="store_true",
                     help='After generating the cwl file, validate it.')
 parser.add_argument('--cachedir', type=str, required=False, default='cachedir',
                     help='The directory to save intermediate results; useful with RealtimePlots.py')
+parser.add_argument('--link_output_files', default=False, action="store_true",
+                    help='''After running locally, hardlink (instead of copy) the output files into outdir/
+                    \nThis is faster and saves disk space, but modifying a file in outdir/ will also
+                    \nmodify the corresponding file in provenance/''')
+parser.add_argument('--write_jobs', type=int, required=False, default=1,
+                    help='''The number of threads to use when writing the compiled CWL files and inputs files.
+                    \n(Only the files whose contents have changed are written.)''')
+parser.add_argument('--copy_jobs', type=int, required=False, default=None,
+                    help='The number of threads to use when copying the output files into outdir/')
 
 aws_url = 'http://compute.ci.aws.labshare.org'
 ncats_url = 'https://compute.scb-ncats.io/'
@@ -64,5 +116,21 @@ parser.add_argument('--graph_show_outputs', default=False, action="store_true",
                     help='Add nodes to the graph representing the workflow outputs.')
 parser.add_argument('--graph_inline_depth', type=int, required=False, default=sys.maxsize,
                     help='Controls the depth of subgraphs which are displayed.')
+parser.add_argument('--graph_render', type=str, required=False, default='none', choices=['png', 'svg', 'none'],
+                    help='''Render the GraphViz diagram of the workflow (alongside the yml file) in the given format.
+                    \nBy default, the diagram is not rendered, because the layout algorithm can be very slow.''')
 parser.add_argument('--graph_dark_theme', default=False, action="store_true",
                     help='Changees the color of the fonts and edges from white to black.')
+
+
+def get_args(yaml_path: str = '', suppliedargs: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parses the given command line arguments (instead of sys.argv), i.e. when using wic as a library.
+
+    Args:
+        yaml_path (str): The value of --yaml
+        suppliedargs (Optional[List[str]]): Any other command line arguments, i.e. ['--graph_render', 'png']
+
+    Returns:
+        argparse.Namespace: The parsed command line arguments, with the defaults for all of the others.
+    """
+    return parser.parse_args(['--yaml', yaml_path] + (suppliedargs if suppliedargs else []))
@@ -0,0 +1,58 @@
+import json
+import os
+from pathlib import Path
+import socket
+import sys
+from typing import List
+
+from . import cli
+
+# NOTE: This module is the thin front end to the compile server (see server.py),
+# so it should only import the standard library (and cli), not the compiler.
+
+
+def run_client(argv: List[str], socket_path: Path) -> int:
+    """Sends the command line arguments to the compile server (see --serve) and
+    prints the output of the compilation.
+
+    Args:
+        argv (List[str]): The command line arguments, i.e. sys.argv[1:]
+        socket_path (Path): The path to the unix socket of the compile server
+
+    Returns:
+        int: The exit code of the compilation, i.e. 0 for success.
+    """
+    argv = [arg for arg in argv if arg != '--client']
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except OSError:
+            print(f'Error! Cannot connect to a compile server on {socket_path}')
+            print('Start one (in the same directory) using wic --serve')
+            return 1
+        with sock.makefile(mode='rwb') as f:
+            f.write((json.dumps({'argv': argv, 'cwd': os.getcwd()}) + '\n').encode())
+            f.flush()
+            for line in f:
+                reply = json.loads(line)
+                if 'stdout' in reply:
+                    sys.stdout.write(reply['stdout'])
+                if 'stderr' in reply:
+                    sys.stderr.write(reply['stderr'])
+                if 'returncode' in reply:
+                    sys.stdout.flush()
+                    return int(reply['returncode'])
+    print('Error! The compile server closed the connection.')
+    return 1
+
+
+def main() -> None:
+    """Compiles a workflow using the compile server. This accepts the same
+    command line arguments as wic, but it starts much faster than wic --client.
+    """
+    args = cli.parser.parse_args()
+    sys.exit(run_client(sys.argv[1:], Path(args.socket)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,26 @@
 import argparse
+from contextvars import ContextVar
 import copy
 import json
 import subprocess as sub
+import sys
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
 
-import graphviz
 from mergedeep import merge, Strategy
 import networkx as nx
 import yaml
 
-from . import inference, utils, utils_cwl, utils_graphs, python_cwl_adapter
+from . import inference, profiler, reuse, speculation, utils, utils_cwl, utils_graphs, utils_yaml, python_cwl_adapter
 from .wic_types import (CompilerInfo, EnvData, ExplicitEdgeCalls,
-                        ExplicitEdgeDefs, GraphData, GraphReps, Namespaces,
-                        NodeData, RoseTree, Tool, Tools, WorkflowInputsFile,
-                        Yaml, YamlTree, StepId)
+                        ExplicitEdgeDef, ExplicitEdgeDefs, GraphData, GraphReps, IndexedMapping, InternalOutputs,
+                        Namespaces, NamespacePath, NodeData, OutputsIndex, ResolvedMapping, RoseTree, Tool, Tools,
+                        UndoableMapping, WorkflowInputsFile, Yaml, YamlTree, StepId)
 
 # NOTE: This must be initialized in main.py and/or cwl_watcher.py
-inference_rules: Dict[str, str] = {}
+# NOTE: This is a ContextVar (not a plain global) so that multiple compilations
+# with different rules can run concurrently in different threads. See api.py
+inference_rules: ContextVar[Dict[str, str]] = ContextVar('inference_rules', default={})
 
 
 def compile_workflow(yaml_tree_ast: YamlTree,
@@ -32,69 +35,79 @@ def compile_workflow(yaml_tree_ast: YamlTree,
                      is_root: bool,
                      relative_run_path: bool,
                      testing: bool) -> CompilerInfo:
-    """fixed-point wrapper around compile_workflow_once\n
-    See https://en.wikipedia.org/wiki/Fixed_point_(mathematics)
+    """Memoizing and profiling wrapper around compile_workflow_once\n
+    If the same subworkflow has already been compiled within the current root
+    workflow in an equivalent environment, the memoized result is relocated to
+    the current namespaces instead of re-compiling it. (See reuse.get_memo_key())
+    Otherwise, it is compiled and memoized. Either way, the compilation is recorded
+    as a nested phase named after the current namespace. (See --profile)
 
     Args:
         yaml_tree_ast (YamlTree): A tuple of name and yml AST
-        args (Any): all of the other positional arguments for compile_workflow_once
-        kwargs (Any): all of the other keyword arguments for compile_workflow_once
+        args (argparse.Namespace): The command line arguments
+        namespaces (Namespaces): Specifies the path in the yml AST to the current subworkflow
+        subgraphs_ (List[GraphReps]): The graphs associated with the parent workflows of the current subworkflow
+        explicit_edge_defs (ExplicitEdgeDefs): Stores the (path, value) of the explicit edge definition sites
+        explicit_edge_calls (ExplicitEdgeCalls): Stores the (path, value) of the explicit edge call sites
+        input_mapping (Dict[str, List[str]]): Maps the inputs of the parent workflows to the step inputs
+        output_mapping (Dict[str, str]): Maps the outputs of the parent workflows to the step outputs
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl().\n
+        yml files that have been compiled to CWL SubWorkflows are also added during compilation.
+        is_root (bool): True if this is the root workflow
+        relative_run_path (bool): Controls whether to use subdirectories or\n
+        just one directory when writing the compiled CWL files to disk
+        testing: Used to disable some optional features which are unnecessary for testing.
 
     Returns:
         CompilerInfo: Contains the data associated with compiled subworkflows\n
         (in the Rose Tree) together with mutable cumulative environment\n
         information which needs to be passed through the recursion.
     """
-    ast_modified = True
-    yaml_tree = yaml_tree_ast
-    # There ought to be at most one file format conversion between each step.
-    # If everything is working correctly, we should thus reach the fixed point
-    # in at most n-1 iterations. However, due to the possibility of bugs in the
-    # implementation and/or spurious inputs, we should guarantee termination.
-    max_iters = 100 # 100 ought to be plenty. TODO: calculate n-1 from steps:
-    i = 0
-    while ast_modified and i < max_iters:
-        subgraphs = copy.deepcopy(subgraphs_) # See comment below!
-        compiler_info = compile_workflow_once(yaml_tree, args, namespaces, subgraphs,
-                                              explicit_edge_defs, explicit_edge_calls,
-                                              input_mapping, output_mapping,
-                                              tools, is_root, relative_run_path, testing)
-        node_data: NodeData = compiler_info.rose.data
-        ast_modified = not yaml_tree.yml == node_data.yml
-        if ast_modified:
-            #import yaml
-            #print(yaml.dump(node_data.yml))
-            #print()
-            yaml_tree = YamlTree(yaml_tree_ast.step_id, node_data.yml)
-        i += 1
-
-    # Overwrite subgraphs_ element-wise
-    # This is a terrible hack due to the fact that the graphviz library API
-    # only allows appending to the body. This introduces mutable state, so each
-    # time we speculatively compile we accumulate duplicate nodes and edges.
-    # The 'correct' solution is to store the nodes and edges that you want to
-    # add in a separate data structure, return them from compile_workflow_once,
-    # and only once we have reached the fixed point then add them here. Due to
-    # labeling and styling and other graphviz metadata that is not trivial, so
-    # instead we simply deepcopy and overwite the bodies here.
-    # (NOTE: We now have a separate GraphData structure, so the graphviz and
-    # networkx representations can probably be removed from the recursion.)
-    # (Also note that you have to do this element-wise; you cannot simply write
-    # subgraphs_ = subgraphs because that will only overwrite the local binding
-    # and thus it will not affect the call site of compile_workflow!)
-    # TODO: overwrite the networkx subgraphs. For now this is okay because
-    # we are only using the networkx graphs to do an isomorphism check in the
-    # regression tests, in which case identical duplication will not matter.
-    for i, subgraph_ in enumerate(subgraphs_):
-        subgraph_.graphviz.body = subgraphs[i].graphviz.body
-        subgraph_.graphdata.name = subgraphs[i].graphdata.name
-        subgraph_.graphdata.nodes = subgraphs[i].graphdata.nodes
-        subgraph_.graphdata.edges = subgraphs[i].graphdata.edges
-        subgraph_.graphdata.subgraphs = subgraphs[i].graphdata.subgraphs
-
-    if i == max_iters:
-        print(yaml.dump(node_data.yml))
-        raise Exception(f'Error! Maximum number of iterations ({max_iters}) reached in compile_workflow!')
+    # NOTE: The fixed-point iteration (i.e. inserting file format conversions
+    # and re-compiling) is now performed within compile_workflow_once, which
+    # resumes from the insertion point instead of re-compiling from scratch.
+    # NOTE: We only need the networkx graphs to do an isomorphism check in
+    # the regression tests, and only the current graph is returned, so
+    # give the parent workflows throwaway networkx graphs. (Previously,
+    # the networkx modifications of the parent workflows were discarded
+    # along with the deepcopies, so this preserves the existing behavior.)
+    subgraphs = [GraphReps(nx.DiGraph(), subgraph_.graphdata)
+                 for subgraph_ in subgraphs_[:-1]]
+    graph_ = subgraphs_[-1]
+    subgraphs.append(GraphReps(graph_.networkx.copy(), graph_.graphdata))
+    # See reuse.subworkflow_memo. Only reuse compiled subworkflows within a single root workflow.
+    token = None
+    if namespaces == []:
+        token = reuse.subworkflow_memo.set(reuse.SubworkflowMemo({}, {}) if reuse.memoize_subworkflows.get() else None)
+    try:
+        # See --profile. The subworkflows are nested, and named like the namespaces.
+        phase_name = namespaces[-1] if namespaces else Path(yaml_tree_ast.step_id.stem).stem
+        with profiler.phase(phase_name):
+            # The same subworkflow (e.g. setup_pdb.yml) can appear many times in the
+            # same tree. Since compilation is embedding independent (see
+            # test_cwl_embedding_independence), we only need to compile it once.
+            env = EnvData(input_mapping, output_mapping, {}, [], explicit_edge_defs, explicit_edge_calls)
+            memo = reuse.subworkflow_memo.get()
+            memo_key = None
+            if memo is not None:
+                memo_key = reuse.get_memo_key(memo, yaml_tree_ast, args, namespaces, env, relative_run_path, testing)
+                if memo_key is not None and memo_key in memo.compiled:
+                    if not testing:
+                        print('  reusing', ('  ' * len(namespaces)) + yaml_tree_ast.step_id.stem)
+                    profiler.annotate('memoized', True)
+                    return reuse.get_memoized_subworkflow(memo.compiled[memo_key], yaml_tree_ast, namespaces,
+                                                          env, graph_)
+            graph_chk = utils_graphs.checkpoint_graph(graph_)
+            compiler_info = compile_workflow_once(yaml_tree_ast, args, namespaces, subgraphs,
+                                                  explicit_edge_defs, explicit_edge_calls,
+                                                  input_mapping, output_mapping,
+                                                  tools, is_root, relative_run_path, testing)
+            if memo is not None and memo_key is not None:
+                reuse.memoize_subworkflow(memo, memo_key, compiler_info, yaml_tree_ast, namespaces, env,
+                                          graph_, graph_chk)
+    finally:
+        if token is not None:
+            reuse.subworkflow_memo.reset(token)
     return compiler_info
 
 
@@ -135,12 +148,16 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         (in the Rose Tree) together with mutable cumulative environment\n
         information which needs to be passed through the recursion.
     """
-    # NOTE: Use deepcopy so that when we delete wic: we don't modify any call sites
-    (step_id, yaml_tree) = copy.deepcopy(yaml_tree_ast)
+    # NOTE: Copy so that when we delete wic: we don't modify any call sites.
+    # The subtrees of the subworkflows are shared, not copied, because the
+    # recursive calls copy them (and we never modify them here).
+    step_id = yaml_tree_ast.step_id
+    yaml_tree = utils.copy_ast_spine(yaml_tree_ast.yml)
     yaml_path = step_id.stem
-    # We also want another copy of the original AST so that if we need to modify it,
-    # we can return the modified AST to the call site and re-compile.
-    (yaml_path_orig, yaml_tree_orig) = copy.deepcopy(yaml_tree_ast)
+    # We also want the original AST so that if we need to modify it, we can
+    # return the modified AST to the call site and re-compile. Since the
+    # original AST is never modified in-place, it is copied on write (below).
+    yaml_tree_orig = yaml_tree_ast.yml
 
     if not testing:
         print(' starting', ('  ' * len(namespaces)) + yaml_path)
@@ -156,6 +173,10 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
 
     (back_name_, yaml_tree) = utils.extract_backend(yaml_tree, wic['wic'], Path(yaml_path))
     steps: List[Yaml] = yaml_tree['steps']
+    # The original (i.e. unmodified) steps, so that we can roll back the current step
+    # without copying it. See below. NOTE: This only shallow copies the yml AST.
+    steps_orig: List[Yaml] = list(utils.extract_backend(yaml_tree_orig, yaml_tree_orig.get('wic', {}),
+                                                        Path(yaml_path))[1]['steps'])
 
     steps_keys = utils.get_steps_keys(steps)
 
@@ -171,44 +192,106 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
     yaml_tree['$schemas'] = ['https://raw.githubusercontent.com/edamontology/edamontology/master/EDAM_dev.owl']
 
     # Collect workflow input parameters
-    inputs_workflow = {}
-    inputs_file_workflow = {}
+    # NOTE: These (and the other environment mappings below) are undoable so that we can
+    # roll back the current step without copying them. See UndoableMapping
+    inputs_workflow = UndoableMapping()
+    inputs_file_workflow = UndoableMapping()
 
     # Collect workflow input/output to workflow step input/output mappings
-    input_mapping_copy = copy.deepcopy(input_mapping)
-    output_mapping_copy = copy.deepcopy(output_mapping)
+    # NOTE: Shallow copies suffice because the values are never modified in-place.
+    # Use ResolvedMapping so that resolving the chains of subworkflow boundaries is cached.
+    # NOTE: These are also indexed so that the relevant entries can be found quickly. See reuse.get_memo_key()
+    input_mapping_copy = ResolvedMapping(input_mapping)
+    output_mapping_copy = ResolvedMapping(output_mapping)
 
     # Collect the internal workflow output variables
     outputs_workflow = []
-    vars_workflow_output_internal = []
+    vars_workflow_output_internal: InternalOutputs = []
 
     # Copy recursive explicit edge variable definitions and call sites.
-    explicit_edge_defs_copy = copy.deepcopy(explicit_edge_defs)
-    explicit_edge_calls_copy = copy.deepcopy(explicit_edge_calls)
+    # NOTE: Shallow copies suffice because the (namespaces, var) values are never modified in-place.
+    explicit_edge_defs_copy = UndoableMapping(explicit_edge_defs)
+    explicit_edge_calls_copy = IndexedMapping(explicit_edge_calls)
     # Unlike the first copies which are mutably updated, these are returned
     # unmodified so that we can test that compilation is embedding independent.
-    explicit_edge_defs_copy2 = copy.deepcopy(explicit_edge_defs)
-    explicit_edge_calls_copy2 = copy.deepcopy(explicit_edge_calls)
+    explicit_edge_defs_copy2 = dict(explicit_edge_defs)
+    explicit_edge_calls_copy2 = dict(explicit_edge_calls)
     # Yet another copy for checkpointing
-    explicit_edge_defs_chk = {}
-    explicit_edge_calls_chk = {}
+    explicit_edge_defs_chk: ExplicitEdgeDefs = {}
+    explicit_edge_calls_chk: ExplicitEdgeCalls = {}
 
     # Collect recursive subworkflow data
-    step_1_names = []
-    sibling_subgraphs = []
+    step_1_names: List[str] = []
+    sibling_subgraphs: List[GraphReps] = []
+
+    rose_tree_list: List[RoseTree] = []
 
-    rose_tree_list = []
+    # NOTE: Internally, use NamespacePath for prefix tests etc. instead of re-joining strings.
+    namespaces_path = NamespacePath.from_namespaces(namespaces)
 
     graph = subgraphs[-1] # Get the current graph
-    graph_gv = graph.graphviz
     graph_nx = graph.networkx
     graphdata = graph.graphdata
+    # See --graph_inline_depth and the checkpoints below.
+    inline_node = str(namespaces_path.ancestor(1 + args.graph_inline_depth))
 
     #plugin_ns = wic['wic'].get('namespace', 'global')
 
     tools_lst: List[Tool] = []
+    # NOTE: Only the outputs of steps before the current step are indexed, so we
+    # do not need to roll back outputs_index when inserting a conversion.
+    outputs_index = OutputsIndex([], {}, [])
+
+    # There ought to be at most one file format conversion between each step.
+    # If everything is working correctly, we should thus reach the fixed point
+    # in at most n-1 iterations. However, due to the possibility of bugs in the
+    # implementation and/or spurious inputs, we should guarantee termination.
+    max_iters = 100 # 100 ought to be plenty. TODO: calculate n-1 from steps:
+    iters = 1
+
+    # See --compile_jobs
+    env_init = EnvData(input_mapping_copy, output_mapping_copy, {}, [],
+                       explicit_edge_defs_copy, explicit_edge_calls_copy)
+    speculations = speculation.submit_independent_subworkflows(args, namespaces, len(subgraphs), yaml_stem, steps,
+                                                               wic_steps, subkeys, 0, env_init,
+                                                               relative_run_path, testing)
+
+    i = 0
+    while i < len(steps_keys):
+        step_key = steps_keys[i]
+
+        # If we need to insert a file format conversion before the current step,
+        # we used to return early and re-compile the entire workflow from scratch.
+        # Since the steps before the current step cannot depend on the current
+        # step, instead checkpoint everything that the current step can modify,
+        # so we can roll back only the current step and resume from here.
+        # NOTE: Conversions are rare, so the checkpoints must not copy anything.
+        # The environment mappings log their modifications (see UndoableMapping),
+        # the lists and graphs are only appended to, and the current step is
+        # restored from steps_orig (which is never modified in-place).
+        # NOTE: The step may replace the explicit edge mappings (see below), so keep the originals.
+        env_mappings_chk = (inputs_workflow, inputs_file_workflow, input_mapping_copy, output_mapping_copy,
+                            explicit_edge_defs_copy, explicit_edge_calls_copy)
+        for env_mapping in env_mappings_chk:
+            env_mapping.checkpoint()
+        explicit_edge_chks = (explicit_edge_defs_chk, explicit_edge_calls_chk)
+        lens_chk = (len(vars_workflow_output_internal), len(step_1_names),
+                    len(sibling_subgraphs), len(rose_tree_list), len(tools_lst))
+        # NOTE: The doc: and label: tags of the workflow inputs are modified in-place (below),
+        # so those inputs are copied on write. Similarly, the current step only
+        # modifies its own entry of wic_steps.
+        yaml_inputs_chk: Dict[str, Yaml] = {}
+        wic_steps_key = f'({i+1}, {step_key})'
+        wic_steps_chk = wic_steps.get(wic_steps_key)
+        graph_chks = [utils_graphs.checkpoint_graph(subgraph_) for subgraph_ in subgraphs]
+        # NOTE: All of the networkx edges added by the current step are incident
+        # to the nodes added by the current step, unless the node names have
+        # been truncated due to --graph_inline_depth, in which case they are all
+        # the same (hidden) self-edge. (See add_graph_edge())
+        graph_nx_len_chk = len(graph_nx)
+        graph_nx_self_edge_chk = graph_nx.has_edge(inline_node, inline_node)
+        conversion: Optional[StepId] = None
 
-    for i, step_key in enumerate(steps_keys):
         step_name_i = utils.step_name_str(yaml_stem, i, step_key)
         stem = Path(step_key).stem
         wic_step_i = wic_steps.get(f'({i+1}, {step_key})', {})
@@ -223,25 +306,13 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             sub_yml = steps[i][step_key]['subtree']
             sub_yaml_tree = YamlTree(StepId(step_key, plugin_ns_i), sub_yml)
 
-            # get the label (if any) from the subworkflow
-            step_i_wic_graphviz = sub_yml.get('wic', {}).get('graphviz', {})
-            label = step_i_wic_graphviz.get('label', step_key)
-            style = step_i_wic_graphviz.get('style', '')
-
-            subgraph_gv = graphviz.Digraph(name=f'cluster_{step_key}')
-            subgraph_gv.attr(label=label) # str(path)
-            subgraph_gv.attr(color='lightblue')  # color of outline
-            if style != '':
-                subgraph_gv.attr(style=style)
-            subgraph_nx = nx.DiGraph()
-            graphdata = GraphData(step_key)
-            subgraph = GraphReps(subgraph_gv, subgraph_nx, graphdata)
+            subgraph = utils_graphs.get_subworkflow_graph(step_key, sub_yml)
 
             # Checkpoint / restore environment
             if wic_step_i.get('wic', {}).get('environment', {}).get('action', '') == 'checkpoint':
                 #print('checkpointing environment')
-                explicit_edge_defs_chk = copy.deepcopy(explicit_edge_defs_copy)
-                explicit_edge_calls_chk = copy.deepcopy(explicit_edge_calls_copy)
+                explicit_edge_defs_chk = dict(explicit_edge_defs_copy)
+                explicit_edge_calls_chk = explicit_edge_calls_copy.copy()
             if wic_step_i.get('wic', {}).get('environment', {}).get('action', '') == 'restore':
                 save_defs = wic_step_i.get('wic', {}).get('environment', {}).get('save_defs', [])
                 merge_keyvals_defs = {}
@@ -250,16 +321,42 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     merge_keyvals_defs[key] = explicit_edge_defs_copy[key]
                     #merge_keyvals_calls[key] = explicit_edge_calls_copy[key]
                 #print('restoring environment')
-                explicit_edge_defs_copy = copy.deepcopy(explicit_edge_defs_chk) # deepcopy?
-                explicit_edge_calls_copy = copy.deepcopy(explicit_edge_calls_chk) # deepcopy?
+                explicit_edge_defs_copy = UndoableMapping(explicit_edge_defs_chk)
+                explicit_edge_calls_copy = IndexedMapping(explicit_edge_calls_chk)
                 explicit_edge_defs_copy.update(merge_keyvals_defs)
                 #explicit_edge_calls_copy.update(merge_keyvals_calls)
 
-            sub_compiler_info = compile_workflow(sub_yaml_tree, args, namespaces + [step_name_i],
-                                                 subgraphs + [subgraph], explicit_edge_defs_copy,
-                                                 explicit_edge_calls_copy,
-                                                 input_mapping_copy, output_mapping_copy,
-                                                 tools, False, relative_run_path, testing)
+            # If the subworkflow has already been compiled concurrently (see --compile_jobs),
+            # use the result, unless the environment has since changed in a way that matters.
+            sub_compiler_info: Optional[CompilerInfo] = None
+            speculation_i = speculations.pop(step_name_i, None)
+            env_now = EnvData(input_mapping_copy, output_mapping_copy, {}, [],
+                              explicit_edge_defs_copy, explicit_edge_calls_copy)
+            # If the subworkflow has already been compiled for another root workflow (see --yamls), use the result.
+            cache = reuse.subworkflow_cache.get()
+            if cache is not None and reuse.is_shareable_subworkflow(namespaces, sub_yml, env_now, yaml_stem):
+                if speculation_i is not None:
+                    speculation_i[0].cancel()
+                    speculation_i = None
+
+                def compile_shared_subworkflow(env_empty: EnvData) -> CompilerInfo:
+                    # NOTE: Independent subworkflows do not modify the graphs of their parents.
+                    return compile_workflow(sub_yaml_tree, args, [step_name_i],
+                                            [GraphReps(nx.DiGraph(), GraphData('')), subgraph],
+                                            env_empty.explicit_edge_defs, env_empty.explicit_edge_calls,
+                                            env_empty.input_mapping, env_empty.output_mapping,
+                                            tools, False, relative_run_path, testing)
+                sub_compiler_info = reuse.get_shared_subworkflow(cache, sub_yaml_tree, args, step_name_i, env_now,
+                                                                 compile_shared_subworkflow, relative_run_path, testing)
+            if speculation_i is not None:
+                sub_compiler_info = speculation.get_speculative_subworkflow(speculation_i, sub_yaml_tree, env_now,
+                                                                            yaml_stem)
+            if sub_compiler_info is None:
+                sub_compiler_info = compile_workflow(sub_yaml_tree, args, namespaces + [step_name_i],
+                                                     subgraphs + [subgraph], explicit_edge_defs_copy,
+                                                     explicit_edge_calls_copy,
+                                                     input_mapping_copy, output_mapping_copy,
+                                                     tools, False, relative_run_path, testing)
 
             sub_rose_tree = sub_compiler_info.rose
             rose_tree_list.append(sub_rose_tree)
@@ -285,7 +382,8 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             # Add arguments to the compiled subworkflow (if any), being careful
             # to remove any child wic: metadata annotations. Post-compilation
             # arguments can now be added either directly inline or as metadata.
-            wic_step_i_copy = copy.deepcopy(wic_step_i)
+            # NOTE: A shallow copy suffices because merge() deepcopies the values.
+            wic_step_i_copy = dict(wic_step_i)
             if 'wic' in wic_step_i_copy:
                 del wic_step_i_copy['wic']
             # NOTE: To support overloading, the metadata args must overwrite the parent args!
@@ -326,7 +424,6 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                 python_script_path = yml_args.get('script', '')
                 if python_script_path == '':
                     print('Error! Missing `script` tag in python_script')
-                    import sys
                     sys.exit(1)
                 del yml_args['script']
                 root_yml_dir_abs = Path(args.yaml).parent.absolute()
@@ -336,7 +433,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                 generated_cwl = python_cwl_adapter.generate_CWL_CommandLineTool(module.inputs, module.outputs)
                 filepath = 'autogenerated/' + '___'.join(namespaces + [python_script_mod + '.cwl'])
                 with open(filepath, mode='w', encoding='utf-8') as f:
-                    f.write(yaml.dump(generated_cwl, sort_keys=False, line_break='\n', indent=2))
+                    f.write(utils_yaml.dump(generated_cwl, sort_keys=False, line_break='\n', indent=2))
                 #step_id = StepId(python_script_mod, 'global')
                 # NOTE: The name 'python_script' is obviously not namespaced, and may
                 # prevent using more than one script in a workflow. However, filepath
@@ -369,6 +466,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         else:
             if step_key in subkeys:
                 run_path = '___'.join(namespaces + [step_name_i, run_path])
+        run_path = sys.intern(run_path)
 
         if steps[i][step_key]:
             if not 'run' in steps[i][step_key]:
@@ -420,7 +518,8 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         label = step_key
         if args.graph_label_stepname:
             label = step_name_i
-        step_node_name = '___'.join(namespaces + [step_name_i])
+        step_path = namespaces_path.child(step_name_i)
+        step_node_name = str(step_path)
 
         if not tool_i.cwl['class'] == 'Workflow':
             wic_graphviz_step_i = wic_step_i.get('wic', {}).get('graphviz', {})
@@ -429,15 +528,12 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             style = wic_graphviz_step_i.get('style', '')
             style = default_style if style == '' else default_style + ', ' + style
             attrs = {'label': label, 'shape': 'box', 'style': style, 'fillcolor': 'lightblue'}
-            graph_gv.node(step_node_name, **attrs)
             graph_nx.add_node(step_node_name)
             graphdata.nodes.append((step_node_name, attrs))
         elif not (step_key in subkeys and len(namespaces) < args.graph_inline_depth):
-            nssnode = namespaces + [step_name_i]
             # Just like in add_graph_edge(), here we can hide all of the details
             # below a given depth by simply truncating the node's namespaces.
-            nssnode = nssnode[:(1 + args.graph_inline_depth)]
-            step_node_name = '___'.join(nssnode)
+            step_node_name = str(step_path.ancestor(1 + args.graph_inline_depth))
             # NOTE: NOT wic_graphviz_step_i
             # get the label (if any) from the subworkflow
             # TODO: This causes test_cwl_embedding_independence to fail.
@@ -450,7 +546,6 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             style = '' #step_i_wic_graphviz.get('style', '')
             style = default_style if style == '' else default_style + ', ' + style
             attrs = {'label': label, 'shape': 'box', 'style': style, 'fillcolor': 'lightblue'}
-            graph_gv.node(step_node_name, **attrs)
             graph_nx.add_node(step_node_name)
             graphdata.nodes.append((step_node_name, attrs))
 
@@ -466,7 +561,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
             elif isinstance(arg_val, str):
                 arg_val = {'source': arg_val}
             # Use triple underscore for namespacing so we can split later
-            in_name = f'{step_name_i}___{arg_key}' # {step_name_i}_input___{arg_key}
+            in_name = sys.intern(f'{step_name_i}___{arg_key}') # {step_name_i}_input___{arg_key}
 
             # Add auxillary inputs for scatter steps
             if str(arg_key).startswith('__') and str(arg_key).endswith('__'):
@@ -494,6 +589,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                 assert arg_val['source'] in yaml_tree.get('inputs', {})
 
                 inputs_key_dict = yaml_tree['inputs'][arg_val['source']]
+                yaml_inputs_chk.setdefault(arg_val['source'], copy.copy(inputs_key_dict))
                 if 'doc' in inputs_key_dict:
                     inputs_key_dict['doc'] += '\\n' + in_dict.get('doc', '')
                 else:
@@ -504,7 +600,8 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     inputs_key_dict['label'] = in_dict.get('label', '')
 
                 if arg_val['source'] in input_mapping_copy:
-                    input_mapping_copy[arg_val['source']].append(in_name)
+                    # NOTE: Do not use append; the lists are shared with the call site.
+                    input_mapping_copy[arg_val['source']] = input_mapping_copy[arg_val['source']] + [in_name]
                 else:
                     input_mapping_copy[arg_val['source']] = [in_name]
                 # TODO: We have ~ syntax for input mapping; no notation for output mapping!
@@ -533,10 +630,10 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     in_dict = {**in_dict, 'value': arg_val}
                     inputs_file_workflow.update({in_name: in_dict})
                     steps[i][step_key]['in'][arg_key] = {'source': in_name}
-                    explicit_edge_defs_copy.update({arg_val['source']: (namespaces + [step_name_i], arg_key)})
+                    explicit_edge_defs_copy.update({arg_val['source']: ExplicitEdgeDef(namespaces + [step_name_i], arg_key)})
                     # Add a 'dummy' value to explicit_edge_calls, because
                     # that determines sub_args_provided when the recursion returns.
-                    explicit_edge_calls_copy.update({in_name: (namespaces + [step_name_i], arg_key)})
+                    explicit_edge_calls_copy.update({in_name: ExplicitEdgeDef(namespaces + [step_name_i], arg_key)})
                     # TODO: Show input node?
                 else:
                     raise Exception(f"Error! Multiple definitions of &{arg_val['source']}!")
@@ -560,12 +657,12 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     steps[i][step_key]['in'][arg_key] = {'source': in_name}
                     # Add a 'dummy' value to explicit_edge_calls anyway, because
                     # that determines sub_args_provided when the recursion returns.
-                    explicit_edge_calls_copy.update({in_name: (namespaces + [step_name_i], arg_key)})
+                    explicit_edge_calls_copy.update({in_name: ExplicitEdgeDef(namespaces + [step_name_i], arg_key)})
                 else:
                     (nss_def_init, var) =  explicit_edge_defs_copy[arg_val['source']]
 
-                    nss_def_embedded = var.split('___')[:-1]
-                    nss_call_embedded = arg_key.split('___')[:-1]
+                    nss_def_embedded = NamespacePath.parse(var).init().namespaces()
+                    nss_call_embedded = NamespacePath.parse(arg_key).init().namespaces()
                     nss_def = nss_def_init + nss_def_embedded
                     # [step_name_i] is correct; nss_def_init already contains step_name_j from the recursive call
                     nss_call = namespaces + [step_name_i] + nss_call_embedded
@@ -619,10 +716,11 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     out_key_init = '___'.join(nss_def_init + [var])
                     out_key = utils.get_output_mapping(output_mapping_copy, out_key_init)
 
-                    nss_def_embedded = out_key.split('___')[:-1]
+                    out_path = NamespacePath.parse(out_key)
+                    nss_def_embedded = out_path.init().namespaces()
 
                     # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
-                    if out_key.startswith('___'.join(nss_def_init)):
+                    if out_path.startswith(NamespacePath.from_namespaces(nss_def_init)):
                         nss_def = nss_def_embedded
 
                     # Add an edge, but in a carefully chosen subgraph.
@@ -634,7 +732,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     # The correct thing to do is to use the graph associated with
                     # the lowest_common_ancestor of the definition and call site.
                     # (This is the only reason we need to pass in all subgraphs.)
-                    label = var.split('___')[-1]
+                    label = NamespacePath.parse(var).segment
                     graph_init = subgraphs[len(nss_def_inits)]
                     # Let's use regular blue for explicit edges.
                     # Use constraint=false ?
@@ -644,10 +742,11 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                         # this should hopefully be correct.
 
                         # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
-                        nss_call_embedded = arg_key_.split('___')[:-1]
-                        if arg_key_.startswith('___'.join(namespaces + [step_name_i])):
+                        arg_path = NamespacePath.parse(arg_key_)
+                        nss_call_embedded = arg_path.init().namespaces()
+                        if arg_path.startswith(step_path):
                             nss_call = nss_call_embedded
-                        elif arg_key_.startswith(step_name_i):
+                        elif arg_path.startswith(NamespacePath.root().child(step_name_i)):
                             nss_call = namespaces + nss_call_embedded
                         else:
                             nss_call = namespaces + [step_name_i] + nss_call_embedded
@@ -674,19 +773,17 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                 steps[i][step_key]['in'][arg_key] = new_val
 
                 if args.graph_show_inputs:
-                    input_node_name = '___'.join(namespaces + [step_name_i, arg_key])
+                    input_node_name = f'{step_path}___{arg_key}'
                     attrs = {'label': arg_key, 'shape': 'box', 'style': 'rounded, filled', 'fillcolor': 'lightgreen'}
-                    graph_gv.node(input_node_name, **attrs)
                     font_edge_color = 'black' if args.graph_dark_theme else 'white'
-                    graph_gv.edge(input_node_name, step_node_name, color=font_edge_color)
                     graph_nx.add_node(input_node_name)
                     graph_nx.add_edge(input_node_name, step_node_name)
                     graphdata.nodes.append((input_node_name, attrs))
-                    graphdata.edges.append((input_node_name, step_node_name, {}))
+                    graphdata.edges.append((input_node_name, step_node_name, {'color': font_edge_color}))
 
         for arg_key in args_required:
             #print('arg_key', arg_key)
-            in_name = f'{step_name_i}___{arg_key}'
+            in_name = sys.intern(f'{step_name_i}___{arg_key}')
             if arg_key in args_provided:
                 continue  # We already covered this case above.
             if in_name in inputs_file_workflow:
@@ -709,8 +806,8 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                 # (See massive comment above.)
                 (nss_def_init, var) = explicit_edge_calls_copy[arg_key]
 
-                nss_def_embedded = var.split('___')[:-1]
-                nss_call_embedded = arg_key.split('___')[:-1]
+                nss_def_embedded = NamespacePath.parse(var).init().namespaces()
+                nss_call_embedded = NamespacePath.parse(arg_key).init().namespaces()
                 nss_def = nss_def_init + nss_def_embedded
                 # [step_name_i] is correct; nss_def_init already contains step_name_j from the recursive call
                 nss_call = namespaces + [step_name_i] + nss_call_embedded
@@ -748,7 +845,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                 steps[i] = inference.perform_edge_inference(args, tools, tools_lst, steps_keys,
                     yaml_stem, i, steps, arg_key, graph, is_root, namespaces,
                     vars_workflow_output_internal, input_mapping_copy, output_mapping_copy, inputs_workflow, in_name,
-                    in_name_in_inputs_file_workflow, arg_key_in_yaml_tree_inputs, conversions, wic_steps, testing)
+                    in_name_in_inputs_file_workflow, arg_key_in_yaml_tree_inputs, conversions, wic_steps, outputs_index, testing)
                 # NOTE: For now, perform_edge_inference mutably appends to
                 # inputs_workflow and vars_workflow_output_internal.
 
@@ -759,19 +856,59 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
                     print('Automaticaly inserting file format conversion', conversion, i)
                     if len(conversions) != 1:
                         print('Warning! More than one file format conversion! Choosing', conversion)
-
-                    yaml_tree_mod = insert_step_into_workflow(yaml_tree_orig, conversion, tools, i)
-
-                    node_data = NodeData(namespaces, yaml_stem, yaml_tree_mod, yaml_tree, {},
-                                         explicit_edge_defs_copy2, explicit_edge_calls_copy2,
-                                         graph, inputs_workflow, '')
-                    rose_tree = RoseTree(node_data, rose_tree_list)
-                    env_data = EnvData(input_mapping_copy, output_mapping_copy, inputs_file_workflow, vars_workflow_output_internal,
-                                       explicit_edge_defs_copy, explicit_edge_calls_copy)
-                    compiler_info = CompilerInfo(rose_tree, env_data)
-                    #node_data_dummy = NodeData(None, None, yaml_tree_mod, None, None, None, None, None, None, None)
-                    #compiler_info_dummy = CompilerInfo(RoseTree(node_data_dummy, None), None)
-                    return compiler_info
+                    break
+
+        if conversion is not None:
+            if iters == max_iters:
+                print(yaml.dump(yaml_tree_orig))
+                raise Exception(f'Error! Maximum number of iterations ({max_iters}) reached in compile_workflow!')
+            iters += 1
+
+            # Copy on write
+            yaml_tree_orig = insert_step_into_workflow(utils.copy_ast_spine(yaml_tree_orig),
+                                                       conversion, tools, i)
+
+            # Roll back the current step
+            for env_mapping in env_mappings_chk:
+                env_mapping.restore()
+            (inputs_workflow, inputs_file_workflow, input_mapping_copy, output_mapping_copy,
+             explicit_edge_defs_copy, explicit_edge_calls_copy) = env_mappings_chk
+            (explicit_edge_defs_chk, explicit_edge_calls_chk) = explicit_edge_chks
+            (len_vars, len_names, len_siblings, len_roses, len_tools) = lens_chk
+            del vars_workflow_output_internal[len_vars:]
+            del step_1_names[len_names:]
+            del sibling_subgraphs[len_siblings:]
+            del rose_tree_list[len_roses:]
+            del tools_lst[len_tools:]
+            if yaml_inputs_chk:
+                yaml_tree['inputs'].update(yaml_inputs_chk)
+            if wic_steps_chk is None:
+                wic_steps.pop(wic_steps_key, None)
+            else:
+                wic_steps[wic_steps_key] = wic_steps_chk
+            for subgraph_, graph_chk in zip(subgraphs, graph_chks):
+                utils_graphs.restore_graph(subgraph_, graph_chk)
+            graph_nx.remove_nodes_from(list(graph_nx)[graph_nx_len_chk:])
+            if not graph_nx_self_edge_chk and graph_nx.has_edge(inline_node, inline_node):
+                graph_nx.remove_edge(inline_node, inline_node)
+
+            # Insert the conversion step (see insert_step_into_workflow) and resume from it.
+            steps[i] = utils.copy_ast_spine(steps_orig[i])
+            steps.insert(i, {conversion.stem: None})
+            steps_orig.insert(i, steps[i])
+            steps_keys.insert(i, conversion.stem)
+            keystr = f'({i+1}, {conversion.stem})'
+            wic_steps = utils.reindex_wic_steps(wic_steps, i)
+            wic_steps[keystr] = yaml_tree_orig['wic']['steps'][keystr]
+
+            # The subsequent steps have been renumbered, so their namespaces have changed.
+            speculation.cancel_speculations(speculations)
+            env_chk = EnvData(input_mapping_copy, output_mapping_copy, {}, [],
+                              explicit_edge_defs_copy, explicit_edge_calls_copy)
+            speculations = speculation.submit_independent_subworkflows(args, namespaces, len(subgraphs), yaml_stem,
+                                                                       steps, wic_steps, subkeys, i + 1, env_chk,
+                                                                       relative_run_path, testing)
+            continue
 
         # Add CommandLineTool/Subworkflow outputs tags to workflow out tags.
         # Note: Add all output tags for now, but depending on config options,
@@ -785,9 +922,12 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         outputs_workflow.append(out_keyvals)
 
         steps[i] = utils_cwl.add_yamldict_keyval_out(steps[i], step_key, list(tool_i.cwl['outputs']))
+        i += 1
 
         #print()
 
+    speculation.cancel_speculations(speculations) # i.e. if any were invalidated
+
     # NOTE: add_subgraphs currently mutates graph
     wic_graphviz = wic['wic'].get('graphviz', {})
     ranksame_strs = wic_graphviz.get('ranksame', [])
@@ -795,7 +935,7 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
     steps_ranksame = []
     for num, name in ranksame_pairs:
         step_name_num = utils.step_name_str(yaml_stem, num-1, name)
-        step_name_nss = '___'.join(namespaces + [step_name_num])
+        step_name_nss = str(namespaces_path.child(step_name_num))
         steps_ranksame.append(f'"{step_name_nss}"') # Escape with double quotes.
     utils_graphs.add_subgraphs(args, graph, sibling_subgraphs, namespaces, step_1_names, steps_ranksame)
     step_name_1 = utils.get_step_name_1(step_1_names, yaml_stem, namespaces, steps_keys, subkeys)
@@ -862,8 +1002,12 @@ def compile_workflow_once(yaml_tree_ast: YamlTree,
         # The root workflow will be validated anyway.
         sub.run(cmd, check=False)
 
+    profiler.annotate('iterations', iters)
     if not testing:
-        print('finishing', ('  ' * len(namespaces)) + yaml_path)
+        if iters == 1:
+            print('finishing', ('  ' * len(namespaces)) + yaml_path)
+        else:
+            print('finishing', ('  ' * len(namespaces)) + yaml_path, f'({iters} iterations)')
     # Note: We do not necessarily need to return inputs_workflow.
     # 'Internal' inputs are encoded in yaml_tree. See Comment above.
     node_data = NodeData(namespaces, yaml_stem, yaml_tree_orig, yaml_tree, yaml_inputs,
@@ -900,9 +1044,9 @@ def insert_step_into_workflow(yaml_tree_orig: Yaml, stepid: StepId, tools: Tools
     inference_rules_dict = {}
     for out_key, out_val in out_tool.items():
         if 'format' in out_val:
-            inference_rules_dict[out_key] = inference_rules.get(out_val['format'], 'default')
+            inference_rules_dict[out_key] = inference_rules.get().get(out_val['format'], 'default')
     inf_dict = {'wic': {'inference': inference_rules_dict}}
-    keystr = f'({i+1}, {stepid})' # The yml file uses 1-based indexing
+    keystr = f'({i+1}, {stepid.stem})' # The yml file uses 1-based indexing
 
     if 'wic' in yaml_tree_mod:
         if 'steps' in yaml_tree_mod['wic']:
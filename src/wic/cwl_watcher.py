@@ -7,9 +7,7 @@ import sys
 import time
 from pathlib import Path
 from typing import Dict, List
-from unittest.mock import patch
 
-import graphviz
 import networkx as nx
 from jsonschema import Draft202012Validator
 
@@ -105,17 +103,15 @@ def rerun_cwltool(directory_realtime: Path, cachedir_path: Path, cwl_tool: str,
         time_initial = time.time()
 
         # Setup dummy args
-        testargs = ['wic', '--yaml', '', '--cwl_output_intermediate_files', 'True']  # ignore --yaml
         # For now, we need to enable --cwl_output_intermediate_files. See comment in compiler.py
-        with patch.object(sys, 'argv', testargs):
-            args = cli.parser.parse_args()
+        args = cli.get_args('', ['--cwl_output_intermediate_files', 'True'])  # ignore --yaml
 
         # TODO: Support other namespaces
         plugin_ns = 'global' # wic['wic'].get('namespace', 'global')
         yaml_path = f'{cwl_tool}_only.yml'
         stepid = StepId(yaml_path, plugin_ns)
         yaml_tree = YamlTree(stepid, yml)
-        subgraph = GraphReps(graphviz.Digraph(name=yaml_path), nx.DiGraph(), GraphData(yaml_path))
+        subgraph = GraphReps(nx.DiGraph(), GraphData(yaml_path))
         compiler_info = compiler.compile_workflow(yaml_tree, args, [], [subgraph], {}, {}, {}, {},
                                                   tools_cwl, True, relative_run_path=False, testing=False)
         rose_tree = compiler_info.rose
@@ -262,8 +258,8 @@ def main() -> None:
     yml_paths = get_yml_paths(yml_dirs_file)
 
     # Perform initialization via mutating global variables (This is not ideal)
-    compiler.inference_rules = dict(utils.read_lines_pairs(Path('inference_rules.txt')))
-    inference.renaming_conventions = utils.read_lines_pairs(Path('renaming_conventions.txt'))
+    compiler.inference_rules.set(dict(utils.read_lines_pairs(Path('inference_rules.txt'))))
+    inference.renaming_conventions.set(utils.read_lines_pairs(Path('renaming_conventions.txt')))
 
     # Generate schemas for validation
     yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
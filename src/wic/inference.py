@@ -1,13 +1,16 @@
 import argparse
+from contextvars import ContextVar
 from pathlib import Path
-from typing import Dict, List, Tuple
+import sys
+from typing import Any, Dict, List, Optional, Tuple
 
 from . import utils, utils_cwl, utils_graphs
-from .wic_types import (GraphReps, InternalOutputs, Namespaces, StepId, Tool, Tools,
-                        WorkflowInputs, Yaml)
+from .wic_types import (ConversionsIndex, GraphReps, InternalOutputs, Namespaces, NamespacePath, OutputsIndex,
+                        StepId, StepOutputs, Tool, Tools, TypeFormat, WorkflowInputs, Yaml)
 
 # NOTE: This must be initialized in main.py and/or cwl_watcher.py
-renaming_conventions: List[Tuple[str, str]] = []
+# NOTE: This is a ContextVar for thread safety. See compiler.inference_rules
+renaming_conventions: ContextVar[List[Tuple[str, str]]] = ContextVar('renaming_conventions', default=[])
 
 
 def perform_edge_inference(args: argparse.Namespace,
@@ -30,6 +33,7 @@ def perform_edge_inference(args: argparse.Namespace,
                            arg_key_in_yaml_tree_inputs: bool,
                            conversions: List[StepId],
                            wic_steps: Yaml,
+                           outputs_index: OutputsIndex,
                            testing: bool) -> Yaml:
     """This function implements the core edge inference feature.
     NOTE: steps[i], vars_workflow_output_internal, inputs_workflow are mutably updated.
@@ -45,7 +49,7 @@ def perform_edge_inference(args: argparse.Namespace,
         perform any inference (again, w.r.t. the current subworkflow) if i == 0.
         steps (List[Yaml]): The steps: tag of the current CWL workflow
         arg_key (str): The name of the CWL input tag that needs a concrete input value inferred
-        graph (GraphReps): A tuple of a GraphViz DiGraph and a networkx DiGraph
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
         is_root (bool): True if this is the root workflow (for debugging only)
         namespaces (Namespaces): Specifies the path in the AST of the current subworkflow
         vars_workflow_output_internal (InternalOutputs): Keeps track of output\n
@@ -59,6 +63,8 @@ def perform_edge_inference(args: argparse.Namespace,
         arg_key_in_yaml_tree_inputs (bool): Determines whether at least one level of recursion has been performed.
         conversions (List[StepId]): If exact inference fails, a list of possible file format conversions is stored here.
         wic_steps (Yaml): The metadata associated with the given workflow.
+        outputs_index (OutputsIndex): The outputs of the previous steps, indexed by type and format.\n
+        The steps are indexed (once) the first time they are needed, so this is mutably updated.
         testing: Used to disable some optional features which are unnecessary for testing.
 
     Returns:
@@ -85,178 +91,124 @@ def perform_edge_inference(args: argparse.Namespace,
         in_formats = in_tool[arg_key]['format']
         in_dict['format'] = in_formats
     #print('step_name_i, arg_key, in_formats', step_name_i, arg_key, in_formats)
-    format_matches_all = []
-    attempted_matches_all = []
-    break_inference = False
-    for j in range(0, i)[::-1]:  # Reverse order!
+
+    # Index the outputs of the previous steps (which have already been compiled)
+    # so that we do not need to re-scan all of them for every input.
+    for j in range(len(outputs_index.steps), i):
         wic_step_j = wic_steps.get(f'({j+1}, {steps_keys[j]})', {})
-        tool_j = tools_lst[j]
-        out_tool = tool_j.cwl['outputs']
-        # NOTE: The outputs of a CommandLineTool are all made available
-        # simultaneously. Although that is technically also true for subworkflows,
-        # the CommandLineTools within the subworkflow are certainly ordered,
-        # and so we definitely want to use reverse order here. As mentioned,
-        # it doesn't necessarily make sense for CommandLineTools, but the
-        # important thing is that we just define the order for users some way.
-        out_keys = list(tool_j.cwl['outputs'])[::-1] # Reverse order!
-        format_matches = []
-        attempted_matches = []
-        inference_rules = get_inference_rules(wic_step_j, Path(steps_keys[j]).stem)
-        namespace_emb_last_break = ''
-        for out_key in out_keys:
-            namespaces_embedded = out_key.split('___')
-            namespace_emb_last = '' if len(namespaces_embedded) <= 1 else namespaces_embedded[:-1][-1]  # -2?
-            if break_inference and namespace_emb_last != namespace_emb_last_break:
-                break # Only break once the namespace changes, i.e. on the next step
-            inference_rule = inference_rules.get(out_key, 'default')
-            # Apply 'continue' rule before iteration, to prevent matching
-            # TODO: This currently causes an infinite loop.
-            #if inference_rule == 'continue':
-            #    continue
-
-            out_dict = utils_cwl.copy_cwl_IO_dict(out_tool[out_key])
-
-            if 'scatter' in steps[j][steps_keys[j]]:
-                # Promote scattered output types to arrays
-                out_dict['type'] = {'type': 'array', 'items': out_dict['type']}
-
-            out_format = ''
-            if 'format' in out_tool[out_key]:
-                out_format = out_tool[out_key]['format']
-                out_dict['format'] = out_format
-            #if out_format == '':
-            #    #print('Warning! No output format! Cannot possibly match!')
-            #    print('Warning! No output format! Will match anything!')
-            #    print(f'out_key {out_key}')
-            #print('out_key, out_format, rule', out_key, out_format, inference_rule)
-            attempted_matches.append((out_key, out_format))
-            # Great! We found an 'exact' type and format match.
-            if (out_dict['type'] == in_dict['type']) and (out_format in in_formats): # or out_format == ''
-                format_matches.append((out_key, out_format))
-
-            # Apply 'break' rule after iteration, to allow matching
-            if inference_rule == 'break':
-                break_inference = True
-                namespace_emb_last_break = namespace_emb_last
-
-        format_matches_all.append(format_matches)
-        attempted_matches_all.append(attempted_matches)
-        # Most log files just have format_2330 "Textual format", but this can
-        # conflict with other structured text files that also have format_2330.
-        # Unfortunately, the edam formats are not very finely curated, so they
-        # are not very 'exact'. For now, we can perform additional matching
-        # based on naming conventions and/or we can simply exclude log files
-        # (which are not usually parsed or otherwise used as inputs).
-        # Eventually, we will want to improve the format curation.
-        # NOTE: Use underscores to prevent excluding e.g. 'topology'
-        # This isn't great, but works for now (until someone uses '_log_' ...)
-        format_matches = [x for x in format_matches if not '_log_' in x[0]]
-        #print('format_matches', format_matches)
-        if not len(format_matches) == 0:
-            # By default, simply choose the first (i.e. most-recent) matching format
-            out_key = format_matches[0][0]
-
-            if args.inference_use_naming_conventions: # default False
-                if len(format_matches) == 1:
-                    # Great! We found a unique format match.
+        index_step_outputs(outputs_index, tools_lst[j], steps[j][steps_keys[j]], steps_keys[j], wic_step_j)
+
+    # Find the most recent previous step with an 'exact' type and format match.
+    (j, format_matches) = find_format_matches(outputs_index, i, in_dict['type'], in_formats)
+    #print('format_matches', format_matches)
+    if not len(format_matches) == 0:
+        # By default, simply choose the first (i.e. most-recent) matching format
+        out_key = format_matches[0][0]
+
+        if args.inference_use_naming_conventions: # default False
+            if len(format_matches) == 1:
+                # Great! We found a unique format match.
+                out_key = format_matches[0][0]
+            else:
+                name_matches = []
+                # NOTE: The biobb CWL files do not use consistent naming
+                # conventions, so we need to perform some renamings here.
+                # Eventually, the CWL files themselves should be fixed.
+                arg_key_no_namespace = NamespacePath.parse(arg_key).segment
+                arg_key_renamed = arg_key_no_namespace.replace('input_', '')
+                for name1, name2 in renaming_conventions.get():
+                    arg_key_renamed = arg_key_renamed.replace(name1, name2)
+
+                for out_key, out_format in format_matches:
+                    out_key_no_namespace = NamespacePath.parse(out_key).segment
+                    out_key_renamed = out_key_no_namespace.replace('output_', '')
+                    if arg_key_renamed == out_key_renamed:
+                        name_matches.append((out_key, out_format))
+
+                if len(name_matches) == 0:
+                    #s = f"""Found multiple outputs with compatible types and formats
+                    #(but no matching names) for input {arg_key}"""
+                    #print(s)
+                    #for m in format_matches:
+                    #    print(m)
+                    #print(f'Arbitrarily choosing the first match {format_matches[0][0]}')
                     out_key = format_matches[0][0]
-                else:
-                    name_matches = []
-                    # NOTE: The biobb CWL files do not use consistent naming
-                    # conventions, so we need to perform some renamings here.
-                    # Eventually, the CWL files themselves should be fixed.
-                    arg_key_no_namespace = arg_key.split('___')[-1]
-                    arg_key_renamed = arg_key_no_namespace.replace('input_', '')
-                    for name1, name2 in renaming_conventions:
-                        arg_key_renamed = arg_key_renamed.replace(name1, name2)
-
-                    for out_key, out_format in format_matches:
-                        out_key_no_namespace = out_key.split('___')[-1]
-                        out_key_renamed = out_key_no_namespace.replace('output_', '')
-                        if arg_key_renamed == out_key_renamed:
-                            name_matches.append((out_key, out_format))
-
-                    if len(name_matches) == 0:
-                        #s = f"""Found multiple outputs with compatible types and formats
-                        #(but no matching names) for input {arg_key}"""
-                        #print(s)
-                        #for m in format_matches:
-                        #    print(m)
-                        #print(f'Arbitrarily choosing the first match {format_matches[0][0]}')
-                        out_key = format_matches[0][0]
-                    elif len(name_matches) == 1:
+                elif len(name_matches) == 1:
 # NOTE: This clause currently causes problems with file format conversions.
 # Specifically, we want to convert from format A to B, perform the calculation
 # in format B, then convert the results back to format A. However, if the
 # naming conventions of the result do not match the second conversion
 # (but DO match the first conversion), the files will be directly converted
 # fom A to B to A, thus skipping the calculation in B entirely!
-                        # Great! We found a unique match.
-                        out_key = name_matches[0][0]
-                        #print('unique match', out_key)
-                    else:
-                        #s = f"""Found multiple outputs with compatible types and formats
-                        #(and multiple matching names) for input {arg_key}"""
-                        #print(s)
-                        #for m in name_matches:
-                        #    print(m)
-                        #print(f'Arbitrarily choosing the first match {name_matches[0][0]}')
-                        out_key = name_matches[0][0]
-
-            #print('match!', j)  # We found a match!
-            # Generate a new namespace for out_key using the step number and add to inputs
-            step_name_j = utils.step_name_str(yaml_stem, j, steps_keys[j])
-
-            # We also need to keep track of the 'internal' output variables
-            if tool_j.cwl['class'] == 'Workflow':
-                vars_workflow_output_internal.append(out_key)
-            else:
-                vars_workflow_output_internal.append(f'{step_name_j}/{out_key}')
+                    # Great! We found a unique match.
+                    out_key = name_matches[0][0]
+                    #print('unique match', out_key)
+                else:
+                    #s = f"""Found multiple outputs with compatible types and formats
+                    #(and multiple matching names) for input {arg_key}"""
+                    #print(s)
+                    #for m in name_matches:
+                    #    print(m)
+                    #print(f'Arbitrarily choosing the first match {name_matches[0][0]}')
+                    out_key = name_matches[0][0]
+
+        #print('match!', j)  # We found a match!
+        tool_j = tools_lst[j]
+        # Generate a new namespace for out_key using the step number and add to inputs
+        step_name_j = utils.step_name_str(yaml_stem, j, steps_keys[j])
+
+        #arg_val = {'source': f'{step_name_j}/{out_key}'}
+        # NOTE: Subworkflows are compiled many times (i.e. once per call site and
+        # when resuming after conversions), so intern to share a single copy.
+        arg_val = sys.intern(f'{step_name_j}/{out_key}')
+
+        # We also need to keep track of the 'internal' output variables
+        if tool_j.cwl['class'] == 'Workflow':
+            vars_workflow_output_internal.append(out_key)
+        else:
+            vars_workflow_output_internal.append(arg_val)
+        arg_keyval = {arg_key: arg_val}
+        steps_i = utils_cwl.add_yamldict_keyval_in(steps[i], step_key, arg_keyval)
+        #print(f'inference i {i} y arg_key {arg_key}')
+
+        arg_keys = [in_name] if in_name in input_mapping else [arg_key]
+        arg_keys = utils.get_input_mappings(input_mapping, arg_keys, arg_key_in_yaml_tree_inputs)
 
-            #arg_val = {'source': f'{step_name_j}/{out_key}'}
-            arg_val = f'{step_name_j}/{out_key}'
-            arg_keyval = {arg_key: arg_val}
-            steps_i = utils_cwl.add_yamldict_keyval_in(steps[i], step_key, arg_keyval)
-            #print(f'inference i {i} y arg_key {arg_key}')
+        out_key = utils.get_output_mapping(output_mapping, out_key)
 
-            arg_keys = [in_name] if in_name in input_mapping else [arg_key]
-            arg_keys = utils.get_input_mappings(input_mapping, arg_keys, arg_key_in_yaml_tree_inputs)
+        out_path = NamespacePath.parse(out_key)
+        nss_embedded1 = out_path.init().namespaces()
+        namespaces_path = NamespacePath.from_namespaces(namespaces)
+        root_path = NamespacePath.root()
 
-            out_key = utils.get_output_mapping(output_mapping, out_key)
+        # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
+        if out_path.startswith(namespaces_path.child(step_name_j)):
+            nss1 = nss_embedded1
+        elif out_path.startswith(root_path.child(step_name_j)):
+            nss1 = namespaces + nss_embedded1
+        else:
+            nss1 = namespaces + [step_name_j] + nss_embedded1
 
-            nss_embedded1 = out_key.split('___')[:-1]
+        for arg_key_ in arg_keys:
+            # Determine which head and tail node to use for the new edge
+            # First we need to extract the embedded namespaces
+            arg_path = NamespacePath.parse(arg_key_)
+            nss_embedded2 = arg_path.init().namespaces()
 
             # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
-            if out_key.startswith('___'.join(namespaces + [step_name_j])):
-                nss1 = nss_embedded1
-            elif out_key.startswith(step_name_j):
-                nss1 = namespaces + nss_embedded1
+            if arg_path.startswith(namespaces_path.child(step_name_i)):
+                nss2 = nss_embedded2
+            elif arg_path.startswith(root_path.child(step_name_i)):
+                nss2 = namespaces + nss_embedded2
             else:
-                nss1 = namespaces + [step_name_j] + nss_embedded1
-
-            for arg_key_ in arg_keys:
-                # Determine which head and tail node to use for the new edge
-                # First we need to extract the embedded namespaces
-                nss_embedded2 = arg_key_.split('___')[:-1]
-
-                # NOTE: This if statement is unmotivated and probably masking some other bug, but it works.
-                if arg_key_.startswith('___'.join(namespaces + [step_name_i])):
-                    nss2 = nss_embedded2
-                elif arg_key_.startswith(step_name_i):
-                    nss2 = namespaces + nss_embedded2
-                else:
-                    nss2 = namespaces + [step_name_i] + nss_embedded2
+                nss2 = namespaces + [step_name_i] + nss_embedded2
 
-                # TODO: check this
-                out_key_no_namespace = out_key.split('___')[-1]
-                label = out_key_no_namespace if tool_j.cwl['class'] == 'Workflow' else out_key
-                utils_graphs.add_graph_edge(args, graph, nss1, nss2, label)
+            # TODO: check this
+            out_key_no_namespace = out_path.segment
+            label = out_key_no_namespace if tool_j.cwl['class'] == 'Workflow' else out_key
+            utils_graphs.add_graph_edge(args, graph, nss1, nss2, label)
 
-            return steps_i  # Short circuit
-
-        # Stop performing inference if the inference rule is 'break'
-        if break_inference:
-            break
+        return steps_i  # Short circuit
 
     # If no match yet, we can look for a potential file format conversion.
     # NOTE: What we are doing here is basically a simplified version of the
@@ -264,40 +216,37 @@ def perform_edge_inference(args: argparse.Namespace,
     # The problem with APE (and SAT solvers in general) is that the number of
     # solutions typically increases exponentially with the number of variables.
     # APE forces the user to manually choose which solution is correct. We want
-    # to find unique solutions (if possible), so limit to n=1 inserted steps.
-    out_formats = [out_format for attempted_matches in attempted_matches_all
-                              for (out_key_, out_format) in attempted_matches]
+    # to find unique solutions (if possible), so by default limit to n=1 inserted
+    # steps. (See --inference_max_conversion_steps)
+    out_formats = []
+    if len(in_formats) != 0:
+        out_formats = [out_format for (out_key_, out_format) in get_attempted_matches(outputs_index, i)]
     #print('out_formats', out_formats)
+    # For now, let's restrict to a whitelist of known file format
+    # conversions. Otherwise, there are way too many solutions.
+    # (In principle, this can be used to insert arbitrary subworkflows.)
+    conversions_index = get_conversions_index(tools)
     for in_format in in_formats:
         for out_format in out_formats:
             # Obviously we don't need a conversion if the file formats are the same.
             if in_format == out_format:
                 continue
-
-            for step_id, tool in tools.items():
-                # For now, let's restrict to a whitelist of known file format
-                # conversions. Otherwise, there are way too many solutions.
-                # (In principle, this can be used to insert arbitrary subworkflows.)
-                if not step_id.stem.startswith('conversion_'):
-                    continue
-
-                in_tool = tool.cwl['inputs']
-                tool_in_formats = [arg_val['format'] for arg_key, arg_val in in_tool.items() if 'format' in arg_val]
-                tool_in_formats_flat = utils.flatten(tool_in_formats)
-
-                out_tool = tool.cwl['outputs']
-                tool_out_formats = [out_val['format'] for out_key, out_val in out_tool.items() if 'format' in out_val]
-
-                # NOTE: Ideally, the second condition should really check that
-                # ALL required inputs for the intermediate tool match with the
-                # an element of out_formats. Since we cannot easily do that here,
-                # we need to tentatively insert tool into the AST and re-compile.
-                # However, that can easily fail (i.e. if there is one transitive
-                # match). See docs/algorithms.md for more details.
-                if in_format in tool_out_formats and out_format in tool_in_formats_flat:
-                    # We may have found a file format conversion.
-                    #print('step_id.stem, in_format, out_format:', step_id.stem, in_format, out_format)
-                    conversions.append(step_id)
+            # NOTE: Ideally, we should really check that ALL required inputs
+            # for the intermediate tool match with an element of out_formats.
+            # Since we cannot easily do that here, we need to tentatively
+            # insert the tool into the AST and re-compile. However, that can
+            # easily fail (i.e. if there is one transitive match).
+            # See docs/algorithms.md for more details.
+            if isinstance(in_format, str) and isinstance(out_format, str):
+                # We may have found a file format conversion.
+                conversions += conversions_index.get((out_format, in_format), [])
+
+    if len(conversions) == 0 and args.inference_max_conversion_steps > 1 and len(out_formats) != 0:
+        # If there are no direct conversions, look for the shortest sequence of
+        # conversions and insert the first step. Once the first step has been
+        # inserted, the remaining steps will be found in the subsequent iterations.
+        conversions += find_first_conversions(conversions_index, in_formats, out_formats,
+                                              args.inference_max_conversion_steps)
 
     match = False
     if not match:
@@ -312,10 +261,10 @@ def perform_edge_inference(args: argparse.Namespace,
             print('Error! No match found for input', i + 1, step_key, arg_key)
             # NOTE: The following print statement is a bit misleading because
             # we don't print out any attempted matches in the recursive case.
-            print('number of attempted matches ', len(utils.flatten(attempted_matches_all)))
-            for a_m in attempted_matches_all:
-                for m in a_m:
-                    print(m)
+            attempted_matches = get_attempted_matches(outputs_index, i)
+            print('number of attempted matches ', len(attempted_matches))
+            for m in attempted_matches:
+                print(m)
 
         # Add an input name to this subworkflow (only). Do not add to
         # inputs_file_workflow because this may be an internal input,
@@ -336,6 +285,254 @@ def perform_edge_inference(args: argparse.Namespace,
     return steps[i]
 
 
+def index_step_outputs(outputs_index: OutputsIndex, tool_j: Tool, step_j: Yaml,
+                       step_key_j: str, wic_step_j: Yaml) -> None:
+    """Indexes the outputs of a (compiled) step by type and format, so that
+    edge inference does not need to re-scan them for every subsequent input.\n
+    NOTE: outputs_index is mutably updated. The step number is the number of steps already indexed.
+
+    Args:
+        outputs_index (OutputsIndex): The outputs of the previous steps, indexed by type and format.
+        tool_j (Tool): The CWL CommandLineTool or compiled subworkflow of the step.
+        step_j (Yaml): The contents of the step, i.e. steps[j][step_key_j]
+        step_key_j (str): The name of the step
+        wic_step_j (Yaml): The metadata associated with the step (if any)
+    """
+    j = len(outputs_index.steps)
+    out_tool = tool_j.cwl['outputs']
+    # NOTE: The outputs of a CommandLineTool are all made available
+    # simultaneously. Although that is technically also true for subworkflows,
+    # the CommandLineTools within the subworkflow are certainly ordered,
+    # and so we definitely want to use reverse order here. As mentioned,
+    # it doesn't necessarily make sense for CommandLineTools, but the
+    # important thing is that we just define the order for users some way.
+    out_keys = list(out_tool)[::-1] # Reverse order!
+    attempted: List[Tuple[str, Any, Any]] = []
+    matches: Dict[TypeFormat, List[Tuple[int, str]]] = {}
+    inference_rules = get_inference_rules(wic_step_j, Path(step_key_j).stem)
+    is_scattered = 'scatter' in step_j
+    break_inference = False
+    namespace_emb_last_break = ''
+    for out_key in out_keys:
+        namespace_emb_last = NamespacePath.parse(out_key).init().segment  # -2?
+        if break_inference and namespace_emb_last != namespace_emb_last_break:
+            break # Only break once the namespace changes, i.e. on the next step
+        inference_rule = inference_rules.get(out_key, 'default')
+        # Apply 'continue' rule before iteration, to prevent matching
+        # TODO: This currently causes an infinite loop.
+        #if inference_rule == 'continue':
+        #    continue
+
+        # NOTE: This is equivalent to utils_cwl.copy_cwl_IO_dict(out_tool[out_key])['type']
+        out_type = utils_cwl.canonicalize_type(out_tool[out_key]['type'])
+
+        if is_scattered:
+            # Promote scattered output types to arrays
+            out_type = {'type': 'array', 'items': out_type}
+
+        out_format = ''
+        if 'format' in out_tool[out_key]:
+            out_format = out_tool[out_key]['format']
+        #if out_format == '':
+        #    #print('Warning! No output format! Cannot possibly match!')
+        #    print('Warning! No output format! Will match anything!')
+        #    print(f'out_key {out_key}')
+        #print('out_key, out_format, rule', out_key, out_format, inference_rule)
+        attempted.append((out_key, out_type, out_format))
+
+        # Most log files just have format_2330 "Textual format", but this can
+        # conflict with other structured text files that also have format_2330.
+        # Unfortunately, the edam formats are not very finely curated, so they
+        # are not very 'exact'. For now, we can perform additional matching
+        # based on naming conventions and/or we can simply exclude log files
+        # (which are not usually parsed or otherwise used as inputs).
+        # Eventually, we will want to improve the format curation.
+        # NOTE: Use underscores to prevent excluding e.g. 'topology'
+        # This isn't great, but works for now (until someone uses '_log_' ...)
+        # NOTE: Input formats are lists of strings, so other output formats cannot match.
+        if not '_log_' in out_key and isinstance(out_format, str):
+            type_format = (utils_cwl.hashable_type(out_type), out_format)
+            matches.setdefault(type_format, []).append((len(attempted) - 1, out_key))
+
+        # Apply 'break' rule after iteration, to allow matching
+        if inference_rule == 'break':
+            break_inference = True
+            namespace_emb_last_break = namespace_emb_last
+
+    outputs_index.steps.append(StepOutputs(attempted, matches, break_inference))
+    for type_format in matches:
+        outputs_index.matches.setdefault(type_format, []).append(j)
+    if break_inference:
+        # Stop performing inference (w.r.t. all subsequent steps) beyond this step.
+        outputs_index.breaks.append(j)
+
+
+def get_break_step(outputs_index: OutputsIndex, i: int) -> int:
+    """Determines the earliest step (before step i) whose outputs can be inferred,
+    i.e. the most recent step with a 'break' inference rule (if any).
+
+    Args:
+        outputs_index (OutputsIndex): The outputs of the previous steps, indexed by type and format.
+        i (int): The (zero-based) step number w.r.t. the current subworkflow.
+
+    Returns:
+        int: The (zero-based) step number
+    """
+    # NOTE: Since step i has not been indexed yet, all of the breaks are before step i.
+    return outputs_index.breaks[-1] if len(outputs_index.breaks) != 0 else 0
+
+
+def find_format_matches(outputs_index: OutputsIndex, i: int,
+                        in_type: Any, in_formats: Any) -> Tuple[int, List[Tuple[str, Any]]]:
+    """Finds the most recent previous step which has outputs with the given type and formats.
+
+    Args:
+        outputs_index (OutputsIndex): The outputs of the previous steps, indexed by type and format.
+        i (int): The (zero-based) step number w.r.t. the current subworkflow.
+        in_type (Any): The (canonical) type of the input.
+        in_formats (Any): The formats of the input (if any).
+
+    Returns:
+        Tuple[int, List[Tuple[str, Any]]]: The step number and the (non-log) matching\n
+        (out_key, out_format) pairs, in order, or (-1, []) if there are no matches.
+    """
+    j_break = get_break_step(outputs_index, i)
+    if not (isinstance(in_formats, List) and all(isinstance(x, str) for x in in_formats)):
+        # NOTE: If in_formats is a str, `out_format in in_formats` is a substring check!
+        # This is almost certainly unintended, but let's preserve the semantics.
+        for j in range(j_break, i)[::-1]:  # Reverse order!
+            format_matches = [(out_key, out_format)
+                              for (out_key, out_type, out_format) in outputs_index.steps[j].attempted
+                              if out_type == in_type and out_format in in_formats and not '_log_' in out_key]
+            if len(format_matches) != 0:
+                return (j, format_matches)
+        return (-1, [])
+
+    in_type_key = utils_cwl.hashable_type(in_type)
+    type_formats = [(in_type_key, in_format) for in_format in dict.fromkeys(in_formats)]
+    # The most recent step with at least one match for any of the input formats
+    j_match = max([outputs_index.matches[tf][-1] for tf in type_formats if tf in outputs_index.matches],
+                  default=-1)
+    if j_match < j_break:
+        return (-1, [])
+
+    step_outputs = outputs_index.steps[j_match]
+    matches = sorted((index, out_key, type_format[1]) for type_format in type_formats
+                     for (index, out_key) in step_outputs.matches.get(type_format, []))
+    return (j_match, [(out_key, out_format) for (index, out_key, out_format) in matches])
+
+
+def get_attempted_matches(outputs_index: OutputsIndex, i: int) -> List[Tuple[str, Any]]:
+    """Returns all of the (out_key, out_format) pairs that edge inference attempts to match, in order.
+
+    Args:
+        outputs_index (OutputsIndex): The outputs of the previous steps, indexed by type and format.
+        i (int): The (zero-based) step number w.r.t. the current subworkflow.
+
+    Returns:
+        List[Tuple[str, Any]]: The (out_key, out_format) pairs
+    """
+    j_break = get_break_step(outputs_index, i)
+    return [(out_key, out_format) for j in range(j_break, i)[::-1]  # Reverse order!
+            for (out_key, out_type, out_format) in outputs_index.steps[j].attempted]
+
+
+# The file format conversions index is built once for each Tools.
+# See get_conversions_index()
+conversions_index_cache: List[Tuple[Tools, int, ConversionsIndex]] = []
+# NOTE: The index of the tools of the current compilation, if it has already been built.
+# This is a ContextVar so that each api.Compiler can build the index once, even though
+# each compilation uses a (shallow) copy of its tools. See compiler.inference_rules
+tools_conversions_index: ContextVar[Optional[ConversionsIndex]] = ContextVar('tools_conversions_index',
+                                                                             default=None)
+
+
+def get_conversions_index(tools: Tools) -> ConversionsIndex:
+    """Indexes the file format conversions (i.e. the tools whose names start with conversion_)\n
+    by their (source format, target format), so that finding a conversion is a dict lookup.\n
+    The index is built the first time it is needed for the given tools, and then reused.
+    (If tools_conversions_index is set, it is the index of tools.)
+
+    Args:
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+
+    Returns:
+        ConversionsIndex: The file format conversions, indexed by (source format, target format)
+    """
+    conversions_index_ = tools_conversions_index.get()
+    if conversions_index_ is not None:
+        return conversions_index_
+
+    # NOTE: The compiler adds a few tools (i.e. python_script) to tools, so also check the length.
+    for (tools_, len_tools, conversions_index) in conversions_index_cache:
+        if tools_ is tools and len_tools == len(tools):
+            return conversions_index
+
+    conversions_index = {}
+    for step_id, tool in tools.items():
+        if not step_id.stem.startswith('conversion_'):
+            continue
+
+        in_tool = tool.cwl['inputs']
+        tool_in_formats = [arg_val['format'] for arg_key, arg_val in in_tool.items() if 'format' in arg_val]
+        tool_in_formats_flat = utils.flatten(tool_in_formats)
+
+        out_tool = tool.cwl['outputs']
+        tool_out_formats = [out_val['format'] for out_key, out_val in out_tool.items() if 'format' in out_val]
+
+        # NOTE: Formats are strs; dict.fromkeys() removes duplicates but preserves the order.
+        for in_format in dict.fromkeys(x for x in tool_in_formats_flat if isinstance(x, str)):
+            for out_format in dict.fromkeys(x for x in tool_out_formats if isinstance(x, str)):
+                conversions_index.setdefault((in_format, out_format), []).append(step_id)
+
+    # Keep a reference to tools so that the identity check above is valid.
+    conversions_index_cache[:] = [(tools, len(tools), conversions_index)]
+    return conversions_index
+
+
+def find_first_conversions(conversions_index: ConversionsIndex, in_formats: List[str],
+                           out_formats: List[str], max_steps: int) -> List[StepId]:
+    """Finds the shortest sequences of file format conversions (of length at most max_steps)
+    from any of out_formats to any of in_formats, using breadth-first search.
+
+    Args:
+        conversions_index (ConversionsIndex): The file format conversions, indexed by (source format, target format)
+        in_formats (List[str]): The target formats, i.e. the formats of the input.
+        out_formats (List[str]): The source formats, i.e. the formats of the previous outputs.
+        max_steps (int): The maximum number of conversions
+
+    Returns:
+        List[StepId]: The first conversion of each of the shortest sequences (if any)
+    """
+    targets = set(x for x in in_formats if isinstance(x, str))
+    successors: Dict[str, List[Tuple[str, StepId]]] = {}
+    for (source, target), step_ids in conversions_index.items():
+        successors.setdefault(source, []).extend((target, step_id) for step_id in step_ids)
+
+    # Map each reachable format to the first conversions of the shortest sequences reaching it.
+    frontier: Dict[str, List[StepId]] = {}
+    for out_format in out_formats:
+        if isinstance(out_format, str) and out_format not in targets:
+            frontier[out_format] = []
+    visited = set(frontier)
+    for step in range(max_steps):
+        frontier_next: Dict[str, List[StepId]] = {}
+        for source, firsts in frontier.items():
+            for (target, step_id) in successors.get(source, []):
+                if target in visited:
+                    continue
+                firsts_next = frontier_next.setdefault(target, [])
+                for first in (firsts if step != 0 else [step_id]):
+                    if first not in firsts_next:
+                        firsts_next.append(first)
+        firsts_targets = [first for target, firsts in frontier_next.items() if target in targets for first in firsts]
+        if len(firsts_targets) != 0:
+            return firsts_targets
+        visited.update(frontier_next)
+        frontier = frontier_next
+    return []
+
+
 def get_inference_rules(wic: Yaml, step_key_parent: str) -> Dict[str, str]:
     """Recursively traverses the wic: metadata annotation AST and extracts any inference rules.\n
     See docs/userguide.md for more information.
@@ -6,7 +6,7 @@ from typing import Dict, List
 import requests
 import yaml
 
-from . import __version__, utils
+from . import __version__, utils, utils_yaml
 from .wic_types import KV, Cwl, NodeData, RoseTree, StepId, Tools
 
 
@@ -37,9 +37,9 @@ def remove_dot_dollar(tree: Cwl) -> Cwl:
     Returns:
         Cwl: A Cwl document with . and $ removed from $namespaces and $schemas
     """
-    tree_str = str(yaml.dump(tree, sort_keys=False, line_break='\n', indent=2))
+    tree_str = utils_yaml.dump(tree, sort_keys=False, line_break='\n', indent=2)
     tree_str_no_dd = tree_str.replace('$namespaces', 'namespaces').replace('$schemas', 'schemas').replace('.yml', '_yml')
-    tree_no_dd: Cwl = yaml.safe_load(tree_str_no_dd)  # This effectively copies tree
+    tree_no_dd: Cwl = utils_yaml.safe_load(tree_str_no_dd)  # This effectively copies tree
     return tree_no_dd
 
 
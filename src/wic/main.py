@@ -1,20 +1,24 @@
+import argparse
 import logging
 import glob
 import json
+import pickle
 import subprocess as sub
 import sys
 import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Iterable, Tuple
 
 import cwltool
 import graphviz
 import networkx as nx
-import yaml
+from jsonschema import Draft202012Validator
 
-from . import ast, cli, compiler, inference, labshare, utils, utils_graphs
+from . import (__version__, ast, cli, client, compiler, inference, labshare, profiler, speculation, sweep, utils,
+               utils_graphs, utils_yaml)
 from .schemas import wic_schema
-from .wic_types import Cwl, GraphData, GraphReps, Json, StepId, Tool, Tools, Yaml, YamlTree
+from .wic_types import (AstCache, Cwl, GraphData, GraphReps, Json, RoseTree, StepId, Tool, Tools, Yaml,
+                        YamlTree)
 
 
 # Filter out the "... previously defined" id uniqueness validation warnings
@@ -28,16 +32,68 @@ logger_salad = logging.getLogger("salad")
 logger_salad.addFilter(NoPreviouslyDefinedFilter())
 
 
-def get_tools_cwl(cwl_dirs_file: Path) -> Tools:
+# The parsed contents of each CWL CommandLineTool, keyed on the absolute path
+# of the cwl file and validated using the (st_mtime_ns, st_size) of the file.
+ToolsCache = Dict[str, Tuple[Tuple[int, int], Cwl]]
+tools_cache_file = Path('autogenerated/tools_cache.pickle')
+
+
+def read_tools_cache(cache_file: Path) -> ToolsCache:
+    """Reads the on-disk cache of parsed CWL CommandLineTools (if any).
+
+    Args:
+        cache_file (Path): The path to the cache file
+
+    Returns:
+        ToolsCache: The cached tools, or an empty dict if the cache is missing, corrupt, or stale.
+    """
+    if not cache_file.exists():
+        return {}
+    try:
+        with open(cache_file, mode='rb') as f:
+            cache = pickle.load(f)
+        # Invalidate the entire cache whenever wic is upgraded, since the
+        # post-processing in get_tools_cwl() may have changed.
+        if cache.get('version') == __version__:
+            tools: ToolsCache = cache['tools']
+            return tools
+        print(f'Warning! Discarding {cache_file} from an incompatible version of wic.')
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError) as e:
+        # If the cache is corrupt (i.e. an interrupted write in an older
+        # version), simply rebuild it from scratch.
+        print(f'Warning! Discarding corrupt {cache_file}: {e!r}')
+    return {}
+
+
+def write_tools_cache(cache_file: Path, tools: ToolsCache) -> None:
+    """Atomically writes the cache of parsed CWL CommandLineTools to disk.
+
+    Args:
+        cache_file (Path): The path to the cache file
+        tools (ToolsCache): The tools to be cached
+    """
+    cache = {'version': __version__, 'tools': tools}
+    utils.write_file_atomic(cache_file, pickle.dumps(cache, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def get_tools_cwl(cwl_dirs_file: Path, use_cache: bool = True) -> Tools:
     """Uses glob() to find all of the CWL CommandLineTool definition files within any subdirectory of cwl_dir
 
     Args:
         cwl_dirs_file (Path): The subdirectories in which to search for CWL CommandLineTools
+        use_cache (bool): Reuse the parsed contents of unchanged cwl files from autogenerated/tools_cache.pickle
 
     Returns:
         Tools: The CWL CommandLineTool definitions found using glob()
     """
     utils.copy_config_files()
+    # Parsing hundreds of cwl files dominates the startup time, and the cwl
+    # files rarely change, so cache the parsed files. Each entry is
+    # invalidated individually when its modification time or size changes.
+    tools_cache = read_tools_cache(tools_cache_file) if use_cache else {}
+    tools_cache_new: ToolsCache = {}
+    hits = 0
+    misses = 0
     # Load ALL of the tools.
     tools_cwl: Tools = {}
     cwl_dirs = utils.read_lines_pairs(cwl_dirs_file)
@@ -59,7 +115,7 @@ def get_tools_cwl(cwl_dirs_file: Path) -> Tools:
         cwl_paths_sorted = sorted(glob.glob(pattern_cwl, recursive=True), key=len, reverse=True)
         Path('autogenerated/schemas/tools/').mkdir(parents=True, exist_ok=True)
         if len(cwl_paths_sorted) == 0:
-            print(f'Warning! No cwl files found in {cwl_dir_rel}.\nCheck {cwl_dirs_file.absolute()}')
+            print(f'Warning! No cwl files found in {cwl_dir_rel}.\nCheck {Path(cwl_dirs_file).absolute()}')
             print('This almost certainly means you are not in the correct directory.')
         # These two cwl files throw a yaml.scanner.ScannerError, but they are both legacy, so ignore.
         exceptions = ['biobb/biobb_adapters/cwl/biobb_md/gromacs_extra/ndx2resttop.cwl',
@@ -68,17 +124,37 @@ def get_tools_cwl(cwl_dirs_file: Path) -> Tools:
             if any(e in cwl_path_str for e in exceptions):
                 continue
             #print(cwl_path)
-            with open(cwl_path_str, mode='r', encoding='utf-8') as f:
-                tool: Cwl = yaml.safe_load(f.read())
-            stem = Path(cwl_path_str).stem
-            # print(stem)
-            # Add / overwrite stdout and stderr
-            tool.update({'stdout': f'{stem}.out'})
-            tool.update({'stderr': f'{stem}.err'})
-            step_id = StepId(stem, plugin_ns)
+            cwl_path_abs = os.path.abspath(cwl_path_str)
+            stat = os.stat(cwl_path_abs)
+            cache_key = (stat.st_mtime_ns, stat.st_size)
+            cached = tools_cache.get(cwl_path_abs)
+            if cached is not None and cached[0] == cache_key:
+                tool: Cwl = cached[1]
+                hits += 1
+            else:
+                with open(cwl_path_str, mode='r', encoding='utf-8') as f:
+                    tool = utils_yaml.safe_load(f.read())
+                stem = Path(cwl_path_str).stem
+                # print(stem)
+                # Add / overwrite stdout and stderr
+                tool.update({'stdout': f'{stem}.out'})
+                tool.update({'stderr': f'{stem}.err'})
+                misses += 1
+            tools_cache_new[cwl_path_abs] = (cache_key, tool)
+            step_id = StepId(Path(cwl_path_str).stem, plugin_ns)
             tools_cwl[step_id] = Tool(cwl_path_str, tool)
             #print(tool)
             #utils_graphs.make_tool_dag(stem, (cwl_path_str, tool))
+
+    if use_cache:
+        print(f'Tools cache: {hits} hits, {misses} misses')
+        # Keep the entries for cwl files which were not globbed in this run
+        # (i.e. from a different cwl_dirs_file) but which still exist.
+        stale = [path for path in tools_cache if path not in tools_cache_new and not Path(path).exists()]
+        if misses > 0 or stale != [] or len(tools_cache) == 0:
+            tools_cache_old = {path: entry for path, entry in tools_cache.items()
+                               if path not in tools_cache_new and path not in stale}
+            write_tools_cache(tools_cache_file, {**tools_cache_old, **tools_cache_new})
     return tools_cwl
 
 
@@ -124,23 +200,149 @@ def get_yml_paths(yml_dirs_file: Path) -> Dict[str, Dict[str, Path]]:
     return yml_paths_all
 
 
+def read_inference_rules() -> None:
+    """Reads inference_rules.txt and renaming_conventions.txt (in the current
+    working directory) into the compiler and inference modules, respectively.
+    """
+    # Perform initialization via mutating global variables (This is not ideal)
+    compiler.inference_rules.set(dict(utils.read_lines_pairs(Path('inference_rules.txt'))))
+    inference.renaming_conventions.set(utils.read_lines_pairs(Path('renaming_conventions.txt')))
+
+
+def write_to_disk(args: argparse.Namespace, rose_tree: RoseTree) -> None:
+    """Writes the compiled CWL files and inputs files which have changed to autogenerated/ (see utils.write_to_disk)
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        rose_tree (RoseTree): The compiled root workflow and all of its subworkflows.
+    """
+    (num_written, num_unchanged) = utils.write_to_disk(rose_tree, Path('autogenerated/'), relative_run_path=True,
+                                                       max_workers=args.write_jobs)
+    profiler.annotate('files_written', num_written)
+    profiler.annotate('files_unchanged', num_unchanged)
+    print(f'Wrote {num_written} files to autogenerated/ ({num_unchanged} unchanged)')
+
+
+def compile_root_workflow(args: argparse.Namespace, tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]],
+                          validator: Draft202012Validator) -> RoseTree:
+    """Compiles the root workflow args.yaml (and all of its subworkflows),
+    writes the compiled CWL files and inputs files to autogenerated/,
+    and renders the GraphViz diagram (if any).
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+
+    Returns:
+        RoseTree: The compiled root workflow and all of its subworkflows.
+    """
+    yaml_path = args.yaml
+
+    # Load the high-level yaml root workflow file.
+    root_yaml_tree: Yaml = utils_yaml.load_file(Path(yaml_path))
+    Path('autogenerated/').mkdir(parents=True, exist_ok=True)
+    wic = {'wic': root_yaml_tree.get('wic', {})}
+    plugin_ns = wic['wic'].get('namespace', 'global')
+    step_id = StepId(yaml_path, plugin_ns)
+    y_t = YamlTree(step_id, root_yaml_tree)
+    with profiler.phase('read_ast_from_disk'):
+        yaml_tree_raw = ast.read_ast_from_disk(y_t, yml_paths, tools_cwl, validator)
+    # Write the combined workflow (with all subworkflows as children) to disk.
+    with open(f'autogenerated/{Path(yaml_path).stem}_tree_raw.yml', mode='w', encoding='utf-8') as f:
+        f.write(utils_yaml.dump(yaml_tree_raw.yml, Dumper=utils_yaml.Dumper))
+    with profiler.phase('merge_yml_trees'):
+        yaml_tree = ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
+    with open(f'autogenerated/{Path(yaml_path).stem}_tree_merged.yml', mode='w', encoding='utf-8') as f:
+        f.write(utils_yaml.dump(yaml_tree.yml, Dumper=utils_yaml.Dumper))
+
+    if args.cwl_inline_subworkflows:
+        with profiler.phase('inline_subworkflows'):
+            while True:
+                # Inlineing changes the namespaces, so we have to get new namespaces after each inlineing operation.
+                namespaces_list = ast.get_inlineable_subworkflows(yaml_tree, tools_cwl, False, [])
+                if namespaces_list == []:
+                    break
+
+                #print('inlineing', namespaces_list[0])
+                yaml_tree = ast.inline_subworkflow(yaml_tree, tools_cwl, namespaces_list[0])
+
+        with open(f'autogenerated/{Path(yaml_path).stem}_tree_merged_inlined.yml', mode='w', encoding='utf-8') as f:
+            f.write(utils_yaml.dump(yaml_tree.yml, Dumper=utils_yaml.Dumper))
+
+    # get the label (if any) from the workflow
+    step_i_wic_graphviz = yaml_tree.yml.get('wic', {}).get('graphviz', {})
+    label = step_i_wic_graphviz.get('label', yaml_path)
+    subgraph_attrs = {'label': label,
+                      'color': 'lightblue'} # color of cluster subgraph outline
+    subgraph_nx = nx.DiGraph()
+    graphdata = GraphData(yaml_path, attrs=subgraph_attrs)
+    subgraph = GraphReps(subgraph_nx, graphdata)
+    with profiler.phase('compile'), speculation.parallel_compilation(args.compile_jobs, tools_cwl):
+        compiler_info = compiler.compile_workflow(yaml_tree, args, [], [subgraph], {}, {}, {}, {},
+                                                  tools_cwl, True, relative_run_path=True, testing=False)
+    rose_tree = compiler_info.rose
+
+    with profiler.phase('write_to_disk'):
+        write_to_disk(args, rose_tree)
+
+    # Render the GraphViz diagram
+    # NOTE: The layout algorithm may be very slow for large workflows, so only
+    # construct the GraphViz graph (from the GraphData) if it will be rendered.
+    if args.graph_render != 'none':
+        with profiler.phase('render'):
+            rootgraph = graphviz.Digraph(name=yaml_path)
+            rootgraph.attr(newrank='True') # See graphviz layout comment above.
+            rootgraph.attr(bgcolor="transparent") # Useful for making slides
+            font_edge_color = 'black' if args.graph_dark_theme else 'white'
+            rootgraph.attr(fontcolor=font_edge_color)
+
+            # This can be used to visually 'inline' all subworkflows (but NOT the CWL).
+            # rootgraph.attr(style='invis')
+            # Note that since invisible objects still affect the graphviz layout (by design),
+            # this can be used to control the layout of the individual nodes, even if
+            # you don't necessarily want subworkflows.
+
+            #rootgraph.attr(rankdir='LR') # When --graph_inline_depth 1, this usually looks better.
+            rootgraph.subgraph(utils_graphs.graphdata_to_graphviz(graphdata, args.graph_inline_depth))
+            rootgraph.render(format=args.graph_render) # Default pdf. See https://graphviz.org/docs/outputs/
+
+    return rose_tree
+
+
 def main() -> None:
     """See docs/userguide.md"""
     args = cli.parser.parse_args()
-
-    tools_cwl = get_tools_cwl(args.cwl_dirs_file)
+    if args.client:
+        sys.exit(client.run_client(sys.argv[1:], Path(args.socket)))
+    if args.serve:
+        # NOTE: Import here to avoid a circular import.
+        from . import server  # pylint: disable=import-outside-toplevel
+        server.serve(args)
+        return
+    if (args.yamls or args.yamls_file) and (args.yaml or args.run_local or args.run_compute):
+        cli.parser.error('--yamls and --yamls_file cannot be used with --yaml, --run_local, or --run_compute')
+    if args.sweep_file and (args.run_local or args.run_compute):
+        cli.parser.error('--sweep_file cannot be used with --run_local or --run_compute')
+    if args.profile:
+        profiler.start()
+
+    with profiler.phase('tools'):
+        tools_cwl = get_tools_cwl(args.cwl_dirs_file, not args.no_tools_cache)
     # This takes ~1 second but it is not really necessary.
     #utils_graphs.make_plugins_dag(tools_cwl, args.graph_dark_theme)
-    yml_paths = get_yml_paths(args.yml_dirs_file)
+    with profiler.phase('yml_paths'):
+        yml_paths = get_yml_paths(args.yml_dirs_file)
 
-    # Perform initialization via mutating global variables (This is not ideal)
-    compiler.inference_rules = dict(utils.read_lines_pairs(Path('inference_rules.txt')))
-    inference.renaming_conventions = utils.read_lines_pairs(Path('renaming_conventions.txt'))
+    read_inference_rules()
 
     # Generate schemas for validation and vscode IntelliSense code completion
     yaml_stems = utils.flatten([list(p) for p in yml_paths.values()])
     schema_store: Dict[str, Json] = {}
-    validator = wic_schema.get_validator(tools_cwl, yaml_stems, schema_store, write_to_disk=True)
+    with profiler.phase('schemas'):
+        validator = wic_schema.get_validator(tools_cwl, yaml_stems, schema_store, write_to_disk=True,
+                                             use_cache=not args.no_schema_cache)
 
     # Generating yml schemas every time takes ~20 seconds and guarantees the
     # subworkflow schemas are always up to date. However, since it compiles all
@@ -153,89 +355,92 @@ def main() -> None:
             for yml_namespace, yml_paths_dict in yml_paths.items()
             for yml_path_str, yml_path in yml_paths_dict.items()]
 
+        # In incremental mode, only recompile the workflows whose yml files or
+        # (transitive) dependencies have changed since the previous run.
+        stale = {yml_path_str for yml_path_str, yml_path in yml_paths_tuples}
+        if args.generate_schemas_incremental:
+            graph_old = wic_schema.read_dependency_graph()
+            graph_new = wic_schema.get_dependency_graph(tools_cwl, yml_paths)
+            stale = wic_schema.get_stale_workflows(graph_old, graph_new)
+            print(f'Regenerating {len(stale)} of {len(yml_paths_tuples)} workflow schemas.')
+            # Only record the workflows as up-to-date once their schemas have
+            # been written, so that a failure will not corrupt the graph.
+            graph_done = {'global_fingerprint': graph_new['global_fingerprint'],
+                          'workflows': {yml_stem: node for yml_stem, node in graph_new['workflows'].items()
+                                        if yml_stem not in stale}}
+
+        # Compiling each workflow is independent, so optionally compile them in parallel.
+        stale_tuples = [(yml_path_str, yml_path) for yml_path_str, yml_path in yml_paths_tuples
+                        if yml_path_str in stale]
+        schemas_stale: Iterable[Json]
+        if args.jobs > 1:
+            schemas_stale = wic_schema.compile_workflows_generate_schemas_parallel(stale_tuples, tools_cwl,
+                                                                                 yml_paths, args.jobs)
+        else:
+            # Read and validate each distinct yml file only once (i.e. not once per workflow).
+            ast_cache: AstCache = {}
+            schemas_stale = (wic_schema.compile_workflow_generate_schema(yml_path_str, yml_path,
+                                                                         tools_cwl, yml_paths, validator, ast_cache)
+                             for yml_path_str, yml_path in stale_tuples)
+
+        schemas: Dict[str, Json] = {}
+        with profiler.phase('generate_schemas'):
+            for (yml_path_str, yml_path), schema in zip(stale_tuples, schemas_stale):
+                schemas[yml_path_str] = schema
+                if args.generate_schemas_incremental:
+                    with open(f'autogenerated/schemas/workflows/{yml_path_str}.json', mode='w', encoding='utf-8') as f:
+                        f.write(json.dumps(schema, indent=2))
+                    graph_done['workflows'][yml_path_str] = graph_new['workflows'][yml_path_str]
+                    wic_schema.write_dependency_graph(graph_done)
+
+        # Merge the schemas in a deterministic order, independent of the order of completion.
         for yml_path_str, yml_path in yml_paths_tuples:
-            schema = wic_schema.compile_workflow_generate_schema(yml_path_str, yml_path,
-                                                                 tools_cwl, yml_paths, validator)
+            if yml_path_str in schemas:
+                schema = schemas[yml_path_str]
+            else:
+                with open(f'autogenerated/schemas/workflows/{yml_path_str}.json', mode='r', encoding='utf-8') as f:
+                    schema = json.loads(f.read())
             # overwrite placeholders in schema_store. See comment in get_validator()
             schema_store[schema['$id']] = schema
 
+        if args.generate_schemas_incremental:
+            # Also remove any workflows which no longer exist.
+            wic_schema.write_dependency_graph(graph_done)
+
         # Now that we compiled all of the subworkflows once with the permissive/weak schema,
         # compile the root yml workflow again with the restrictive/strict schema.
-        validator = wic_schema.get_validator(tools_cwl, yaml_stems, schema_store, write_to_disk=True)
+        with profiler.phase('schemas'):
+            validator = wic_schema.get_validator(tools_cwl, yaml_stems, schema_store, write_to_disk=True,
+                                                 use_cache=not args.no_schema_cache)
 
     if args.generate_schemas_only:
+        if args.profile:
+            profiler.write_profile(Path('autogenerated/generate_schemas'))
         print('Finished generating schemas. Exiting.')
         sys.exit(0)
 
-    yaml_path = args.yaml
+    if args.yamls or args.yamls_file:
+        # NOTE: Import here to avoid a circular import.
+        from . import batch  # pylint: disable=import-outside-toplevel
+        sys.exit(batch.run_batch(args, tools_cwl, yml_paths, validator))
 
-    # Load the high-level yaml root workflow file.
-    with open(yaml_path, mode='r', encoding='utf-8') as y:
-        root_yaml_tree: Yaml = yaml.safe_load(y.read())
-    Path('autogenerated/').mkdir(parents=True, exist_ok=True)
-    wic = {'wic': root_yaml_tree.get('wic', {})}
-    plugin_ns = wic['wic'].get('namespace', 'global')
-    step_id = StepId(yaml_path, plugin_ns)
-    y_t = YamlTree(step_id, root_yaml_tree)
-    yaml_tree_raw = ast.read_ast_from_disk(y_t, yml_paths, tools_cwl, validator)
-    # Write the combined workflow (with all subworkflows as children) to disk.
-    with open(f'autogenerated/{Path(yaml_path).stem}_tree_raw.yml', mode='w', encoding='utf-8') as f:
-        f.write(yaml.dump(yaml_tree_raw.yml))
-    yaml_tree = ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
-    with open(f'autogenerated/{Path(yaml_path).stem}_tree_merged.yml', mode='w', encoding='utf-8') as f:
-        f.write(yaml.dump(yaml_tree.yml))
+    rose_tree = compile_root_workflow(args, tools_cwl, yml_paths, validator)
 
-    if args.cwl_inline_subworkflows:
-        while True:
-            # Inlineing changes the namespaces, so we have to get new namespaces after each inlineing operation.
-            namespaces_list = ast.get_inlineable_subworkflows(yaml_tree, tools_cwl, False, [])
-            if namespaces_list == []:
-                break
-
-            #print('inlineing', namespaces_list[0])
-            yaml_tree = ast.inline_subworkflow(yaml_tree, tools_cwl, namespaces_list[0])
-
-        with open(f'autogenerated/{Path(yaml_path).stem}_tree_merged_inlined.yml', mode='w', encoding='utf-8') as f:
-            f.write(yaml.dump(yaml_tree.yml))
-
-    rootgraph = graphviz.Digraph(name=yaml_path)
-    rootgraph.attr(newrank='True') # See graphviz layout comment above.
-    rootgraph.attr(bgcolor="transparent") # Useful for making slides
-    font_edge_color = 'black' if args.graph_dark_theme else 'white'
-    rootgraph.attr(fontcolor=font_edge_color)
-
-    # This can be used to visually 'inline' all subworkflows (but NOT the CWL).
-    # rootgraph.attr(style='invis')
-    # Note that since invisible objects still affect the graphviz layout (by design),
-    # this can be used to control the layout of the individual nodes, even if
-    # you don't necessarily want subworkflows.
-
-    #rootgraph.attr(rankdir='LR') # When --graph_inline_depth 1, this usually looks better.
-    with rootgraph.subgraph(name=f'cluster_{yaml_path}') as subgraph_gv:
-        # get the label (if any) from the workflow
-        step_i_wic_graphviz = yaml_tree.yml.get('wic', {}).get('graphviz', {})
-        label = step_i_wic_graphviz.get('label', yaml_path)
-        subgraph_gv.attr(label=label)
-        subgraph_gv.attr(color='lightblue')  # color of cluster subgraph outline
-        subgraph_nx = nx.DiGraph()
-        graphdata = GraphData(yaml_path)
-        subgraph = GraphReps(subgraph_gv, subgraph_nx, graphdata)
-        compiler_info = compiler.compile_workflow(yaml_tree, args, [], [subgraph], {}, {}, {}, {},
-                                                  tools_cwl, True, relative_run_path=True, testing=False)
-        rose_tree = compiler_info.rose
-
-    utils.write_to_disk(rose_tree, Path('autogenerated/'), relative_run_path=True)
+    if args.sweep_file:
+        with profiler.phase('sweep'):
+            retval = sweep.run_sweep(args, rose_tree)
+        if args.profile:
+            profiler.write_profile(Path('autogenerated/') / Path(args.yaml).stem)
+        sys.exit(retval)
 
     if args.run_compute:
         # Inline compiled CWL if necessary, i.e. inline across scattering boundaries.
         # NOTE: Since we need to distribute scattering operations across all dependencies,
         # and due to inference, this cannot be done before compilation.
         rose_tree = ast.inline_subworkflow_cwl(rose_tree)
-        utils.write_to_disk(rose_tree, Path('autogenerated/'), relative_run_path=True)
+        write_to_disk(args, rose_tree)
         labshare.upload_all(rose_tree, tools_cwl, args, True)
 
-    # Render the GraphViz diagram
-    rootgraph.render(format='png') # Default pdf. See https://graphviz.org/docs/outputs/
     yaml_stem = Path(args.yaml).stem
     #cmd = f'cwltool --print-dot autogenerated/{yaml_stem}.cwl | dot -Tsvg > autogenerated/{yaml_stem}.svg'
     #sub.run(cmd, shell=True, check=False)
@@ -274,7 +479,8 @@ def main() -> None:
                 cwltool.main.windows_check()
                 signal.signal(signal.SIGTERM, cwltool.main._signal_handler)
                 try:
-                    cwltool.main.main(cmd[1:])
+                    with profiler.phase('cwltool'):
+                        cwltool.main.main(cmd[1:])
                 finally:
                     cwltool.main._terminate_processes()
 
@@ -288,7 +494,7 @@ def main() -> None:
 
                 print('Success! Output files should be in outdir/')
             except Exception as e:
-                print('Failed to execute', yaml_path)
+                print('Failed to execute', args.yaml)
                 print(f'See error_{yaml_stem}.txt for detailed technical information.')
                 # Do not display a nasty stack trace to the user; hide it in a file.
                 with open(f'error_{yaml_stem}.txt', mode='w', encoding='utf-8') as f:
@@ -303,7 +509,8 @@ def main() -> None:
                 f'autogenerated/{yaml_stem}.cwl', f'autogenerated/{yaml_stem}_inputs.yml']
 
             print('Running ' + ' '.join(cmd))
-            proc = sub.run(cmd, check=False)
+            with profiler.phase('toil-cwl-runner'):
+                proc = sub.run(cmd, check=False)
             if proc.returncode == 0:
                 print('Success! Output files should be in outdir/')
             else:
@@ -317,30 +524,12 @@ def main() -> None:
             with open(output_json_file, mode='r', encoding='utf-8') as f:
                 output_json = json.loads(f.read())
             files = utils.parse_provenance_output_files(output_json)
+            with profiler.phase('collect_output_files'):
+                utils.collect_provenance_output_files(files, Path('provenance/workflow/'), Path('outdir/'),
+                                                      args.link_output_files, args.copy_jobs)
 
-            dests = set()
-            for location, namespaced_output_name, basename in files:
-                yaml_stem_init, shortened = utils.shorten_namespaced_output_name(namespaced_output_name)
-                parentdirs = yaml_stem_init + '/' + shortened.replace('___', '/')
-                Path('outdir/' + parentdirs).mkdir(parents=True, exist_ok=True)
-                source = 'provenance/workflow/' + location
-                # NOTE: Even though we are using subdirectories (not just a single output directory),
-                # there is still the possibility of filename collisions, i.e. when scattering.
-                # For now, let's use a similar trick as cwltool of append _2, _3 etc.
-                # except do it BEFORE the extension.
-                # This could still cause problems with slicing, i.e. if you scatter across
-                # indices 11-20 first, then 1-10 second, the output file indices will get switched.
-                dest = 'outdir/' + parentdirs +  '/' + basename
-                if dest in dests:
-                    idx = 2
-                    while Path(dest).exists():
-                        stem = Path(basename).stem
-                        suffix = Path(basename).suffix
-                        dest = 'outdir/' + parentdirs +  '/' + stem + f'_{idx}' + suffix
-                        idx += 1
-                dests.add(dest)
-                cmd = ['cp', source, dest]
-                sub.run(cmd, check=True)
+    if args.profile:
+        profiler.write_profile(Path('autogenerated/') / Path(args.yaml).stem)
 
 
 def stage_input_files(yml_inputs: Yaml, root_yml_dir_abs: Path,
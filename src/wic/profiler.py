@@ -0,0 +1,152 @@
+import contextlib
+import json
+from pathlib import Path
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List
+
+# The phases are identified by their stack of (nested) phase names, i.e.
+# the top-level phases (tools, compile, etc) and then the subworkflows.
+# The subworkflows are named like utils.step_name_str(), so the stacks of
+# the subworkflows mirror the namespaces in the compiled CWL.
+Stack = str
+SEP = ';' # The separator used by flame graph tools for 'collapsed' / 'folded' stacks.
+
+
+class PhaseStats():
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall_time = 0.0 # seconds, including the nested phases
+        self.child_time = 0.0 # seconds, only the nested phases
+        self.alloc_net = 0 # bytes, i.e. allocated and not (yet) freed at the end of the phase
+        self.alloc_peak = 0 # bytes, w.r.t. the start of the phase
+        self.annotations: Dict[str, Any] = {}
+
+
+class Frame():
+
+    def __init__(self, stack: Stack, time_start: float, alloc_start: int) -> None:
+        self.stack = stack
+        self.time_start = time_start
+        self.alloc_start = alloc_start
+        self.alloc_peak = alloc_start # The (absolute) peak of traced memory during this phase
+
+
+# NOTE: This must be initialized in main.py (see --profile)
+enabled: bool = False
+stats: Dict[Stack, PhaseStats] = {}
+frames: List[Frame] = []
+
+
+def start() -> None:
+    """Starts profiling, i.e. enables phase() and starts tracing memory allocations.\n
+    NOTE: Tracing memory allocations has significant overhead (i.e. ~2x), so the
+    absolute wall times are inflated; use the relative times for prioritizing.
+    """
+    global enabled
+    enabled = True
+    stats.clear()
+    frames.clear()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def stop() -> None:
+    """Stops profiling."""
+    global enabled
+    enabled = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def get_alloc_peak() -> int:
+    """Returns the peak of traced memory since the previous call, and resets the peak.
+
+    Returns:
+        int: The peak of traced memory (in bytes)
+    """
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    return peak
+
+
+@contextlib.contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Records the wall time, number of calls, and memory allocations of the
+    enclosed code, nested within the enclosing phase (if any).\n
+    This does nothing unless profiling has been started (see --profile).
+
+    Args:
+        name (str): The name of the phase, e.g. the name of the subworkflow.
+
+    Yields:
+        Iterator[None]: Use as `with profiler.phase(name):`
+    """
+    if not enabled:
+        yield
+        return
+
+    if frames:
+        frames[-1].alloc_peak = max(frames[-1].alloc_peak, get_alloc_peak())
+        stack = frames[-1].stack + SEP + name
+    else:
+        get_alloc_peak()
+        stack = name
+    alloc_start = tracemalloc.get_traced_memory()[0]
+    frame = Frame(stack, time.perf_counter(), alloc_start)
+    frames.append(frame)
+    try:
+        yield
+    finally:
+        wall_time = time.perf_counter() - frame.time_start
+        frame.alloc_peak = max(frame.alloc_peak, get_alloc_peak())
+        frames.pop()
+
+        phase_stats = stats.setdefault(stack, PhaseStats())
+        phase_stats.calls += 1
+        phase_stats.wall_time += wall_time
+        phase_stats.alloc_net += tracemalloc.get_traced_memory()[0] - frame.alloc_start
+        phase_stats.alloc_peak = max(phase_stats.alloc_peak, frame.alloc_peak - frame.alloc_start)
+        if frames:
+            # The parent phase includes the peak of the nested phase.
+            frames[-1].alloc_peak = max(frames[-1].alloc_peak, frame.alloc_peak)
+            stats.setdefault(frames[-1].stack, PhaseStats()).child_time += wall_time
+
+
+def annotate(key: str, value: Any) -> None:
+    """Attaches additional information (i.e. the number of iterations) to the current phase.
+
+    Args:
+        key (str): The name of the annotation
+        value (Any): The (JSON serializable) value of the annotation
+    """
+    if enabled and frames:
+        stats.setdefault(frames[-1].stack, PhaseStats()).annotations[key] = value
+
+
+def write_profile(path_stem: Path) -> None:
+    """Writes the profile to {path_stem}_profile.json and a flame graph compatible\n
+    'collapsed stack' file (of the self times, in microseconds) to {path_stem}_profile.folded\n
+    See https://github.com/brendangregg/FlameGraph and https://www.speedscope.app
+
+    Args:
+        path_stem (Path): The path of the output files, without the suffixes.
+    """
+    profile = {}
+    folded = []
+    for stack, phase_stats in stats.items():
+        self_time = max(phase_stats.wall_time - phase_stats.child_time, 0.0)
+        profile[stack] = {'calls': phase_stats.calls,
+                          'wall_time_s': round(phase_stats.wall_time, 6),
+                          'self_time_s': round(self_time, 6),
+                          'alloc_net_bytes': phase_stats.alloc_net,
+                          'alloc_peak_bytes': phase_stats.alloc_peak,
+                          **phase_stats.annotations}
+        folded.append(f'{stack} {round(self_time * 1e6)}')
+
+    path_stem.parent.mkdir(parents=True, exist_ok=True)
+    with open(f'{path_stem}_profile.json', mode='w', encoding='utf-8') as f:
+        f.write(json.dumps(profile, indent=2))
+    with open(f'{path_stem}_profile.folded', mode='w', encoding='utf-8') as f:
+        f.write('\n'.join(folded) + '\n')
@@ -0,0 +1,576 @@
+import argparse
+from contextvars import ContextVar
+import copy
+import hashlib
+import json
+from pathlib import Path
+import pickle
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, MutableMapping, NamedTuple, Optional, Set, Tuple
+
+import networkx as nx
+
+from . import utils_graphs
+from .wic_types import (CompilerInfo, EnvData, ExplicitEdgeDefs, GraphData, GraphReps, IndexedMapping,
+                        NamespacePath, Namespaces, NodeData, ResolvedMapping, RoseTree, Yaml, YamlTree)
+
+
+class Fingerprint(NamedTuple):
+    yml: Yaml # NOTE: This keeps the subtree alive, so that its id() cannot be reused.
+    digest: str # A hash of the subtree, where the subtrees of its subworkflows are replaced by their digests.
+    stems: FrozenSet[str] # The yml stems of all of its subworkflows, recursively.
+    explicit_edge_vars: FrozenSet[str] # The names of all of its explicit edge definitions and calls, recursively.
+    has_side_effects: bool # i.e. python_script, cwl_watcher, or environment actions, recursively.
+
+
+class MemoEntry(NamedTuple):
+    namespaces: Namespaces
+    compiler_info: CompilerInfo # NOTE: Only the changes to the environment are stored. See get_env_changes()
+    graph: GraphReps # The graph of the subworkflow, i.e. the last of the subgraphs.
+    graph_chk: utils_graphs.GraphCheckpoint # The checkpoint of graph before compiling the subworkflow.
+    graph_chk_final: utils_graphs.GraphCheckpoint # The checkpoint of graph after compiling the subworkflow.
+    yml_modified: bool # i.e. whether the compiler inserted any file format conversions.
+
+
+class SubworkflowMemo(NamedTuple):
+    fingerprints: Dict[int, Fingerprint] # Keyed on the id() of the yml AST of each subworkflow.
+    compiled: Dict[str, MemoEntry] # Keyed on get_memo_key()
+
+
+# The compiled subworkflows of the root workflow which is currently being compiled. See compiler.compile_workflow()
+# NOTE: This is a ContextVar (instead of a global) so that it is automatically restored after each root workflow.
+subworkflow_memo: ContextVar[Optional[SubworkflowMemo]] = ContextVar('subworkflow_memo', default=None)
+# NOTE: This is only used for testing, i.e. to check that memoization does not change the results.
+memoize_subworkflows: ContextVar[bool] = ContextVar('memoize_subworkflows', default=True)
+
+# The command line arguments which affect the compilation of a subworkflow.
+# NOTE: --yaml only affects the compilation via its parent directory. See get_args_key()
+compile_args = ['cachedir', 'cwl_dirs_file', 'cwl_output_intermediate_files', 'cwl_validate',
+                'graph_dark_theme', 'graph_inline_depth', 'graph_label_edges', 'graph_label_stepname',
+                'graph_show_inputs', 'graph_show_outputs', 'inference_max_conversion_steps',
+                'inference_use_naming_conventions', 'yml_dirs_file']
+
+
+def add_fingerprints(fingerprints: Dict[int, Fingerprint], yml: Yaml) -> Fingerprint:
+    """Computes the fingerprints of a yml AST and of all of its subworkflows (recursively), bottom up.\n
+    Since the subtrees of the subworkflows are shared (see utils.copy_ast_spine()), the fingerprints
+    are keyed on their id(), and the subtrees which already have fingerprints are not traversed again.
+    Thus each subtree is only hashed once, instead of once per level of the recursion.
+
+    Args:
+        fingerprints (Dict[int, Fingerprint]): The fingerprints computed so far (mutated in place)
+        yml (Yaml): A yml AST, with subworkflows of the form {'subtree': ..., 'parentargs': ...}
+
+    Returns:
+        Fingerprint: The fingerprint of yml
+    """
+    fingerprint = fingerprints.get(id(yml))
+    if fingerprint is not None and fingerprint.yml is yml:
+        return fingerprint
+
+    stems: Set[str] = set()
+    explicit_edge_vars: Set[str] = set()
+    side_effects: List[bool] = []
+
+    def skeleton(obj: Any, key: str) -> Any:
+        if isinstance(obj, Dict):
+            if isinstance(obj.get('subtree'), Dict) and 'parentargs' in obj:
+                sub_fingerprint = add_fingerprints(fingerprints, obj['subtree'])
+                stems.add(Path(key).stem)
+                stems.update(sub_fingerprint.stems)
+                explicit_edge_vars.update(sub_fingerprint.explicit_edge_vars)
+                side_effects.append(sub_fingerprint.has_side_effects)
+                return {'subtree': sub_fingerprint.digest, 'parentargs': skeleton(obj['parentargs'], '')}
+            side_effects.append(any(k in ['python_script', 'cwl_watcher', 'environment'] for k in obj))
+            return {k: skeleton(val, str(k)) for k, val in obj.items()}
+        if isinstance(obj, List):
+            return [skeleton(val, key) for val in obj]
+        if isinstance(obj, str) and obj[:1] in ['&', '*']:
+            explicit_edge_vars.add(obj[1:])
+        return obj
+
+    yml_skeleton = skeleton(yml, '')
+    digest = hashlib.sha256(json.dumps(yml_skeleton, default=str).encode()).hexdigest()
+    fingerprint = Fingerprint(yml, digest, frozenset(stems), frozenset(explicit_edge_vars), any(side_effects))
+    fingerprints[id(yml)] = fingerprint
+    return fingerprint
+
+
+def get_args_key(args: argparse.Namespace) -> str:
+    """Returns the values of the command line arguments which affect the compilation of a subworkflow.
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+
+    Returns:
+        str: The values of compile_args (and the parent directory of --yaml), as json
+    """
+    args_dict = {arg: vars(args).get(arg) for arg in compile_args}
+    # See utils.write_absolute_config_files() and the python_script code in compile_workflow_once()
+    args_dict['yaml_dir'] = str(Path(args.yaml).parent.absolute())
+    return json.dumps(args_dict, sort_keys=True, default=str)
+
+
+def get_stem_keys(mapping: IndexedMapping, stems: Iterable[str]) -> List[str]:
+    """Returns the keys of mapping which are namespaced by the given yml stems. See IndexedMapping
+
+    Args:
+        mapping (IndexedMapping): An environment mapping
+        stems (Iterable[str]): yml stems
+
+    Returns:
+        List[str]: The keys of mapping which are namespaced by stems
+    """
+    return [key for stem in stems for key in mapping.keys_by_stem.get(stem, {})]
+
+
+def get_relevant_entries(mapping: IndexedMapping, stems: FrozenSet[str]) -> List[Tuple[str, Any]]:
+    """Returns the entries of an environment mapping which can affect the compilation of a subworkflow,
+    i.e. the entries which are namespaced by its own (sub)workflows or by the workflow inputs,
+    together with the entries they map to. (See utils.get_input_mappings() and utils.get_output_mapping())\n
+    NOTE: This only looks up the relevant entries, instead of scanning all of the entries.
+
+    Args:
+        mapping (IndexedMapping): An environment mapping
+        stems (FrozenSet[str]): The yml stems of the subworkflow and of all of its subworkflows
+
+    Returns:
+        List[Tuple[str, Any]]: The relevant entries, sorted by key
+    """
+    keys = get_stem_keys(mapping, sorted(stems | {''}))
+    keys_seen = set(keys)
+    while keys:
+        key = keys.pop()
+        vals = mapping[key]
+        key_init = key.split('___')[:-1]
+        for val in (vals if isinstance(vals, List) else [vals]):
+            key_next = '___'.join(key_init + [val]) if isinstance(val, str) else ''
+            if key_next in mapping and key_next not in keys_seen:
+                keys_seen.add(key_next)
+                keys.append(key_next)
+    return [(key, mapping[key]) for key in sorted(keys_seen)]
+
+
+def get_memo_key(memo: SubworkflowMemo, yaml_tree_ast: YamlTree, args: argparse.Namespace,
+                 namespaces: Namespaces, env: EnvData, relative_run_path: bool, testing: bool) -> Optional[str]:
+    """Returns the key of a subworkflow in the memo, or None if it cannot be memoized.\n
+    Since compilation is embedding independent (see test_cwl_embedding_independence), the compiled
+    subworkflow is completely determined by its yml AST, the command line arguments, its depth,
+    and the relevant entries of the environment. The namespaces are NOT part of the key, so the
+    same subworkflow can be reused at different positions. See relocate_memo_entry()
+
+    Args:
+        memo (SubworkflowMemo): The memo of the root workflow
+        yaml_tree_ast (YamlTree): A tuple of name and yml AST
+        args (argparse.Namespace): The command line arguments
+        namespaces (Namespaces): Specifies the path in the yml AST to the current subworkflow
+        env (EnvData): The environment the subworkflow is compiled in
+        relative_run_path (bool): See compiler.compile_workflow_once()
+        testing (bool): See compiler.compile_workflow_once()
+
+    Returns:
+        Optional[str]: The key of the subworkflow in the memo, or None
+    """
+    mappings = [env.input_mapping, env.output_mapping, env.explicit_edge_calls]
+    if namespaces == [] or not all(isinstance(mapping, IndexedMapping) for mapping in mappings):
+        return None
+    # NOTE: If the yml AST was modified by a parent workflow (i.e. file format conversions),
+    # then only the modified subtrees are fingerprinted here.
+    fingerprint = add_fingerprints(memo.fingerprints, yaml_tree_ast.yml)
+    # Subworkflows which have effects outside of their namespaces cannot be reused.
+    # This includes explicit edges which are defined outside of the subworkflow and graph
+    # nodes which are truncated to the namespaces of a parent workflow (--graph_inline_depth).
+    if (fingerprint.has_side_effects or not fingerprint.explicit_edge_vars.isdisjoint(env.explicit_edge_defs)
+            or len(namespaces) > args.graph_inline_depth):
+        return None
+    stems = fingerprint.stems | {Path(yaml_tree_ast.step_id.stem).stem}
+    relevant_entries = [get_relevant_entries(mapping, stems) for mapping in mappings] # type: ignore
+    key = [fingerprint.digest, list(yaml_tree_ast.step_id), len(namespaces), get_args_key(args),
+           relevant_entries, relative_run_path, testing]
+    return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+
+
+def get_env_changes(mapping: Dict[str, Any], mapping_env: Dict[str, Any], keys: Iterable[str]) -> Dict[str, Any]:
+    """Returns the entries of mapping (among the given keys) which are not in mapping_env.
+
+    Args:
+        mapping (Dict[str, Any]): An environment mapping after compiling a subworkflow
+        mapping_env (Dict[str, Any]): The same environment mapping before compiling the subworkflow
+        keys (Iterable[str]): The keys which the compilation can have added or changed.
+
+    Returns:
+        Dict[str, Any]: The added or changed entries
+    """
+    return {key: mapping[key] for key in keys
+            if key in mapping and (key not in mapping_env or mapping_env[key] != mapping[key])}
+
+
+def apply_env_changes(mapping_env: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Applies the changes returned by get_env_changes() to a copy of an environment mapping.
+
+    Args:
+        mapping_env (Dict[str, Any]): An environment mapping
+        changes (Dict[str, Any]): The changes returned by get_env_changes()
+
+    Returns:
+        Dict[str, Any]: A copy of mapping_env (of the same type) with the changes applied
+    """
+    mapping = mapping_env.copy()
+    mapping.update(changes)
+    return mapping
+
+
+def get_compiler_info_changes(fingerprints: Dict[int, Fingerprint], compiler_info: CompilerInfo,
+                              yaml_tree_ast: YamlTree, env: EnvData) -> CompilerInfo:
+    """Returns a compiled subworkflow with only the changes to the environment it was compiled in
+    (and to the environments of the nodes of its Rose Tree). See apply_compiler_info_changes()\n
+    This is how a compiled subworkflow is moved to another environment, i.e. by the memo and by
+    the concurrent and shared compilations. (See speculation.py and get_shared_subworkflow())\n
+    NOTE: Only the entries which are namespaced by the subworkflow can change, which can be found
+    without scanning all of the entries. See IndexedMapping
+
+    Args:
+        fingerprints (Dict[int, Fingerprint]): See add_fingerprints()
+        compiler_info (CompilerInfo): The compiled subworkflow
+        yaml_tree_ast (YamlTree): The yml AST that was passed to compile_workflow()
+        env (EnvData): The environment the subworkflow was compiled in
+
+    Returns:
+        CompilerInfo: The compiled subworkflow, with only the changes to env
+    """
+    fingerprint = add_fingerprints(fingerprints, yaml_tree_ast.yml)
+    # NOTE: The subworkflow can also add the names of its workflow inputs (which are not namespaced).
+    stems = fingerprint.stems | {Path(yaml_tree_ast.step_id.stem).stem, ''}
+    env_sub = compiler_info.env
+    keys_calls = get_stem_keys(env_sub.explicit_edge_calls, stems) # type: ignore
+    changes_input_mapping = get_env_changes(env_sub.input_mapping, env.input_mapping,
+                                            get_stem_keys(env_sub.input_mapping, stems)) # type: ignore
+    changes_output_mapping = get_env_changes(env_sub.output_mapping, env.output_mapping,
+                                             get_stem_keys(env_sub.output_mapping, stems)) # type: ignore
+    env_changes = EnvData(changes_input_mapping, changes_output_mapping,
+                          env_sub.inputs_file_workflow, env_sub.vars_workflow_output_internal,
+                          get_env_changes(env_sub.explicit_edge_defs, env.explicit_edge_defs,
+                                          fingerprint.explicit_edge_vars),
+                          get_env_changes(env_sub.explicit_edge_calls, env.explicit_edge_calls, keys_calls))
+
+    def get_rose_tree_changes(rose_tree: RoseTree) -> RoseTree:
+        node_data: NodeData = rose_tree.data
+        defs = get_env_changes(node_data.explicit_edge_defs, env.explicit_edge_defs, fingerprint.explicit_edge_vars)
+        calls = get_env_changes(node_data.explicit_edge_calls, env.explicit_edge_calls, keys_calls)
+        node_data = node_data._replace(explicit_edge_defs=defs, explicit_edge_calls=calls)
+        return RoseTree(node_data, [get_rose_tree_changes(sub_tree) for sub_tree in rose_tree.sub_trees])
+
+    return CompilerInfo(get_rose_tree_changes(compiler_info.rose), env_changes)
+
+
+def apply_compiler_info_changes(compiler_info: CompilerInfo, env: EnvData) -> CompilerInfo:
+    """Applies the changes returned by get_compiler_info_changes() to another environment.
+
+    Args:
+        compiler_info (CompilerInfo): The changes returned by get_compiler_info_changes()
+        env (EnvData): The environment the subworkflow is compiled in
+
+    Returns:
+        CompilerInfo: The compiled subworkflow, as if it had been compiled in env.
+    """
+    def apply_rose_tree_changes(rose_tree: RoseTree) -> RoseTree:
+        node_data: NodeData = rose_tree.data
+        defs = {**env.explicit_edge_defs, **node_data.explicit_edge_defs}
+        calls = {**env.explicit_edge_calls, **node_data.explicit_edge_calls}
+        node_data = node_data._replace(explicit_edge_defs=defs, explicit_edge_calls=calls)
+        return RoseTree(node_data, [apply_rose_tree_changes(sub_tree) for sub_tree in rose_tree.sub_trees])
+
+    env_changes = compiler_info.env
+    env_new = EnvData(apply_env_changes(env.input_mapping, env_changes.input_mapping),
+                      apply_env_changes(env.output_mapping, env_changes.output_mapping),
+                      env_changes.inputs_file_workflow, env_changes.vars_workflow_output_internal,
+                      apply_env_changes(env.explicit_edge_defs, env_changes.explicit_edge_defs),
+                      apply_env_changes(env.explicit_edge_calls, env_changes.explicit_edge_calls))
+    return CompilerInfo(apply_rose_tree_changes(compiler_info.rose), env_new)
+
+
+def memoize_subworkflow(memo: SubworkflowMemo, memo_key: str, compiler_info: CompilerInfo,
+                        yaml_tree_ast: YamlTree, namespaces: Namespaces, env: EnvData,
+                        graph: GraphReps, graph_chk: utils_graphs.GraphCheckpoint) -> None:
+    """Stores a compiled subworkflow in the memo. See get_memo_key()\n
+    NOTE: Only the changes to the environment are stored. See get_compiler_info_changes()
+
+    Args:
+        memo (SubworkflowMemo): The memo of the root workflow
+        memo_key (str): The key returned by get_memo_key()
+        compiler_info (CompilerInfo): The compiled subworkflow
+        yaml_tree_ast (YamlTree): The yml AST that was passed to compile_workflow()
+        namespaces (Namespaces): Specifies the path in the yml AST to the current subworkflow
+        env (EnvData): The environment the subworkflow was compiled in
+        graph (GraphReps): The graph of the subworkflow, i.e. the last of the subgraphs
+        graph_chk (utils_graphs.GraphCheckpoint): The checkpoint of graph before compiling the subworkflow
+    """
+    changes = get_compiler_info_changes(memo.fingerprints, compiler_info, yaml_tree_ast, env)
+    rose_tree = changes.rose
+    node_data: NodeData = rose_tree.data
+    # NOTE: The graph of the subworkflow (i.e. graph) is stored separately, and since the parent
+    # workflows continue to modify it, only up to the current checkpoint. See get_memoized_subworkflow()
+    graph_node = GraphReps(node_data.graph.networkx, GraphData(node_data.graph.graphdata.name))
+    rose_tree = RoseTree(node_data._replace(graph=graph_node), rose_tree.sub_trees)
+    yml_modified = node_data.yml is not yaml_tree_ast.yml
+    graph_chk_final = utils_graphs.checkpoint_graph(graph)
+    entry = MemoEntry(namespaces, CompilerInfo(rose_tree, changes.env), graph, graph_chk, graph_chk_final, yml_modified)
+    memo.compiled[memo_key] = entry
+
+
+def get_memoized_subworkflow(entry: MemoEntry, yaml_tree_ast: YamlTree, namespaces: Namespaces,
+                             env: EnvData, graph: GraphReps) -> CompilerInfo:
+    """Reuses a compiled subworkflow from the memo, in the given namespaces and environment.
+
+    Args:
+        entry (MemoEntry): The entry stored by memoize_subworkflow()
+        yaml_tree_ast (YamlTree): The yml AST that was passed to compile_workflow()
+        namespaces (Namespaces): Specifies the path in the yml AST to the current subworkflow
+        env (EnvData): The environment the subworkflow is compiled in
+        graph (GraphReps): The graph of the subworkflow, i.e. the last of the subgraphs
+
+    Returns:
+        CompilerInfo: The compiled subworkflow, as if it had been compiled from scratch.
+    """
+    (len_nodes, len_edges, len_subgraphs, len_ranksame) = entry.graph_chk
+    (len_nodes_final, len_edges_final, len_subgraphs_final, len_ranksame_final) = entry.graph_chk_final
+    graphdata = entry.graph.graphdata
+    graph_additions = (graphdata.nodes[len_nodes:len_nodes_final], graphdata.edges[len_edges:len_edges_final],
+                       graphdata.subgraphs[len_subgraphs:len_subgraphs_final],
+                       graphdata.ranksame[len_ranksame:len_ranksame_final])
+    if entry.namespaces != namespaces:
+        # NOTE: Copy everything (preserving sharing) before moving it to the new namespaces.
+        (compiler_info, graph_additions) = copy.deepcopy((entry.compiler_info, graph_additions))
+        compiler_info = relocate_compiler_info(compiler_info, graph_additions, entry.namespaces, namespaces)
+    else:
+        compiler_info = entry.compiler_info
+    utils_graphs.add_graph_additions(graph, graph_additions)
+
+    compiler_info = apply_compiler_info_changes(compiler_info, env)
+    rose_tree = compiler_info.rose
+    node_data: NodeData = rose_tree.data
+    # NOTE: The parent workflows compare the yml AST by identity. See compiler.compile_workflow()
+    yml = node_data.yml if entry.yml_modified else yaml_tree_ast.yml
+    graph_node = GraphReps(node_data.graph.networkx, graph.graphdata)
+    rose_tree = RoseTree(node_data._replace(yml=yml, graph=graph_node), rose_tree.sub_trees)
+    return CompilerInfo(rose_tree, compiler_info.env)
+
+
+def relocate_compiler_info(compiler_info: CompilerInfo, graph_additions: utils_graphs.GraphAdditions,
+                           old: Namespaces, new: Namespaces) -> CompilerInfo:
+    """Moves a compiled subworkflow from the namespaces old to the namespaces new (of the same depth).\n
+    The absolute namespaced names within a compiled subworkflow are the namespaces of the nodes of
+    the Rose Tree and of the explicit edges, the run tags of its subworkflows (unless relative_run_path),
+    and the names of the nodes of its graphs. Only these names are moved; everything else
+    (i.e. the yml values, the inputs files, the labels) is left unchanged.\n
+    NOTE: This mutates compiler_info and graph_additions in place, so they must be private copies.
+
+    Args:
+        compiler_info (CompilerInfo): The compiled subworkflow, stored by memoize_subworkflow()
+        graph_additions (utils_graphs.GraphAdditions): The additions to the graph of the subworkflow
+        old (Namespaces): The namespaces the subworkflow was compiled in
+        new (Namespaces): The namespaces to move the subworkflow to
+
+    Returns:
+        CompilerInfo: The moved compiled subworkflow
+    """
+    old_path = NamespacePath.from_namespaces(old)
+    new_path = NamespacePath.from_namespaces(new)
+
+    def relocate_name(name: str) -> str:
+        return str(NamespacePath.parse(name).rebase(old_path, new_path))
+
+    def relocate_quoted_name(name: str) -> str:
+        if len(name) > 1 and name[0] == '"' and name[-1] == '"':
+            return f'"{relocate_name(name[1:-1])}"'
+        return relocate_name(name)
+
+    def relocate_namespaces(namespaces: Namespaces) -> Namespaces:
+        return NamespacePath.from_namespaces(namespaces).rebase(old_path, new_path).namespaces()
+
+    def relocate_explicit_edges(explicit_edges: ExplicitEdgeDefs) -> ExplicitEdgeDefs:
+        return {key: edge._replace(namespaces=relocate_namespaces(edge.namespaces))
+                for key, edge in explicit_edges.items()}
+
+    graphdatas_visited: Set[int] = set()
+
+    def relocate_graphdata(graphdata: GraphData) -> None:
+        if id(graphdata) in graphdatas_visited:
+            return
+        graphdatas_visited.add(id(graphdata))
+        graphdata.nodes[:] = [(relocate_name(node), attrs) for node, attrs in graphdata.nodes]
+        graphdata.edges[:] = [(relocate_name(node1), relocate_name(node2), attrs)
+                              for node1, node2, attrs in graphdata.edges]
+        graphdata.ranksame[:] = [[relocate_quoted_name(name) for name in ranksame] for ranksame in graphdata.ranksame]
+        for subgraph in graphdata.subgraphs:
+            relocate_graphdata(subgraph)
+
+    def relocate_graph(graph: GraphReps) -> GraphReps:
+        relocate_graphdata(graph.graphdata)
+        # NOTE: Preserve the order of the nodes and edges.
+        graph_nx = nx.DiGraph()
+        graph_nx.graph.update(graph.networkx.graph)
+        graph_nx.add_nodes_from((relocate_name(node), attrs) for node, attrs in graph.networkx.nodes(data=True))
+        graph_nx.add_edges_from((relocate_name(node1), relocate_name(node2), attrs)
+                                for node1, node2, attrs in graph.networkx.edges(data=True))
+        return GraphReps(graph_nx, graph.graphdata)
+
+    def relocate_rose_tree(rose_tree: RoseTree) -> RoseTree:
+        node_data: NodeData = rose_tree.data
+        for step in node_data.compiled_cwl.get('steps', {}).values():
+            if isinstance(step, Dict) and isinstance(step.get('run'), str):
+                step['run'] = relocate_name(step['run'])
+        node_data = node_data._replace(namespaces=relocate_namespaces(node_data.namespaces),
+                                       explicit_edge_defs=relocate_explicit_edges(node_data.explicit_edge_defs),
+                                       explicit_edge_calls=relocate_explicit_edges(node_data.explicit_edge_calls),
+                                       graph=relocate_graph(node_data.graph),
+                                       step_name_1=relocate_quoted_name(node_data.step_name_1))
+        return RoseTree(node_data, [relocate_rose_tree(sub_tree) for sub_tree in rose_tree.sub_trees])
+
+    relocate_graphdata(GraphData('', *graph_additions))
+
+    env = compiler_info.env
+    env = env._replace(explicit_edge_defs=relocate_explicit_edges(env.explicit_edge_defs),
+                       explicit_edge_calls=relocate_explicit_edges(env.explicit_edge_calls))
+    return CompilerInfo(relocate_rose_tree(compiler_info.rose), env)
+
+
+def get_fingerprints() -> Dict[int, Fingerprint]:
+    """Returns the fingerprints of the current memo (if any), so that each subtree is only fingerprinted once.
+
+    Returns:
+        Dict[int, Fingerprint]: See add_fingerprints()
+    """
+    memo = subworkflow_memo.get()
+    return memo.fingerprints if memo is not None else {}
+
+
+def is_independent_subworkflow(yml: Any) -> bool:
+    """Determines whether a subworkflow can be compiled independently of its
+    siblings, i.e. it (recursively) does not contain any explicit edges
+    (definitions & or call sites *), environment actions, or python_script steps
+    (which modify tools).
+
+    Args:
+        yml (Any): The yml AST of the subworkflow (or any part of it)
+
+    Returns:
+        bool: True if the subworkflow can be compiled independently
+    """
+    if isinstance(yml, Dict):
+        for key, val in yml.items():
+            if key in ['python_script', 'environment'] or not is_independent_subworkflow(val):
+                return False
+        return True
+    if isinstance(yml, List):
+        return all(is_independent_subworkflow(val) for val in yml)
+    if isinstance(yml, str):
+        return not (yml.startswith('&') or yml.startswith('*'))
+    return True
+
+
+def is_namespaced_extension(mapping_old: Dict[str, Any], mapping_new: Dict[str, Any], prefix: str) -> bool:
+    """Determines whether mapping_new only adds entries to mapping_old, and all of the new keys start with prefix.
+
+    Args:
+        mapping_old (Dict[str, Any]): An input or output mapping
+        mapping_new (Dict[str, Any]): The same mapping, at a later time
+        prefix (str): The prefix of the new keys
+
+    Returns:
+        bool: True if mapping_new only adds entries to mapping_old, namespaced by prefix
+    """
+    if len(mapping_new) < len(mapping_old):
+        return False
+    for key, val in mapping_old.items():
+        if key not in mapping_new or mapping_new[key] != val:
+            return False
+    return all(key.startswith(prefix) for key in mapping_new if key not in mapping_old)
+
+
+# See --yamls. The compiled subworkflows which are shared between the root
+# workflows of a batch, keyed on get_shared_subworkflow_key(). The values are
+# pickled, so that each root workflow gets its own copy, and so that the cache
+# can also be shared between processes (i.e. a multiprocessing.Manager().dict()).
+# NOTE: The cache must only be shared between compilations which use the same tools.
+subworkflow_cache: ContextVar[Optional[MutableMapping[str, bytes]]] = ContextVar('subworkflow_cache', default=None)
+
+
+def is_shareable_subworkflow(namespaces: Namespaces, sub_yml: Yaml, env: EnvData, yaml_stem: str) -> bool:
+    """Determines whether the result of compiling a subworkflow can be shared between root workflows.\n
+    This is the case for the independent subworkflows (see is_independent_subworkflow()) of the root
+    workflow without side effects, if all of the entries in the input and output mappings are namespaced
+    by the steps of the root workflow. Then (as in speculation.get_speculative_subworkflow()) the
+    subworkflow can be compiled with an empty environment, and the only thing which depends on the root
+    workflow is the name of its step. See relocate_compiler_info()
+
+    Args:
+        namespaces (Namespaces): Specifies the path in the yml AST to the parent workflow
+        sub_yml (Yaml): The yml AST of the subworkflow
+        env (EnvData): The current environment
+        yaml_stem (str): The name of the parent workflow
+
+    Returns:
+        bool: True if the result of compiling the subworkflow can be shared between root workflows
+    """
+    prefix = f'{yaml_stem}__step__' # See utils.step_name_str()
+    return (namespaces == [] and is_independent_subworkflow(sub_yml) and
+            not add_fingerprints(get_fingerprints(), sub_yml).has_side_effects and
+            is_namespaced_extension({}, env.input_mapping, prefix) and
+            is_namespaced_extension({}, env.output_mapping, prefix))
+
+
+def get_shared_subworkflow_key(sub_yaml_tree: YamlTree, args: argparse.Namespace,
+                               relative_run_path: bool, testing: bool) -> str:
+    """Computes the key of a shareable subworkflow (see is_shareable_subworkflow()) in subworkflow_cache.\n
+    Like get_memo_key(), except that the environment is always empty and the depth is always 1.
+
+    Args:
+        sub_yaml_tree (YamlTree): A tuple of name and (merged) yml AST of the subworkflow
+        args (argparse.Namespace): The command line arguments
+        relative_run_path (bool): See compiler.compile_workflow()
+        testing (bool): See compiler.compile_workflow()
+
+    Returns:
+        str: The sha256 hash of everything which the compiled subworkflow depends on.
+    """
+    fingerprint = add_fingerprints(get_fingerprints(), sub_yaml_tree.yml)
+    key = [fingerprint.digest, list(sub_yaml_tree.step_id), get_args_key(args), relative_run_path, testing]
+    return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()
+
+
+def get_shared_subworkflow(cache: MutableMapping[str, bytes], sub_yaml_tree: YamlTree, args: argparse.Namespace,
+                           step_name_i: str, env: EnvData, compile_subworkflow: Callable[[EnvData], CompilerInfo],
+                           relative_run_path: bool, testing: bool) -> CompilerInfo:
+    """Gets the result of compiling a shareable subworkflow (see is_shareable_subworkflow()) of the root
+    workflow from the cache, or compiles the subworkflow with an empty environment and adds it to the cache.
+
+    Args:
+        cache (MutableMapping[str, bytes]): See subworkflow_cache
+        sub_yaml_tree (YamlTree): A tuple of name and (merged) yml AST of the subworkflow
+        args (argparse.Namespace): The command line arguments
+        step_name_i (str): The name of the step of the root workflow (see utils.step_name_str())
+        env (EnvData): The current environment
+        compile_subworkflow (Callable[[EnvData], CompilerInfo]): Compiles the subworkflow in the given environment
+        relative_run_path (bool): See compiler.compile_workflow()
+        testing (bool): See compiler.compile_workflow()
+
+    Returns:
+        CompilerInfo: The compiled subworkflow, as if it were compiled with env.
+    """
+    key = get_shared_subworkflow_key(sub_yaml_tree, args, relative_run_path, testing)
+    value = cache.get(key)
+    if value is None:
+        env_empty = EnvData(ResolvedMapping(), ResolvedMapping(), {}, [], {}, IndexedMapping())
+        compiler_info = compile_subworkflow(env_empty)
+        # NOTE: Only the changes to the (empty) environment are stored. See get_compiler_info_changes()
+        changes = get_compiler_info_changes(get_fingerprints(), compiler_info, sub_yaml_tree, env_empty)
+        cache[key] = pickle.dumps(([step_name_i], changes))
+        return apply_compiler_info_changes(changes, env)
+    if not testing:
+        print('  reusing', '  ' + sub_yaml_tree.step_id.stem)
+    # NOTE: Unpickling makes a private copy, which can be moved in place.
+    (namespaces_cached, changes) = pickle.loads(value)
+    if namespaces_cached != [step_name_i]:
+        # NOTE: The graph of the subworkflow is part of the Rose Tree, so there are no other graph additions.
+        changes = relocate_compiler_info(changes, ([], [], [], []), namespaces_cached, [step_name_i])
+    return apply_compiler_info_changes(changes, env)
@@ -1,18 +1,18 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
 from pathlib import Path
-from unittest.mock import patch
-import sys
-from typing import Any, Dict, List
+import pickle
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
 import networkx as nx
-import graphviz
-from jsonschema import RefResolver, Draft202012Validator
-import yaml
+from jsonschema import RefResolver, Draft202012Validator, ValidationError
+from jsonschema.validators import extend
 
 import wic
-from wic import ast, cli, compiler, utils_cwl
-from wic.wic_types import GraphData, GraphReps, NodeData, StepId, Yaml, YamlTree
+from wic import ast, cli, compiler, inference, utils, utils_cwl, utils_yaml
+from wic.wic_types import AstCache, GraphData, GraphReps, NodeData, StepId, Yaml, YamlTree
 from ..wic_types import Json, Tools
 from .biobb import config_schemas
 
@@ -366,23 +366,142 @@ def wic_main_schema(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[s
     return schema
 
 
+def step_schema_key(schema: Json, schema_store: Dict[str, Json]) -> Optional[str]:
+    """Determines the only step name (if any) which the given step schema can match.
+
+    Args:
+        schema (Json): One of the alternatives in wic_main_schema()['properties']['steps']['items']
+        schema_store (Dict[str, Json]): A global mapping between ids and schemas
+
+    Returns:
+        Optional[str]: The step name, or None if the schema can match other step names (i.e. placeholders).
+    """
+    if list(schema) == ['$ref']:
+        schema = schema_store.get(schema['$ref'], {})
+    props = schema.get('properties', {})
+    if schema.get('type') == 'object' and schema.get('additionalProperties') is False and len(props) == 1:
+        return str(list(props)[0])
+    return None
+
+
+def wic_steps_dispatch_schema(steps_items: Json, schema_store: Dict[str, Json]) -> Json:
+    """Converts the anyOf over all of the tools and workflows in wic_main_schema()
+    into a wicSteps schema, which is indexed by step name. See wic_steps_keyword()
+
+    Args:
+        steps_items (Json): wic_main_schema()['properties']['steps']['items']
+        schema_store (Dict[str, Json]): A global mapping between ids and schemas
+
+    Returns:
+        Json: The equivalent wicSteps schema
+    """
+    branches: List[Json] = steps_items['anyOf']
+    keys: Dict[str, List[int]] = {}
+    fallback: List[int] = []
+    for index, branch in enumerate(branches):
+        alternatives = branch['oneOf'] if list(branch) == ['oneOf'] else [branch]
+        names = set(step_schema_key(alt, schema_store) for alt in alternatives)
+        name = names.pop() if len(names) == 1 else None
+        if name is None:
+            fallback.append(index)
+        else:
+            keys.setdefault(name, []).append(index)
+    items = {key: val for key, val in steps_items.items() if key != 'anyOf'}
+    items['wicSteps'] = {'anyOf': branches, 'keys': keys, 'fallback': fallback}
+    return items
+
+
+def wic_steps_keyword(validator: Draft202012Validator, wic_steps: Json,
+                      instance: Any, schema: Json) -> Iterator[ValidationError]:
+    """Validates a workflow step against only the tools and workflows with the same name.\n
+    This is exactly equivalent to the anyOf over all of the tools and workflows,
+    because each of the other alternatives only allows its own name. However, the
+    anyOf takes time (and memory, for the errors) linear in the number of tools.
+
+    Args:
+        validator (Draft202012Validator): The validator
+        wic_steps (Json): The value of the wicSteps keyword. See wic_steps_dispatch_schema()
+        instance (Any): The workflow step
+        schema (Json): The schema containing the wicSteps keyword
+
+    Yields:
+        Iterator[ValidationError]: The error (if any)
+    """
+    branches: List[Json] = wic_steps['anyOf']
+    if isinstance(instance, Dict) and len(instance) == 1:
+        step_key = list(instance)[0]
+        indices = sorted(wic_steps['keys'].get(step_key, []) + wic_steps['fallback'])
+    else:
+        indices = list(range(len(branches)))
+    # See jsonschema._keywords.anyOf
+    all_errors = []
+    for index in indices:
+        errs = list(validator.descend(instance, branches[index], schema_path=index))
+        if not errs:
+            return
+        all_errors.extend(errs)
+    yield ValidationError(f'{instance!r} is not valid under any of the given schemas', context=all_errors)
+
+
+# NOTE: The jsonschema library (and the vscode YAML extension) do not support
+# any kind of discriminator, so use a custom keyword for validation and keep
+# the (equivalent) anyOf in wic.json for the vscode YAML extension.
+WicValidator = extend(Draft202012Validator, {'wicSteps': wic_steps_keyword})
+
+
+def get_validator_from_schema_store(schema_store: Dict[str, Json]) -> Draft202012Validator:
+    """Creates a validator for the main schema which dispatches each workflow step on its name.
+
+    Args:
+        schema_store (Dict[str, Json]): A global mapping between ids and schemas (See assemble_schema_store())
+
+    Returns:
+        Draft202012Validator: A validator which is used to check the yml files for correctness.
+    """
+    schema = schema_store['wic_main']
+    steps = schema['properties']['steps']
+    steps_dispatch = {**steps, 'items': wic_steps_dispatch_schema(steps['items'], schema_store)}
+    schema_dispatch = {**schema, 'properties': {**schema['properties'], 'steps': steps_dispatch}}
+    # See https://stackoverflow.com/questions/53968770/how-to-set-up-local-file-references-in-python-jsonschema-document
+    # The $ref tag refers to URIs defined in $id tags, NOT relative paths on
+    # the local filesystem! We need to create a global mapping between ids and schemas
+    # i.e. schema_store.
+    resolver = RefResolver.from_schema(schema_dispatch, store=schema_store)
+    validator = WicValidator(schema_dispatch, resolver=resolver)
+    return validator
+
+
+
+def copy_validator(validator: Draft202012Validator) -> Draft202012Validator:
+    """Copies a validator, giving the copy its own RefResolver.\n
+    NOTE: RefResolver is not thread-safe (it maintains a stack of scopes while
+    validating), so each thread must use its own copy of the validator.
+
+    Args:
+        validator (Draft202012Validator): A validator returned by get_validator()
+
+    Returns:
+        Draft202012Validator: A copy of the validator, which shares the (immutable) schemas.
+    """
+    resolver = RefResolver.from_schema(validator.schema, store=validator.resolver.store)
+    validator_copy: Draft202012Validator = validator.evolve(resolver=resolver)
+    return validator_copy
+
 def get_args(yml_path: str = '') -> argparse.Namespace:
     """This is used to get mock command line arguments.
 
     Returns:
         argparse.Namespace: The mocked command line arguments
     """
-    testargs = ['wic', '--yaml', yml_path, '--cwl_output_intermediate_files', 'True']  # ignore --yaml
     # For now, we need to enable --cwl_output_intermediate_files. See comment in compiler.py
-    with patch.object(sys, 'argv', testargs):
-        args: argparse.Namespace = wic.cli.parser.parse_args()
-    return args
+    return wic.cli.get_args(yml_path, ['--cwl_output_intermediate_files', 'True'])  # ignore --yaml
 
 
 def compile_workflow_generate_schema(yml_path_str: str, yml_path: Path,
                                      tools_cwl: Tools,
                                      yml_paths: Dict[str, Dict[str, Path]],
-                                     validator: Draft202012Validator) -> Json:
+                                     validator: Draft202012Validator,
+                                     ast_cache: Optional[AstCache] = None) -> Json:
     """Compiles a workflow and generates a schema which (recursively) includes the inputs/outputs from subworkflows.
 
     Args:
@@ -391,31 +510,30 @@ def compile_workflow_generate_schema(yml_path_str: str, yml_path: Path,
         tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
         yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
         validator (Draft202012Validator): Used to validate the yml files against the autogenerated schema.
+        ast_cache (Optional[AstCache]): The subworkflows which have already been read and validated.\n
+        Pass the same ast_cache when generating multiple schemas. See read_ast_from_disk()
 
     Returns:
         Json: An autogenerated, documented schema based on the inputs and outputs of the Workflow.
     """
     # First compile the workflow.
     # Load the high-level yaml workflow file.
-    with open(yml_path, mode='r', encoding='utf-8') as y:
-        root_yaml_tree: Yaml = yaml.safe_load(y.read())
+    root_yaml_tree: Yaml = utils_yaml.load_file(yml_path)
     Path('autogenerated/').mkdir(parents=True, exist_ok=True)
     wic_tag = {'wic': root_yaml_tree.get('wic', {})}
     plugin_ns = wic_tag['wic'].get('namespace', 'global')
     step_id = StepId(yml_path_str, plugin_ns)
     y_t = YamlTree(step_id, root_yaml_tree)
-    yaml_tree_raw = wic.ast.read_ast_from_disk(y_t, yml_paths, tools_cwl, validator)
+    yaml_tree_raw = wic.ast.read_ast_from_disk(y_t, yml_paths, tools_cwl, validator, ast_cache)
     #with open(f'autogenerated/{Path(yml_path).stem}_tree_raw.yml', mode='w', encoding='utf-8') as f:
     #    f.write(yaml.dump(yaml_tree_raw.yml))
     yaml_tree = wic.ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
     #with open(f'autogenerated/{Path(yml_path).stem}_tree_merged.yml', mode='w', encoding='utf-8') as f:
     #    f.write(yaml.dump(yaml_tree.yml))
 
-    graph_gv = graphviz.Digraph(name=f'cluster_{yml_path}')
-    graph_gv.attr(newrank='True')
     graph_nx = nx.DiGraph()
     graphdata = GraphData(str(yml_path))
-    graph = GraphReps(graph_gv, graph_nx, graphdata)
+    graph = GraphReps(graph_nx, graphdata)
     compiler_info = wic.compiler.compile_workflow(yaml_tree, get_args(str(yml_path)), [], [graph], {}, {}, {}, {},
                                                     tools_cwl, True, relative_run_path=True, testing=True)
     rose_tree = compiler_info.rose
@@ -430,18 +548,327 @@ def compile_workflow_generate_schema(yml_path_str: str, yml_path: Path,
     return schema
 
 
-def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json] = {},
-                  write_to_disk: bool = False) -> Draft202012Validator:
-    """Generates the main schema used to check the yml files for correctness and returns a validator.
+# The state of each worker process used by compile_workflows_generate_schemas_parallel()
+# NOTE: The Tools and the validator are (relatively) expensive to pickle / create,
+# so we only want to do this once per process, not once per workflow.
+worker_state: Dict[str, Any] = {}
+
+
+def compile_workflow_generate_schema_init(tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]],
+                                          inference_rules: Dict[str, str],
+                                          renaming_conventions: List[Tuple[str, str]]) -> None:
+    """Initializes a worker process used by compile_workflows_generate_schemas_parallel()
+
+    Args:
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        inference_rules (Dict[str, str]): The contents of inference_rules.txt
+        renaming_conventions (List[Tuple[str, str]]): The contents of renaming_conventions.txt
+    """
+    # Perform initialization via mutating global variables (This is not ideal)
+    # NOTE: This is necessary when using the spawn start method.
+    compiler.inference_rules.set(inference_rules)
+    inference.renaming_conventions.set(renaming_conventions)
+    yml_stems = utils.flatten([list(p) for p in yml_paths.values()])
+    worker_state['tools_cwl'] = tools_cwl
+    worker_state['yml_paths'] = yml_paths
+    # Use the permissive/weak schema, i.e. with placeholders for the workflows.
+    worker_state['validator'] = get_validator(tools_cwl, yml_stems, {})
+    # Each worker reads and validates each distinct yml file only once.
+    worker_state['ast_cache'] = {}
+
+
+def compile_workflow_generate_schema_worker(yml_path_tuple: Tuple[str, Path]) -> Json:
+    """Calls compile_workflow_generate_schema() using the state of the current worker process.
+
+    Args:
+        yml_path_tuple (Tuple[str, Path]): The stem of the path to the yml file and the path to the yml file
+
+    Returns:
+        Json: An autogenerated, documented schema based on the inputs and outputs of the Workflow.
+    """
+    (yml_path_str, yml_path) = yml_path_tuple
+    return compile_workflow_generate_schema(yml_path_str, yml_path, worker_state['tools_cwl'],
+                                            worker_state['yml_paths'], worker_state['validator'],
+                                            worker_state['ast_cache'])
+
+
+def compile_workflows_generate_schemas_parallel(yml_path_tuples: List[Tuple[str, Path]],
+                                                tools_cwl: Tools,
+                                                yml_paths: Dict[str, Dict[str, Path]],
+                                                jobs: int) -> Iterator[Json]:
+    """Compiles the given workflows and generates their schemas using a pool of worker processes.
+
+    Args:
+        yml_path_tuples (List[Tuple[str, Path]]): The stems of the paths to the yml files and the paths to the yml files
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+        jobs (int): The number of worker processes
+
+    Yields:
+        Iterator[Json]: The schemas, in the same order as yml_path_tuples
+    """
+    initargs = (tools_cwl, yml_paths, compiler.inference_rules.get(), inference.renaming_conventions.get())
+    with ProcessPoolExecutor(max_workers=jobs, initializer=compile_workflow_generate_schema_init,
+                             initargs=initargs) as executor:
+        # NOTE: executor.map() returns the results in order.
+        yield from executor.map(compile_workflow_generate_schema_worker, yml_path_tuples)
+
+
+# The dependency graph used for incremental schema generation. For each yml
+# workflow, we store the files it directly depends on, i.e. the yml files of its
+# subworkflows and the cwl files of its CommandLineTools, and the fingerprint
+# of the transitive closure of these files at the time its schema was generated.
+dependency_graph_file = Path('autogenerated/schemas/dependency_graph.json')
+
+
+def file_digest(path: str, digests: Dict[str, str]) -> str:
+    """Computes (and memoizes) the sha256 hash of the contents of a file.
+
+    Args:
+        path (str): The path to the file
+        digests (Dict[str, str]): A cache of previously computed hashes
+
+    Returns:
+        str: The sha256 hash of the file contents, or 'missing' if the file does not exist.
+    """
+    if path not in digests:
+        if Path(path).exists():
+            with open(path, mode='rb') as f:
+                digests[path] = hashlib.sha256(f.read()).hexdigest()
+        else:
+            digests[path] = 'missing'
+    return digests[path]
+
+
+def get_direct_dependencies(yaml_tree: Yaml, tools_cwl: Tools,
+                            yml_paths: Dict[str, Dict[str, Path]]) -> List[str]:
+    """Finds the yml and cwl files which a yml workflow directly references,
+    using the same namespace resolution as read_ast_from_disk().
+
+    Args:
+        yaml_tree (Yaml): The contents of a yml workflow file
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+
+    Returns:
+        List[str]: The paths of the referenced files. References which cannot be\n
+        resolved are encoded as 'missing:namespace/stem' so that they are still fingerprinted.
+    """
+    wic_tag = yaml_tree.get('wic', {})
+    deps: List[str] = []
+    if 'backends' in wic_tag:
+        for back in wic_tag['backends'].values():
+            deps += get_direct_dependencies(back, tools_cwl, yml_paths)
+        return deps
+
+    wic_steps = wic_tag.get('steps', {})
+    steps_keys = utils.get_steps_keys(yaml_tree.get('steps', []))
+    tools_stems = [stepid.stem for stepid in tools_cwl]
+    subkeys = utils.get_subkeys(steps_keys, tools_stems)
+    for i, step_key in enumerate(steps_keys):
+        stem = Path(step_key).stem
+        sub_wic = wic_steps.get(f'({i+1}, {step_key})', {})
+        plugin_ns = sub_wic.get('wic', {}).get('namespace', 'global')
+        if step_key in subkeys:
+            yml_path = yml_paths.get(plugin_ns, {}).get(stem)
+            deps.append(str(yml_path) if yml_path else f'missing:{plugin_ns}/{stem}')
+        else:
+            tool = tools_cwl.get(StepId(stem, plugin_ns))
+            deps.append(tool.run_path if tool else f'missing:{plugin_ns}/{stem}')
+    return list(dict.fromkeys(deps)) # Remove duplicates, but preserve order
+
+
+def get_global_fingerprint(tools_cwl: Tools, digests: Dict[str, str]) -> str:
+    """Fingerprints everything (other than the workflow itself) which affects
+    the compiled schema of every workflow.
+
+    Args:
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        digests (Dict[str, str]): A cache of previously computed file hashes
+
+    Returns:
+        str: The sha256 hash of the wic version, the config files, and the file format conversions.
+    """
+    # NOTE: File format conversions can be automatically inserted into any
+    # workflow, so every workflow implicitly depends on every conversion.
+    paths = ['inference_rules.txt', 'renaming_conventions.txt']
+    paths += sorted(tool.run_path for stepid, tool in tools_cwl.items() if stepid.stem.startswith('conversion_'))
+    contents = [wic.__version__] + [f'{path}:{file_digest(path, digests)}' for path in paths]
+    return hashlib.sha256('\n'.join(contents).encode()).hexdigest()
+
+
+def get_dependency_graph(tools_cwl: Tools, yml_paths: Dict[str, Dict[str, Path]]) -> Json:
+    """Builds the dependency graph of all of the yml workflows, and fingerprints
+    the transitive closure of the dependencies of each workflow.
+
+    Args:
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_paths (Dict[str, Dict[str, Path]]): The yml workflow definitions found using get_yml_paths()
+
+    Returns:
+        Json: A dict containing the global fingerprint and, for each yml stem,\n
+        its path, its direct dependencies, and its fingerprint.
+    """
+    digests: Dict[str, str] = {}
+    # NOTE: Re-reading the yml files is cheap compared to compiling them, and
+    # always re-resolving the dependencies guarantees that e.g. adding a new
+    # subworkflow which shadows a tool will be detected.
+    direct_deps: Dict[str, List[str]] = {}
+    for yml_paths_dict in yml_paths.values():
+        for yml_path in yml_paths_dict.values():
+            yaml_tree: Yaml = utils_yaml.load_file(yml_path)
+            direct_deps[str(yml_path)] = get_direct_dependencies(yaml_tree, tools_cwl, yml_paths)
+
+    def transitive_closure(path: str, visited: Set[str]) -> Set[str]:
+        if path in visited:
+            return visited  # Guard against cyclic (and hence invalid) workflows.
+        visited.add(path)
+        for dep in direct_deps.get(path, []):
+            transitive_closure(dep, visited)
+        return visited
+
+    global_fingerprint = get_global_fingerprint(tools_cwl, digests)
+    workflows: Json = {}
+    for yml_paths_dict in yml_paths.values():
+        for yml_stem, yml_path in yml_paths_dict.items():
+            closure = sorted(transitive_closure(str(yml_path), set()))
+            contents = [global_fingerprint] + [f'{path}:{file_digest(path, digests)}' for path in closure]
+            fingerprint = hashlib.sha256('\n'.join(contents).encode()).hexdigest()
+            workflows[yml_stem] = {'yml_path': str(yml_path),
+                                   'dependencies': direct_deps[str(yml_path)],
+                                   'fingerprint': fingerprint}
+    return {'global_fingerprint': global_fingerprint, 'workflows': workflows}
+
+
+def read_dependency_graph() -> Json:
+    """Reads the dependency graph from the previous incremental schema generation (if any).
+
+    Returns:
+        Json: The dependency graph, or an empty graph if it does not exist or is corrupt.
+    """
+    if dependency_graph_file.exists():
+        try:
+            with open(dependency_graph_file, mode='r', encoding='utf-8') as f:
+                graph: Json = json.loads(f.read())
+            return graph
+        except json.JSONDecodeError:
+            pass
+    return {'global_fingerprint': '', 'workflows': {}}
+
+
+def write_dependency_graph(graph: Json) -> None:
+    """Writes the dependency graph to disk, for use by the next incremental schema generation.
+
+    Args:
+        graph (Json): The dependency graph
+    """
+    dependency_graph_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(dependency_graph_file, mode='w', encoding='utf-8') as f:
+        f.write(json.dumps(graph, indent=2, sort_keys=True))
+
+
+def get_stale_workflows(graph_old: Json, graph_new: Json) -> Set[str]:
+    """Determines which workflow schemas need to be regenerated.
+
+    Args:
+        graph_old (Json): The dependency graph from the previous schema generation
+        graph_new (Json): The current dependency graph
+
+    Returns:
+        Set[str]: The stems of the yml workflows whose schemas are stale.
+    """
+    stale = set()
+    for yml_stem, node_new in graph_new['workflows'].items():
+        node_old = graph_old['workflows'].get(yml_stem, {})
+        schema_path = Path(f'autogenerated/schemas/workflows/{yml_stem}.json')
+        if node_old.get('fingerprint') != node_new['fingerprint'] or not schema_path.exists():
+            stale.add(yml_stem)
+    return stale
+
+
+# The assembled schema_store (i.e. the main schema, the wic: tag schema, and the
+# tool and workflow schemas), keyed on the fingerprint of the inputs of
+# get_validator(). Only schemas which have passed check_schema() are cached.
+# NOTE: check_schema() dominates the time spent in get_validator(), and the
+# tools and workflows rarely change.
+SchemaCache = Dict[str, Dict[str, Json]]
+schema_cache_file = Path('autogenerated/schemas/schema_cache.pickle')
+# i.e. the weak and strong schemas when generating schemas, and the schemas used by the tests.
+schema_cache_size = 4
+
+# The validators which have already been constructed in this process, keyed on
+# the fingerprint of the inputs of get_validator(), and their schema_store.
+validators: Dict[str, Tuple[Dict[str, Json], Draft202012Validator]] = {}
+
+
+def get_validator_fingerprint(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json]) -> str:
+    """Fingerprints everything which affects the schemas assembled by get_validator()
 
     Args:
         tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
         yml_stems (List[str]): The names of the yml workflow definitions found using get_yml_paths()
         schema_store (Dict[str, Json]): A global mapping between ids and schemas
-        write_to_disk (bool): Controls whether to write the schemas to disk.
 
     Returns:
-        Draft202012Validator: A validator which is used to check the yml files for correctness.
+        str: The sha256 hash of the wic version, the tools, the yml stems, and the workflow schemas.
+    """
+    # NOTE: The order of the tools and yml stems determines the order of the anyOf in wic_main_schema()
+    # Missing workflow schemas are equivalent to the placeholders added by assemble_schema_store().
+    contents = [wic.__version__,
+                [[step_id.stem, step_id.plugin_ns, tool.cwl] for step_id, tool in tools_cwl.items()],
+                [[yml_stem, schema_store.get(f'workflows/{yml_stem}.json', {})] for yml_stem in yml_stems]]
+    # Use default=str for any non-json scalars in the cwl files, i.e. yaml timestamps.
+    contents_str = json.dumps(contents, sort_keys=True, default=str)
+    return hashlib.sha256(contents_str.encode()).hexdigest()
+
+
+def read_schema_cache(cache_file: Path) -> SchemaCache:
+    """Reads the on-disk cache of assembled and checked schemas (if any).
+
+    Args:
+        cache_file (Path): The path to the cache file
+
+    Returns:
+        SchemaCache: The cached schemas, or an empty dict if the cache is missing or corrupt.
+    """
+    if not cache_file.exists():
+        return {}
+    try:
+        with open(cache_file, mode='rb') as f:
+            cache = pickle.load(f)
+        # The version is also part of each fingerprint, but this avoids
+        # unpickling the schemas from an incompatible version.
+        if cache.get('version') == wic.__version__:
+            schemas: SchemaCache = cache['schemas']
+            return schemas
+        print(f'Warning! Discarding {cache_file} from an incompatible version of wic.')
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError) as e:
+        # If the cache is corrupt, simply rebuild it from scratch.
+        print(f'Warning! Discarding corrupt {cache_file}: {e!r}')
+    return {}
+
+
+def write_schema_cache(cache_file: Path, schemas: SchemaCache) -> None:
+    """Atomically writes the cache of assembled and checked schemas to disk.
+
+    Args:
+        cache_file (Path): The path to the cache file
+        schemas (SchemaCache): The schemas to be cached, in least recently used order.
+    """
+    # Only keep the most recently used fingerprints.
+    schemas_recent = dict(list(schemas.items())[-schema_cache_size:])
+    cache = {'version': wic.__version__, 'schemas': schemas_recent}
+    utils.write_file_atomic(cache_file, pickle.dumps(cache, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def assemble_schema_store(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json]) -> None:
+    """Generates the tool schemas and the main schema, and adds them to schema_store.
+
+    Args:
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_stems (List[str]): The names of the yml workflow definitions found using get_yml_paths()
+        schema_store (Dict[str, Json]): A global mapping between ids and schemas. This is mutably updated.
     """
     for step_id, tool in tools_cwl.items():
         schema_tool = cwl_schema(step_id.stem, tool.cwl, 'tools')
@@ -459,24 +886,57 @@ def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str
     schema = wic_main_schema(tools_cwl, yml_stems, schema_store)
     schema_store[schema['$id']] = schema
     schema_store['wic_tag'] = wic_tag_schema()
-    if write_to_disk:
-        with open('autogenerated/schemas/wic.json', mode='w', encoding='utf-8') as f:
-            f.write(json.dumps(schema, indent=2))
 
-    # See https://stackoverflow.com/questions/53968770/how-to-set-up-local-file-references-in-python-jsonschema-document
-    # The $ref tag refers to URIs defined in $id tags, NOT relative paths on
-    # the local filesystem! We need to create a global mapping between ids and schemas
-    # i.e. schema_store.
-    resolver = RefResolver.from_schema(schema, store=schema_store)
-    """ Use check_schema to 'first verify that the provided schema is
-    itself valid, since not doing so can lead to less obvious error
-    messages and fail in less obvious or consistent ways.'
+
+def get_validator(tools_cwl: Tools, yml_stems: List[str], schema_store: Dict[str, Json] = {},
+                  write_to_disk: bool = False, use_cache: bool = True) -> Draft202012Validator:
+    """Generates the main schema used to check the yml files for correctness and returns a validator.
+
+    Args:
+        tools_cwl (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        yml_stems (List[str]): The names of the yml workflow definitions found using get_yml_paths()
+        schema_store (Dict[str, Json]): A global mapping between ids and schemas
+        write_to_disk (bool): Controls whether to write the schemas to disk.
+        use_cache (bool): Reuse the schemas from autogenerated/schemas/schema_cache.pickle if the tools and workflows\n
+        are unchanged, and reuse the validator from a previous call (in this process).
+
+    Returns:
+        Draft202012Validator: A validator which is used to check the yml files for correctness.
     """
-    # i.e. This should match 'https://json-schema.org/draft/2020-12/schema'
-    # NOTE: If you get nasty errors while developing the schema such as:
-    # "jsonschema.exceptions.SchemaError: ... is not valid under any of the given schemas"
-    # try temporarily commmenting this line out to generate the schema anyway.
-    # Then, in any yml file, the very first line should show a "schema stack trace"
-    Draft202012Validator.check_schema(schema)
-    validator = Draft202012Validator(schema, resolver=resolver)
+    fingerprint = get_validator_fingerprint(tools_cwl, yml_stems, schema_store)
+    if use_cache and fingerprint in validators:
+        (schema_store_cached, validator) = validators[fingerprint]
+        schema_store.update(schema_store_cached)
+    else:
+        schema_cache = read_schema_cache(schema_cache_file) if use_cache else {}
+        if fingerprint in schema_cache:
+            schema_store.update(schema_cache[fingerprint])
+        else:
+            assemble_schema_store(tools_cwl, yml_stems, schema_store)
+            """ Use check_schema to 'first verify that the provided schema is
+            itself valid, since not doing so can lead to less obvious error
+            messages and fail in less obvious or consistent ways.'
+            """
+            # i.e. This should match 'https://json-schema.org/draft/2020-12/schema'
+            # NOTE: If you get nasty errors while developing the schema such as:
+            # "jsonschema.exceptions.SchemaError: ... is not valid under any of the given schemas"
+            # try temporarily commmenting this line out to generate the schema anyway.
+            # Then, in any yml file, the very first line should show a "schema stack trace"
+            Draft202012Validator.check_schema(schema_store['wic_main'])
+        if use_cache and list(schema_cache)[-1:] != [fingerprint]:
+            # Move the fingerprint to the end, i.e. most recently used.
+            schema_cache.pop(fingerprint, None)
+            schema_cache[fingerprint] = dict(schema_store)
+            write_schema_cache(schema_cache_file, schema_cache)
+
+        validator = get_validator_from_schema_store(schema_store)
+        validators[fingerprint] = (dict(schema_store), validator)
+
+    if write_to_disk:
+        # Do not needlessly modify wic.json, i.e. so the vscode YAML extension does not reload it.
+        wic_json = Path('autogenerated/schemas/wic.json')
+        wic_json_str = json.dumps(schema_store['wic_main'], indent=2)
+        if not (wic_json.exists() and wic_json.read_text(encoding='utf-8') == wic_json_str):
+            with open(wic_json, mode='w', encoding='utf-8') as f:
+                f.write(wic_json_str)
     return validator
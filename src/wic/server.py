@@ -0,0 +1,205 @@
+import argparse
+from contextlib import redirect_stderr, redirect_stdout
+import glob
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+from typing import Any, Dict
+
+from . import cli, main, profiler, utils
+from .schemas import wic_schema
+from .wic_types import Json
+
+
+# The command line arguments which are not supported by the compile server,
+# i.e. because they run the workflow (which may take hours) or because they
+# would change the state of the server itself.
+unsupported_args = ['run_local', 'run_compute', 'generate_schemas_only', 'serve', 'client', 'yamls', 'yamls_file',
+                   'sweep_file']
+
+# The state of the compile server, i.e. the tools, the yml paths, and the validator,
+# and the fingerprints of the directories from which they were loaded.
+# NOTE: Requests are handled serially, so there is no need for locking.
+server_state: Dict[str, Any] = {}
+
+
+def get_dirs_fingerprint(dirs_file: Path, extension: str) -> str:
+    """Fingerprints the paths, modification times, and sizes of all of the files
+    with the given extension within any subdirectory of the directories in dirs_file.
+
+    Args:
+        dirs_file (Path): The file which lists the directories, i.e. cwl_dirs.txt or yml_dirs.txt
+        extension (str): The file extension, i.e. 'cwl' or 'yml'
+
+    Returns:
+        str: The sha256 hash of the contents of dirs_file and of the paths and stats of the files.
+    """
+    dirs = utils.read_lines_pairs(dirs_file)
+    contents = [str(dirs_file.absolute()), str(dirs)]
+    for _, dir_ in dirs:
+        pattern = str(Path(os.path.relpath(dir_)) / f'**/*.{extension}')
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            stat = os.stat(path)
+            contents.append(f'{path}:{stat.st_mtime_ns}:{stat.st_size}')
+    return hashlib.sha256('\n'.join(contents).encode()).hexdigest()
+
+
+def refresh_state(args: argparse.Namespace) -> None:
+    """(Re)loads the tools, the yml paths, and the validator into server_state,
+    but only if any of the files in the directories in args.cwl_dirs_file or
+    args.yml_dirs_file have been added, removed, or modified since they were loaded.\n
+    The inference rules are small, so they are simply re-read every time.
+
+    Args:
+        args (argparse.Namespace): The command line arguments of the request
+    """
+    tools_fingerprint = get_dirs_fingerprint(Path(args.cwl_dirs_file), 'cwl')
+    if server_state.get('tools_fingerprint') != tools_fingerprint:
+        server_state['tools_cwl'] = main.get_tools_cwl(Path(args.cwl_dirs_file), not args.no_tools_cache)
+        server_state['tools_fingerprint'] = tools_fingerprint
+        server_state.pop('validator', None)
+
+    yml_fingerprint = get_dirs_fingerprint(Path(args.yml_dirs_file), 'yml')
+    if server_state.get('yml_fingerprint') != yml_fingerprint:
+        server_state['yml_paths'] = main.get_yml_paths(Path(args.yml_dirs_file))
+        server_state['yml_fingerprint'] = yml_fingerprint
+        server_state.pop('validator', None)
+
+    if 'validator' not in server_state:
+        yaml_stems = utils.flatten([list(p) for p in server_state['yml_paths'].values()])
+        server_state['validator'] = wic_schema.get_validator(server_state['tools_cwl'], yaml_stems, {},
+                                                             write_to_disk=True,
+                                                             use_cache=not args.no_schema_cache)
+    main.read_inference_rules()
+
+
+def handle_request(request: Json) -> int:
+    """Compiles a workflow using the command line arguments in the request.\n
+    NOTE: Everything printed (to stdout and stderr) is forwarded to the client.
+
+    Args:
+        request (Json): The command line arguments ('argv') and working directory ('cwd') of the client
+
+    Returns:
+        int: The exit code of the request, i.e. 0 for success.
+    """
+    # All of the paths (i.e. autogenerated/) are relative to the current working directory.
+    if os.path.realpath(request['cwd']) != os.path.realpath(os.getcwd()):
+        print(f"Error! The compile server is running in {os.getcwd()}, not in {request['cwd']}", file=sys.stderr)
+        return 1
+    args = None
+    try:
+        args = cli.parser.parse_args(request['argv'])
+        unsupported = [f'--{arg}' for arg in unsupported_args if getattr(args, arg)]
+        if unsupported:
+            cli.parser.error(f'{" ".join(unsupported)} not supported by the compile server.')
+        if args.yaml is None:
+            cli.parser.error('the following arguments are required: --yaml')
+        if args.profile:
+            profiler.start()
+        refresh_state(args)
+        main.compile_root_workflow(args, server_state['tools_cwl'], server_state['yml_paths'],
+                                   server_state['validator'])
+        if args.profile:
+            profiler.write_profile(Path('autogenerated/') / Path(args.yaml).stem)
+    except SystemExit as e:
+        # i.e. argparse errors and user errors in the yml files.
+        return e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        # Do not let a bad request take down the server.
+        traceback.print_exc()
+        return 1
+    finally:
+        if args is not None and args.profile:
+            profiler.stop()
+    return 0
+
+
+class ClientWriter(io.TextIOBase):
+    """Forwards the text written to a stream (i.e. stdout) to the client as json lines."""
+
+    def __init__(self, wfile: io.BufferedIOBase, stream: str) -> None:
+        super().__init__()
+        self.wfile = wfile
+        self.stream = stream
+
+    def write(self, s: str) -> int:
+        try:
+            self.wfile.write((json.dumps({self.stream: s}) + '\n').encode())
+            self.wfile.flush()
+        except OSError:
+            pass  # i.e. the client disconnected. Finish the compilation anyway.
+        return len(s)
+
+
+class CompileRequestHandler(socketserver.StreamRequestHandler):
+    """Handles a single compile request, i.e. one json line containing the
+    command line arguments. Replies with json lines containing the 'stdout'
+    and 'stderr' of the compilation, followed by the 'returncode'.
+    """
+
+    def handle(self) -> None:
+        line = self.rfile.readline()
+        if not line:
+            return
+        stdout = ClientWriter(self.wfile, 'stdout')
+        stderr = ClientWriter(self.wfile, 'stderr')
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            returncode = handle_request(json.loads(line))
+        self.wfile.write((json.dumps({'returncode': returncode}) + '\n').encode())
+
+
+def make_server(socket_path: Path) -> socketserver.UnixStreamServer:
+    """Creates a compile server listening on the given unix socket.
+
+    Args:
+        socket_path (Path): The path to the unix socket
+
+    Returns:
+        socketserver.UnixStreamServer: The server. Call serve_forever() to start handling requests.
+    """
+    if socket_path.exists():
+        # Remove the socket of a server which was killed (as opposed to interrupted).
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            try:
+                sock.connect(str(socket_path))
+                print(f'Error! A compile server is already listening on {socket_path}')
+                sys.exit(1)
+            except ConnectionRefusedError:
+                socket_path.unlink()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    # NOTE: UnixStreamServer handles the requests serially (in the main thread).
+    return socketserver.UnixStreamServer(str(socket_path), CompileRequestHandler)
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Loads the tools, the yml paths, and the validator once, and then
+    compiles workflows on request (see --client) until interrupted.
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+    """
+    refresh_state(args)
+    socket_path = Path(args.socket)
+    server = make_server(socket_path)
+    print(f'Compile server listening on {socket_path}')
+
+    def terminate(signum: int, frame: Any) -> None:
+        raise KeyboardInterrupt
+    # Also shut down cleanly (i.e. remove the socket) when killed.
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        socket_path.unlink(missing_ok=True)
+
@@ -0,0 +1,191 @@
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor
+import contextlib
+from contextvars import ContextVar
+import io
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import networkx as nx
+
+from . import inference, profiler, reuse, utils, utils_graphs
+from .wic_types import (CompilerInfo, EnvData, GraphData, GraphReps, IndexedMapping, Namespaces,
+                        ResolvedMapping, StepId, Tools, Yaml, YamlTree)
+
+# See --compile_jobs. Sibling subworkflows which do not depend on the explicit
+# edge environment can be compiled concurrently, i.e. before the serial
+# compilation of the parent workflow reaches them. See parallel_compilation()
+compile_executor: ContextVar[Optional[ProcessPoolExecutor]] = ContextVar('compile_executor', default=None)
+# The future result, the yml AST, and (a snapshot of) the environment it was compiled with.
+Speculation = Tuple['Future[Tuple[CompilerInfo, str]]', Yaml, EnvData]
+# The state of each worker process. See compile_subworkflow_init()
+worker_state: Dict[str, Any] = {}
+
+
+@contextlib.contextmanager
+def parallel_compilation(jobs: int, tools: Tools) -> Iterator[None]:
+    """Within this context, independent sibling subworkflows are compiled
+    concurrently using a pool of worker processes. (Otherwise, this does nothing.)
+
+    Args:
+        jobs (int): The number of worker processes (See --compile_jobs)
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+    """
+    if jobs <= 1:
+        yield
+        return
+    from . import compiler  # pylint: disable=import-outside-toplevel
+    initargs = (tools, compiler.inference_rules.get(), inference.renaming_conventions.get(),
+                reuse.memoize_subworkflows.get())
+    with ProcessPoolExecutor(max_workers=jobs, initializer=compile_subworkflow_init,
+                             initargs=initargs) as executor:
+        token = compile_executor.set(executor)
+        try:
+            yield
+        finally:
+            compile_executor.reset(token)
+
+
+def compile_subworkflow_init(tools: Tools, inference_rules: Dict[str, str],
+                             renaming_conventions: List[Tuple[str, str]], memoize_subworkflows: bool) -> None:
+    """Initializes a worker process used by parallel_compilation()
+
+    Args:
+        tools (Tools): The CWL CommandLineTool definitions found using get_tools_cwl()
+        inference_rules (Dict[str, str]): The contents of inference_rules.txt
+        renaming_conventions (List[Tuple[str, str]]): The contents of renaming_conventions.txt
+        memoize_subworkflows (bool): See reuse.memoize_subworkflows
+    """
+    from . import compiler  # pylint: disable=import-outside-toplevel
+    # Perform initialization via mutating global variables (This is not ideal)
+    # NOTE: This is necessary when using the spawn start method.
+    compiler.inference_rules.set(inference_rules)
+    inference.renaming_conventions.set(renaming_conventions)
+    # NOTE: When using the fork start method, the workers inherit the executor, the memo,
+    # and the profiler of the parent process. The workers compile serially, and each
+    # worker has its own memo. (The pool only lives as long as the root workflow.)
+    compile_executor.set(None)
+    reuse.memoize_subworkflows.set(memoize_subworkflows)
+    reuse.subworkflow_memo.set(reuse.SubworkflowMemo({}, {}) if memoize_subworkflows else None)
+    profiler.stop()
+    worker_state['tools'] = tools
+
+
+def compile_subworkflow_worker(sub_yaml_tree: YamlTree, args: argparse.Namespace, namespaces: Namespaces,
+                               num_parents: int, subgraph: GraphReps, env: EnvData,
+                               relative_run_path: bool, testing: bool) -> Tuple[CompilerInfo, str]:
+    """Compiles a subworkflow using the state of the current worker process.
+
+    Args:
+        sub_yaml_tree (YamlTree): A tuple of name and yml AST
+        args (argparse.Namespace): The command line arguments
+        namespaces (Namespaces): Specifies the path in the yml AST to the subworkflow
+        num_parents (int): The number of parent workflows of the subworkflow
+        subgraph (GraphReps): The (empty) graph of the subworkflow
+        env (EnvData): The environment the subworkflow is compiled with.
+        relative_run_path (bool): See compiler.compile_workflow()
+        testing (bool): See compiler.compile_workflow()
+
+    Returns:
+        Tuple[CompilerInfo, str]: The compiled subworkflow and its (captured) stdout
+    """
+    from . import compiler  # pylint: disable=import-outside-toplevel
+    # NOTE: Independent subworkflows do not modify the graphs of their parents.
+    subgraphs = [GraphReps(nx.DiGraph(), GraphData('')) for _ in range(num_parents)] + [subgraph]
+    with contextlib.redirect_stdout(io.StringIO()) as stdout:
+        compiler_info = compiler.compile_workflow(sub_yaml_tree, args, namespaces, subgraphs,
+                                                  env.explicit_edge_defs, env.explicit_edge_calls,
+                                                  env.input_mapping, env.output_mapping,
+                                                  worker_state['tools'], False, relative_run_path, testing)
+    return (compiler_info, stdout.getvalue())
+
+
+def submit_independent_subworkflows(args: argparse.Namespace, namespaces: Namespaces, num_parents: int,
+                                    yaml_stem: str, steps: List[Yaml], wic_steps: Yaml, subkeys: List[str],
+                                    start: int, env: EnvData, relative_run_path: bool,
+                                    testing: bool) -> Dict[str, Speculation]:
+    """Starts compiling the independent subworkflows (if any) of the steps[start:] of a workflow concurrently.
+    See reuse.is_independent_subworkflow()
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        namespaces (Namespaces): Specifies the path in the yml AST to the current workflow
+        num_parents (int): The number of parent workflows of the subworkflows
+        yaml_stem (str): The name of the current workflow
+        steps (List[Yaml]): The steps of the current workflow
+        wic_steps (Yaml): The metadata associated with the steps of the current workflow
+        subkeys (List[str]): The step keys associated with subworkflows
+        start (int): The index of the first step
+        env (EnvData): The current environment
+        relative_run_path (bool): See compiler.compile_workflow()
+        testing (bool): See compiler.compile_workflow()
+
+    Returns:
+        Dict[str, Speculation]: The subworkflows being compiled, by step name (see utils.step_name_str)
+    """
+    executor = compile_executor.get()
+    if executor is None:
+        return {}
+    steps_keys = utils.get_steps_keys(steps)
+    indices = [j for j in range(start, len(steps)) if steps_keys[j] in subkeys and
+               reuse.is_independent_subworkflow(steps[j][steps_keys[j]]['subtree'])]
+    if len(indices) < 2:
+        return {} # Nothing to do concurrently
+    # NOTE: The environment is mutably updated during compilation, so take a snapshot.
+    snapshot = EnvData(ResolvedMapping(env.input_mapping), ResolvedMapping(env.output_mapping), {}, [],
+                       dict(env.explicit_edge_defs), IndexedMapping(env.explicit_edge_calls))
+    speculations = {}
+    for j in indices:
+        step_key = steps_keys[j]
+        step_name_j = utils.step_name_str(yaml_stem, j, step_key)
+        sub_yml = steps[j][step_key]['subtree']
+        plugin_ns_j = wic_steps.get(f'({j+1}, {step_key})', {}).get('wic', {}).get('namespace', 'global')
+        sub_yaml_tree = YamlTree(StepId(step_key, plugin_ns_j), sub_yml)
+        future = executor.submit(compile_subworkflow_worker, sub_yaml_tree, args,
+                                 namespaces + [step_name_j], num_parents,
+                                 utils_graphs.get_subworkflow_graph(step_key, sub_yml), snapshot,
+                                 relative_run_path, testing)
+        speculations[step_name_j] = (future, sub_yml, snapshot)
+    return speculations
+
+
+def cancel_speculations(speculations: Dict[str, Speculation]) -> None:
+    """Cancels the (remaining) concurrent compilations of subworkflows
+
+    Args:
+        speculations (Dict[str, Speculation]): See submit_independent_subworkflows()
+    """
+    for (future, _, _) in speculations.values():
+        future.cancel()
+    speculations.clear()
+
+
+def get_speculative_subworkflow(speculation: Speculation, sub_yaml_tree: YamlTree, env: EnvData,
+                                yaml_stem: str) -> Optional[CompilerInfo]:
+    """Gets the result of compiling a subworkflow concurrently, if it is still valid.\n
+    In between submitting and reaching the subworkflow, the previous steps of
+    the parent workflow add entries to the input and output mappings. The
+    result is only valid if these are all namespaced by the steps of the parent
+    workflow, and thus cannot be referenced by the subworkflow.
+
+    Args:
+        speculation (Speculation): See submit_independent_subworkflows()
+        sub_yaml_tree (YamlTree): A tuple of name and yml AST of the subworkflow (at the time it is reached)
+        env (EnvData): The current environment (at the time it is reached)
+        yaml_stem (str): The name of the parent workflow
+
+    Returns:
+        Optional[CompilerInfo]: The compiled subworkflow, as if it were compiled with env, or None.
+    """
+    (future, sub_yml, snapshot) = speculation
+    prefix = f'{yaml_stem}__step__' # See utils.step_name_str()
+    if not (sub_yml is sub_yaml_tree.yml and
+            reuse.is_namespaced_extension(snapshot.input_mapping, env.input_mapping, prefix) and
+            reuse.is_namespaced_extension(snapshot.output_mapping, env.output_mapping, prefix)):
+        future.cancel()
+        return None
+    (compiler_info, stdout) = future.result()
+    print(stdout, end='')
+
+    # Replace the snapshot of the environment with the current environment.
+    changes = reuse.get_compiler_info_changes(reuse.get_fingerprints(), compiler_info, sub_yaml_tree, snapshot)
+    return reuse.apply_compiler_info_changes(changes, env)
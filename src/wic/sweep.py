@@ -0,0 +1,151 @@
+import argparse
+import csv
+import json
+from pathlib import Path
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import auto_gen_header, utils, utils_yaml
+from .wic_types import RoseTree, Yaml
+
+
+def read_sweep_rows(sweep_file: Path) -> Iterator[Yaml]:
+    """Lazily reads the parameter rows of a sweep, one row at a time.\n
+    Rows are read from a .csv file (with a header row) or a .jsonl file (one json object per line).
+    In a .csv file, an empty cell means that the compiled value of the input is used.
+
+    Args:
+        sweep_file (Path): The file to be read (see --sweep_file)
+
+    Raises:
+        Exception: If the file extension is not .csv or .jsonl, or a line of a .jsonl file is not an object.
+
+    Yields:
+        Iterator[Yaml]: The rows, i.e. the values of the inputs of the root workflow, by name.
+    """
+    if sweep_file.suffix not in ['.csv', '.jsonl']:
+        raise Exception(f'Error! Unknown sweep file format {sweep_file.suffix} (must be .csv or .jsonl)')
+    with open(sweep_file, mode='r', encoding='utf-8', newline='') as f:
+        if sweep_file.suffix == '.csv':
+            for row in csv.DictReader(f):
+                yield {key: val for key, val in row.items() if val != ''}
+            return
+        for i, line in enumerate(f):
+            if line.strip() == '':
+                continue
+            row = json.loads(line)
+            if not isinstance(row, Dict):
+                raise Exception(f'Error! Line {i+1} of {sweep_file} is not a json object.')
+            yield row
+
+
+def get_cwl_type(in_dict: Any) -> Tuple[str, bool]:
+    """Gets the (base) type of an input of a compiled CWL workflow.
+
+    Args:
+        in_dict (Any): The input, i.e. compiled_cwl['inputs'][key]
+
+    Returns:
+        Tuple[str, bool]: The type (i.e. string, int, File, array, etc) and whether the input is optional.
+    """
+    in_type = in_dict.get('type', 'Any') if isinstance(in_dict, Dict) else in_dict
+    if isinstance(in_type, List):
+        # i.e. ['null', 'string']
+        types = [t for t in in_type if t != 'null']
+        return (get_cwl_type(types[0])[0] if types else 'null', 'null' in in_type)
+    if isinstance(in_type, Dict):
+        return (in_type.get('type', 'Any'), False)
+    in_type = str(in_type)
+    return (in_type.rstrip('?'), in_type.endswith('?'))
+
+
+def convert_sweep_value(val: Any, in_dict: Any, sweep_dir: Path) -> Any:
+    """Converts a value of a sweep row to the value of an input in the yml inputs file.
+
+    Args:
+        val (Any): The value in the sweep row. (The values in .csv files are always strings.)
+        in_dict (Any): The input of the compiled CWL workflow
+        sweep_dir (Path): The directory of the sweep file. Relative paths are relative to this directory.
+
+    Returns:
+        Any: The value of the input in the yml inputs file.
+    """
+    (in_type, _) = get_cwl_type(in_dict)
+    if isinstance(val, str) and in_type not in ['string', 'File', 'Directory']:
+        # i.e. int, float, boolean, array, etc.
+        val = utils_yaml.safe_load(val)
+    if isinstance(val, str) and in_type in ['File', 'Directory']:
+        # NOTE: The inputs files are written to autogenerated/, so use absolute paths.
+        val = {'class': in_type, 'path': str((sweep_dir / val).absolute())}
+        in_format = in_dict.get('format') if isinstance(in_dict, Dict) else None
+        if in_type == 'File' and in_format:
+            val['format'] = in_format[0] if isinstance(in_format, List) else in_format
+    return val
+
+
+def check_sweep_row(row: Yaml, cwl_inputs: Yaml, yaml_inputs: Yaml) -> Optional[str]:
+    """Checks that a sweep row only contains inputs of the root workflow, and that
+    all of the required inputs (which do not have a compiled value) are given.
+
+    Args:
+        row (Yaml): The sweep row
+        cwl_inputs (Yaml): The inputs of the compiled root workflow
+        yaml_inputs (Yaml): The compiled yml inputs file of the root workflow
+
+    Returns:
+        Optional[str]: The error message, or None if the row is valid.
+    """
+    unknown = [key for key in row if key not in cwl_inputs]
+    if unknown:
+        return f'Unknown inputs {unknown} (the inputs of the root workflow are {list(cwl_inputs)})'
+    missing = [key for key, in_dict in cwl_inputs.items()
+               if key not in row and key not in yaml_inputs and not get_cwl_type(in_dict)[1]
+               and not (isinstance(in_dict, Dict) and 'default' in in_dict)]
+    if missing:
+        return f'Missing required inputs {missing}'
+    return None
+
+
+def run_sweep(args: argparse.Namespace, rose_tree: RoseTree) -> int:
+    """Writes one yml inputs file for the compiled root workflow per row of --sweep_file,
+    i.e. autogenerated/{yaml_stem}_inputs_1.yml, autogenerated/{yaml_stem}_inputs_2.yml, etc.\n
+    The rows are streamed, so the memory use is independent of the number of rows.
+
+    Args:
+        args (argparse.Namespace): The command line arguments
+        rose_tree (RoseTree): The compiled root workflow
+
+    Returns:
+        int: The exit code, i.e. 0 if all of the rows are valid.
+    """
+    sweep_file = Path(args.sweep_file)
+    yaml_stem = rose_tree.data.name
+    cwl_inputs: Yaml = rose_tree.data.compiled_cwl.get('inputs', {})
+    yaml_inputs = utils.remove_inputs_source(rose_tree.data.workflow_inputs_file)
+
+    time_start = time.perf_counter()
+    # The inputs which are not in the current row are the same for (almost) every
+    # row, so only dump them when the keys of the rows change.
+    constant: Optional[Tuple[List[str], str]] = None
+    num_rows = 0
+    num_written = 0
+    for num_rows, row in enumerate(read_sweep_rows(sweep_file), start=1):
+        error = check_sweep_row(row, cwl_inputs, yaml_inputs)
+        if error:
+            print(f'Error! Row {num_rows} of {sweep_file}: {error}')
+            return 1
+        if constant is None or constant[0] != list(row):
+            yaml_constant = {key: val for key, val in yaml_inputs.items() if key not in row}
+            constant = (list(row), utils_yaml.dump(yaml_constant, sort_keys=False, line_break='\n', indent=2,
+                                                   Dumper=utils_yaml.NoAliasDumper) if yaml_constant else '')
+        yaml_row = {key: convert_sweep_value(val, cwl_inputs[key], sweep_file.parent) for key, val in row.items()}
+        yaml_content = utils_yaml.dump(yaml_row, sort_keys=False, line_break='\n', indent=2,
+                                       Dumper=utils_yaml.NoAliasDumper) if yaml_row else ''
+        contents = auto_gen_header + constant[1] + yaml_content
+        if utils.write_file_if_changed(Path(f'autogenerated/{yaml_stem}_inputs_{num_rows}.yml'),
+                                       contents.encode('utf-8')):
+            num_written += 1
+
+    print(f'Instantiated {num_rows} inputs files autogenerated/{yaml_stem}_inputs_{{1..{num_rows}}}.yml '
+          f'in {time.perf_counter() - time_start:.2f}s ({num_written} written, {num_rows - num_written} unchanged)')
+    return 0
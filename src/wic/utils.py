@@ -1,14 +1,22 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import hashlib
 import json
+import os
 from pathlib import Path
+import shutil
+import stat
 import subprocess as sub
-from typing import Any, Dict, List, Optional, Tuple
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import yaml
 
-from . import auto_gen_header
-from .wic_types import (ExplicitEdgeCalls, Namespaces, NodeData, RoseTree, StepId, Json, Yaml, YamlForest, YamlTree)
+from . import auto_gen_header, utils_yaml
+from .wic_types import (ExplicitEdgeCalls, ExplicitEdgeDef, Namespaces, NamespacePath, NodeData, ResolvedMapping,
+                        RoseTree, StepId, Json, Yaml, YamlForest, YamlTree)
 
 
 def read_lines_pairs(filename: Path) -> List[Tuple[str, str]]:
@@ -51,7 +59,9 @@ def step_name_str(yaml_stem: str, i: int, step_key: str) -> str:
     """
     # Use double underscore so we can '__'.split() below.
     # (This should work as long as yaml_stem and step_key do not contain __)
-    return f'{yaml_stem}__step__{i+1}__{step_key}'
+    # NOTE: This is called many times for each step and the (namespaced) names
+    # built from it are stored in many places, so intern it to share a single copy.
+    return sys.intern(f'{yaml_stem}__step__{i+1}__{step_key}')
 
 
 def parse_step_name_str(step_name: str) -> Tuple[str, int, str]:
@@ -95,9 +105,9 @@ def shorten_namespaced_output_name(namespaced_output_name: str, sep: str = ' ')
         and namespaced_output_name, with the embedded yaml_stem prefixes
         removed and double underscores replaced with a single space.
     """
-    split = namespaced_output_name.split('___')
-    namespaces = split[:-1]
-    output_name = split[-1]
+    path = NamespacePath.parse(namespaced_output_name)
+    namespaces = path.init().namespaces()
+    output_name = path.segment
     strs = []
     yaml_stem_init = ''
     if len(namespaces) > 0:
@@ -210,7 +220,8 @@ def extract_backend(yaml_tree: Yaml, wic: Yaml, yaml_path: Path) -> Tuple[str, Y
     Returns:
         Tuple[str, Yaml]: The Yaml AST dict of the chosen backend.
     """
-    yaml_tree_copy = copy.deepcopy(yaml_tree)
+    # NOTE: A shallow copy suffices because we only replace the steps: tag.
+    yaml_tree_copy = copy.copy(yaml_tree)
     backend = ''
     if 'backends' in wic:
         if 'default_backend' in wic:
@@ -242,6 +253,40 @@ def extract_backend(yaml_tree: Yaml, wic: Yaml, yaml_path: Path) -> Tuple[str, Y
     return (backend, yaml_tree_copy)
 
 
+def copy_ast_spine(yaml_tree: Yaml) -> Yaml:
+    """Copies the given yml AST, except for the subtrees of the subworkflows,
+    which are shared with the original AST. (See read_ast_from_disk())
+
+    Since the compiler copies each subtree when (recursively) compiling it,
+    deepcopying the subtrees at every level of the recursion is unnecessary
+    and is quadratic in the nesting depth.
+
+    Args:
+        yaml_tree (Yaml): A yml AST, with subworkflows of the form {'subtree': ..., 'parentargs': ...}
+
+    Returns:
+        Yaml: A copy of yaml_tree which can be safely modified, provided the subtrees are not modified.
+    """
+    # deepcopy will not copy any objects which are already in the memo.
+    memo: Dict[int, Any] = {}
+
+    def add_subtrees_to_memo(obj: Any) -> None:
+        if isinstance(obj, Dict):
+            if isinstance(obj.get('subtree'), Dict) and 'parentargs' in obj:
+                memo[id(obj['subtree'])] = obj['subtree']
+                add_subtrees_to_memo(obj['parentargs'])
+            else:
+                for val in obj.values():
+                    add_subtrees_to_memo(val)
+        elif isinstance(obj, List):
+            for val in obj:
+                add_subtrees_to_memo(val)
+
+    add_subtrees_to_memo(yaml_tree)
+    yaml_tree_copy: Yaml = copy.deepcopy(yaml_tree, memo)
+    return yaml_tree_copy
+
+
 def flatten(lists: List[List[Any]]) -> List[Any]:
     """Concatenates a list of lists into a single list.
 
@@ -325,34 +370,15 @@ def flatten_forest(forest: YamlForest) -> List[YamlForest]:
     dfs = flatten(dfs_lists)
     return dfs
 
-# snakeyaml (a cromwell dependency) refuses to parse yaml files with more than
-# 50 anchors/aliases to prevent Billion Laughs attacks.
-# See https://en.wikipedia.org/wiki/Billion_laughs_attack
-# Solution: Inline the contents of the aliases into the anchors.
-# See https://ttl255.com/yaml-anchors-and-aliases-and-how-to-disable-them/#override
-class NoAliasDumper(yaml.SafeDumper):
-    def ignore_aliases(self, data: Any) -> bool:
-        return True
-
-
-def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool) -> None:
-    """Writes the compiled CWL files and their associated yml inputs files to disk.
-
-    NOTE: Only the yml input file associated with the root workflow is
-    guaranteed to have all inputs. In other words, subworkflows will all have
-    valid CWL files, but may not be executable due to 'missing' inputs.
+def remove_inputs_source(yaml_inputs: Yaml) -> Yaml:
+    """Removes the (json serialized) 'source' tags from the values of a yml inputs file.
 
     Args:
-        rose_tree (RoseTree): The data associated with compiled subworkflows
-        path (Path): The directory in which to write the files
-        relative_run_path (bool): Controls whether to use subdirectories or just one directory.
-    """
-    node_data: NodeData = rose_tree.data
-    namespaces = node_data.namespaces
-    yaml_stem = node_data.name
-    cwl_tree = node_data.compiled_cwl
-    yaml_inputs = node_data.workflow_inputs_file
+        yaml_inputs (Yaml): The yml inputs file of a compiled workflow
 
+    Returns:
+        Yaml: A copy of yaml_inputs, with the source tags removed.
+    """
     # NOTE: As part of the scatter feature we introduced the use of 'source',
     # but in some cases (biobb 'config' tag) it is not being removed correctly
     # in the compiler, so as a last resort remove it here.
@@ -366,8 +392,26 @@ def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool) -> N
         except Exception as e:
             pass
         yaml_inputs_no_source[key] = val
+    return yaml_inputs_no_source
+
+
+def get_files_to_write(rose_tree: RoseTree, path: Path, relative_run_path: bool) -> List[Tuple[Path, bytes]]:
+    """Serializes the compiled CWL files and their associated yml inputs files (in memory).
+
+    Args:
+        rose_tree (RoseTree): The data associated with compiled subworkflows
+        path (Path): The directory in which to write the files
+        relative_run_path (bool): Controls whether to use subdirectories or just one directory.
+
+    Returns:
+        List[Tuple[Path, bytes]]: The path and the contents of each file.
+    """
+    node_data: NodeData = rose_tree.data
+    namespaces = node_data.namespaces
+    yaml_stem = node_data.name
+    cwl_tree = node_data.compiled_cwl
+    yaml_inputs_no_source = remove_inputs_source(node_data.workflow_inputs_file)
 
-    path.mkdir(parents=True, exist_ok=True)
     if relative_run_path:
         filename_cwl = f'{yaml_stem}.cwl'
         filename_yml = f'{yaml_stem}_inputs.yml'
@@ -375,26 +419,92 @@ def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool) -> N
         filename_cwl = '___'.join(namespaces + [f'{yaml_stem}.cwl'])
         filename_yml = '___'.join(namespaces + [f'{yaml_stem}_inputs.yml'])
 
-    # Dump the compiled CWL file contents to disk.
+    # Dump the compiled CWL file contents.
     # Use sort_keys=False to preserve the order of the steps.
-    yaml_content = yaml.dump(cwl_tree, sort_keys=False, line_break='\n', indent=2, Dumper=NoAliasDumper)
-    with open(path / filename_cwl, mode='w', encoding='utf-8') as w:
-        w.write('#!/usr/bin/env cwl-runner\n')
-        w.write(auto_gen_header)
-        w.write(''.join(yaml_content))
+    yaml_content = utils_yaml.dump(cwl_tree, sort_keys=False, line_break='\n', indent=2,
+                                  Dumper=utils_yaml.NoAliasDumper)
+    contents_cwl = '#!/usr/bin/env cwl-runner\n' + auto_gen_header + yaml_content
 
-    yaml_content = yaml.dump(yaml_inputs_no_source, sort_keys=False, line_break='\n', indent=2, Dumper=NoAliasDumper)
-    with open(path / filename_yml, mode='w', encoding='utf-8') as inp:
-        inp.write(auto_gen_header)
-        inp.write(yaml_content)
+    yaml_content = utils_yaml.dump(yaml_inputs_no_source, sort_keys=False, line_break='\n', indent=2,
+                                  Dumper=utils_yaml.NoAliasDumper)
+    contents_yml = auto_gen_header + yaml_content
 
+    files = [(path / filename_cwl, contents_cwl.encode('utf-8')), (path / filename_yml, contents_yml.encode('utf-8'))]
     for sub_rose_tree in rose_tree.sub_trees:
         subpath = path
         if relative_run_path:
             sub_node_data: NodeData = sub_rose_tree.data
             sub_step_name = sub_node_data.namespaces[-1]
             subpath = path / sub_step_name
-        write_to_disk(sub_rose_tree, subpath, relative_run_path)
+        files += get_files_to_write(sub_rose_tree, subpath, relative_run_path)
+    return files
+
+
+# The sha256 hash of the contents of each file written by write_file_if_changed(),
+# keyed on the absolute path of the file and validated using the (st_mtime_ns, st_size) of the file.
+written_files_hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+
+def write_file_if_changed(path: Path, contents: bytes) -> bool:
+    """Atomically writes the given contents to a file, unless the file already has the same contents.
+
+    This preserves the mtime of unchanged files, i.e. so that it does not invalidate the caches of
+    CWL runners (i.e. cwltool --cachedir) or trigger editors and file watchers.
+
+    Args:
+        path (Path): The path to the file
+        contents (bytes): The new contents of the file
+
+    Returns:
+        bool: True if the file was written, False if it was unchanged.
+    """
+    digest = hashlib.sha256(contents).hexdigest()
+    key = str(path.absolute())
+    try:
+        stat = path.stat()
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        cached = written_files_hashes.get(key)
+        if cached is not None and cached[0] == stat_key:
+            if cached[1] == digest:
+                return False
+        elif stat.st_size == len(contents) and hashlib.sha256(path.read_bytes()).hexdigest() == digest:
+            written_files_hashes[key] = (stat_key, digest)
+            return False
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    write_file_atomic(path, contents)
+    stat = path.stat()
+    written_files_hashes[key] = ((stat.st_mtime_ns, stat.st_size), digest)
+    return True
+
+
+def write_to_disk(rose_tree: RoseTree, path: Path, relative_run_path: bool,
+                  max_workers: int = 1) -> Tuple[int, int]:
+    """Writes the compiled CWL files and their associated yml inputs files to disk.\n
+    Only the files whose contents have changed are (atomically) written. See write_file_if_changed()
+
+    NOTE: Only the yml input file associated with the root workflow is
+    guaranteed to have all inputs. In other words, subworkflows will all have
+    valid CWL files, but may not be executable due to 'missing' inputs.
+
+    Args:
+        rose_tree (RoseTree): The data associated with compiled subworkflows
+        path (Path): The directory in which to write the files
+        relative_run_path (bool): Controls whether to use subdirectories or just one directory.
+        max_workers (int): The number of threads to use for writing the files.
+
+    Returns:
+        Tuple[int, int]: The number of files which were written and the number which were unchanged.
+    """
+    files = get_files_to_write(rose_tree, path, relative_run_path)
+    if max_workers <= 1:
+        written = [write_file_if_changed(file, contents) for file, contents in files]
+    else:
+        # NOTE: Writing is I/O bound, so threads are sufficient.
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            written = list(executor.map(lambda file_contents: write_file_if_changed(*file_contents), files))
+    num_written = sum(written)
+    return (num_written, len(written) - num_written)
 
 
 def recursively_delete_dict_key(key: str, obj: Any) -> Any:
@@ -463,7 +573,8 @@ def reindex_wic_steps(wic_steps: Yaml, index: int) -> Yaml:
     wic_steps_reindexed = {}
     for keystr, val in wic_steps.items():
         (i, s) = parse_int_string_tuple(keystr)
-        newstr = f'({i+1}, {s})' if i >= index else keystr
+        # NOTE: keystr uses 1-based indexing, but index is 0-based.
+        newstr = f'({i+1}, {s})' if i > index else keystr
         wic_steps_reindexed[newstr] = val
     return wic_steps_reindexed
 
@@ -515,6 +626,39 @@ def copy_config_files() -> None:
             sub.run(cmd, check=True)
 
 
+# NOTE: The umask can only be read by setting it, which is not thread safe, so only read it once.
+umask = os.umask(0)
+os.umask(umask)
+
+
+def write_file_atomic(path: Path, contents: bytes) -> None:
+    """Atomically writes the given contents to a file.\n
+    Existing files keep their permissions; new files get the same permissions as with open().
+
+    Args:
+        path (Path): The path to the file
+        contents (bytes): The new contents of the file
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # NOTE: Multiple wic processes (i.e. cwl_watcher, pytest workers) may be
+    # writing the same file at the same time, so write to a temporary file in
+    # the same directory and then rename, which is atomic on POSIX.
+    try:
+        mode = stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~umask
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode='wb') as f:
+            # NOTE: mkstemp() always creates the file with mode 0o600, and os.replace() keeps it.
+            os.fchmod(f.fileno(), mode)
+            f.write(contents)
+        os.replace(tmp_name, path)
+    except Exception:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
 def recursively_insert_into_dict_tree(tree: Dict, keys: List[str], val: Any) -> Dict:
     """Recursively inserts a value into a nested tree of Dicts, creating new Dicts as necessary.
 
@@ -603,6 +747,124 @@ def parse_provenance_output_files_(obj: Any, parentdirs: str) -> List[Tuple[str,
     return []
 
 
+# The ioctl request code which clones (i.e. reflinks) a file on Linux. See linux/fs.h
+FICLONE = 0x40049409
+
+
+def reflink_file(source: Path, dest: Path) -> bool:
+    """Attempts to clone source to dest using a copy-on-write reflink, which
+    shares the data blocks between the files (i.e. on btrfs, xfs, etc).
+
+    Args:
+        source (Path): The source file
+        dest (Path): The destination file, which must not exist.
+
+    Returns:
+        bool: True if dest is now a reflink of source, otherwise False (and dest does not exist).
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl  # pylint: disable=import-outside-toplevel
+    try:
+        with open(source, mode='rb') as src, open(dest, mode='xb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        shutil.copymode(source, dest)
+        return True
+    except OSError:
+        # i.e. the filesystem does not support reflinks, or source and dest are on different filesystems.
+        dest.unlink(missing_ok=True)
+        return False
+
+
+def copy_output_file(source: Path, dest: Path, hardlink: bool = False) -> None:
+    """Copies source to dest, using a reflink if possible, otherwise falling back to a regular copy.
+
+    Args:
+        source (Path): The source file
+        dest (Path): The destination file. If it exists, it will be replaced.
+        hardlink (bool): Hardlink dest to source if possible.
+    """
+    # NOTE: Always replace (not overwrite) dest, in case it is a hardlink from a previous run.
+    dest.unlink(missing_ok=True)
+    if hardlink:
+        try:
+            os.link(source, dest)
+            return
+        except OSError:
+            pass  # i.e. source and dest are on different filesystems.
+    if not reflink_file(source, dest):
+        shutil.copy(source, dest)
+
+
+def get_output_file_dests(files: List[Tuple[str, str, str]], outdir: Path) -> List[Tuple[str, Path]]:
+    """Determines the destination path of each output file and creates the destination directories.
+
+    Args:
+        files (List[Tuple[str, str, str]]): This should be the output of parse_provenance_output_files(...)
+        outdir (Path): The output directory
+
+    Returns:
+        List[Tuple[str, Path]]: A List of (location, dest) for each output file.
+    """
+    # The names in each destination directory, i.e. both the files which already
+    # exist and the files which will be copied, so we never need to probe the filesystem.
+    names: Dict[Path, Set[str]] = {}
+    # The next index to try for each filename collision in each directory.
+    next_idx: Dict[Tuple[Path, str], int] = {}
+    dests: Set[Path] = set()
+    location_dests = []
+    for location, namespaced_output_name, basename in files:
+        yaml_stem_init, shortened = shorten_namespaced_output_name(namespaced_output_name)
+        parentdir = outdir / yaml_stem_init / shortened.replace('___', '/')
+        if parentdir not in names:
+            parentdir.mkdir(parents=True, exist_ok=True)
+            names[parentdir] = set(os.listdir(parentdir))
+        # NOTE: Even though we are using subdirectories (not just a single output directory),
+        # there is still the possibility of filename collisions, i.e. when scattering.
+        # For now, let's use a similar trick as cwltool of append _2, _3 etc.
+        # except do it BEFORE the extension.
+        # This could still cause problems with slicing, i.e. if you scatter across
+        # indices 11-20 first, then 1-10 second, the output file indices will get switched.
+        name = basename
+        if parentdir / name in dests:
+            stem = Path(basename).stem
+            suffix = Path(basename).suffix
+            idx = next_idx.get((parentdir, basename), 2)
+            while name in names[parentdir]:
+                name = stem + f'_{idx}' + suffix
+                idx += 1
+            next_idx[(parentdir, basename)] = idx
+        names[parentdir].add(name)
+        dests.add(parentdir / name)
+        location_dests.append((location, parentdir / name))
+    return location_dests
+
+
+def collect_provenance_output_files(files: List[Tuple[str, str, str]], provenance_dir: Path, outdir: Path,
+                                    hardlink: bool = False, max_workers: Optional[int] = None) -> List[Path]:
+    """Copies the output files of a workflow from the provenance directory into the output directory,
+    using subdirectories based on the namespaced output names.
+
+    Args:
+        files (List[Tuple[str, str, str]]): This should be the output of parse_provenance_output_files(...)
+        provenance_dir (Path): The directory which contains primary-output.json
+        outdir (Path): The output directory
+        hardlink (bool): Hardlink the output files (if possible) instead of copying them.
+        max_workers (Optional[int]): The number of threads. The default is the ThreadPoolExecutor default.
+
+    Returns:
+        List[Path]: The destination path of each output file (in the same order as files)
+    """
+    location_dests = get_output_file_dests(files, outdir)
+    # NOTE: Copying is I/O bound, so threads are sufficient.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(copy_output_file, provenance_dir / location, dest, hardlink)
+                   for location, dest in location_dests]
+        for future in futures:
+            future.result()  # Re-raise any exceptions
+    return [dest for _, dest in location_dests]
+
+
 def get_input_mappings(input_mapping: Dict[str, List[str]], arg_keys: List[str],
                        arg_key_in_yaml_tree_inputs: bool) -> List[str]:
     """Gets all of the workflow step inputs / call sites that are mapped from the given workflow inputs.
@@ -620,29 +882,45 @@ def get_input_mappings(input_mapping: Dict[str, List[str]], arg_keys: List[str],
     # need to (recursively) find all of the leaves of the mapping tree
     # corresponding to the root arg_key/in_name. Since we already added all
     # sub-input_mapping's (with namespacing) after each recursive call,
-    # this flattens the recursion into iteration here. The only trick is
+    # this flattens the recursion here. The only trick is
     # that we also need to remove the intermediate variables associated
     # with subworkflow boundaries.
     if not arg_key_in_yaml_tree_inputs:
-        done = False
-        while not done:
-            done = True
-            arg_keys_accum = []
-            for arg_key_ in arg_keys:
-                if arg_key_ in input_mapping:
-                    # Remove the intermediate variables associated with subworkflow boundaries.
-                    arg_key_init_namespaces = arg_key_.split('___')[:-1]
-                    temp = ['___'.join(arg_key_init_namespaces + [s]) for s in input_mapping[arg_key_]]
-                    arg_keys_accum.append(temp)
-                    done = False
-                else:
-                    arg_keys_accum.append([arg_key_])
-            arg_keys = [y for x in arg_keys_accum for y in x]
-            #print('arg_keys', arg_keys)
+        # NOTE: The leaves of each key are cached in the ResolvedMapping (if any)
+        resolved = input_mapping.resolved if isinstance(input_mapping, ResolvedMapping) else {}
+        arg_keys = [leaf for arg_key_ in arg_keys
+                    for leaf in resolve_input_mapping(input_mapping, arg_key_, resolved)]
+        #print('arg_keys', arg_keys)
 
     return arg_keys
 
 
+def resolve_input_mapping(input_mapping: Dict[str, List[str]], arg_key: str,
+                          resolved: Dict[str, List[str]]) -> List[str]:
+    """Gets the leaves of the mapping tree of a single workflow input. See get_input_mappings()\n
+    NOTE: resolved is mutably updated.
+
+    Args:
+        input_mapping (Dict[str, List[str]]): Maps workflow inputs to workflow step inputs, recursively namespaced.
+        arg_key (str): A workflow input, recursively namespaced.
+        resolved (Dict[str, List[str]]): The leaves of the keys which have already been resolved.
+
+    Returns:
+        List[str]: A list of the workflow step inputs / call sites, recursively namespaced.
+    """
+    leaves = resolved.get(arg_key)
+    if leaves is None:
+        if arg_key in input_mapping:
+            # Remove the intermediate variables associated with subworkflow boundaries.
+            arg_key_init_path = NamespacePath.parse(arg_key).init()
+            leaves = [leaf for s in input_mapping[arg_key]
+                      for leaf in resolve_input_mapping(input_mapping, str(arg_key_init_path.child(s)), resolved)]
+        else:
+            leaves = [arg_key]
+        resolved[arg_key] = leaves
+    return leaves
+
+
 def get_output_mapping(output_mapping: Dict[str, str], out_key: str) -> str:
     """Gets the workflow step output / return location that is mapped to the given workflow output.
 
@@ -657,16 +935,22 @@ def get_output_mapping(output_mapping: Dict[str, str], out_key: str) -> str:
     # Similarly, we need to find the fixed-point of output_mapping.
     # This is simpler since a workflow output can only come from one workflow step.
     #if not out_key_in_yaml_tree_outputs:
-    done = False
-    while not done:
-        done = True
+    # NOTE: The fixed-point of each key is cached in the ResolvedMapping (if any)
+    resolved = output_mapping.resolved if isinstance(output_mapping, ResolvedMapping) else {}
+    chain = []
+    while out_key in output_mapping:
+        if out_key in resolved:
+            out_key = resolved[out_key]
+            break
+        chain.append(out_key)
         #out_key = f'{step_name_j}___{out_key}' # TODO: Check this
-        if out_key in output_mapping:
-            # Remove the intermediate variables associated with subworkflow boundaries.
-            out_key_init_namespaces = out_key.split('___')[:-1]
-            out_key = '___'.join(out_key_init_namespaces + [output_mapping[out_key]])
-            done = False
+        # Remove the intermediate variables associated with subworkflow boundaries.
+        out_key_init_path = NamespacePath.parse(out_key).init()
+        out_key = str(out_key_init_path.child(output_mapping[out_key]))
         #print('out_key', out_key)
+    # Path compression, i.e. every key in the chain resolves directly to the fixed-point.
+    for key in chain:
+        resolved[key] = out_key
 
     return out_key
 
@@ -700,7 +984,7 @@ def write_absolute_config_files(args: argparse.Namespace, in_dict_in: Yaml, name
     arg_keys_ = ['root_workflow_yml_path', 'cachedir_path', 'cwl_dirs_file', 'yml_dirs_file']
     for arg_key_ in arg_keys_:
         in_name_ = f'{step_name_i}___{arg_key_}' # {step_name_i}_input___{arg_key}
-        explicit_edge_calls_copy.update({in_name_: (namespaces + [step_name_i], arg_key_)})
+        explicit_edge_calls_copy.update({in_name_: ExplicitEdgeDef(namespaces + [step_name_i], arg_key_)})
 
     # NOTE: Make the paths within *_dirs_file absolute here
     ns_paths = read_lines_pairs(Path(args.yml_dirs_file))
@@ -1,10 +1,11 @@
 import argparse
 import copy
 from pathlib import Path
+import sys
 from typing import Any, Dict, List
 
 from . import utils
-from .wic_types import (GraphReps, InternalOutputs, Namespaces, StepId, Tool, Tools,
+from .wic_types import (GraphReps, InternalOutputs, Namespaces, NamespacePath, StepId, Tool, Tools,
                         WorkflowOutputs, Yaml)
 
 
@@ -111,7 +112,7 @@ def get_workflow_outputs(args: argparse.Namespace,
         outputs_workflow (WorkflowOutputs): Contains the contents of the out: tags for each step.
         vars_workflow_output_internal (InternalOutputs): Keeps track of output\n
         variables which are internal to the root workflow, but not necessarily to subworkflows.
-        graph (GraphReps): A tuple of a GraphViz DiGraph and a networkx DiGraph
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
         tools_lst (List[Tool]): A list of the CWL CommandLineTools or compiled subworkflows for the current workflow.
         step_node_name (str): The namespaced name of the current step
 
@@ -128,33 +129,30 @@ def get_workflow_outputs(args: argparse.Namespace,
         for out_key in out_keys:
             out_var = f'{step_name_i}/{out_key}'
             # Avoid duplicating intermediate outputs in GraphViz
-            out_key_no_namespace = out_key.split('___')[-1]
+            out_key_no_namespace = NamespacePath.parse(out_key).segment
             if args.graph_show_outputs:
                 vars_nss = [var.replace('/', '___') for var in vars_workflow_output_internal]
                 case1 = (tool_i['class'] == 'Workflow') and (not out_key in vars_nss)
                 # Avoid duplicating outputs from subgraphs in parent graphs.
                 namespaced_output_name = '___'.join(namespaces + [step_name_i, out_key])
-                lengths_off_by_one = (len(step_node_name.split('___')) + 1 == len(namespaced_output_name.split('___')))
+                lengths_off_by_one = (NamespacePath.parse(step_node_name).depth + 1 ==
+                                      NamespacePath.parse(namespaced_output_name).depth)
                 # TODO: check is_root here
                 case1 = case1 and not is_root and lengths_off_by_one
                 case2 = (tool_i['class'] == 'CommandLineTool') and (not out_var in vars_workflow_output_internal)
                 if case1 or case2:
-                    graph_gv = graph.graphviz
                     graph_nx = graph.networkx
                     graphdata = graph.graphdata
                     attrs = {'label': out_key_no_namespace, 'shape': 'box',
                              'style': 'rounded, filled', 'fillcolor': 'lightyellow'}
-                    graph_gv.node(namespaced_output_name, **attrs)
                     font_edge_color = 'black' if args.graph_dark_theme else 'white'
+                    edge_attrs = {'color': font_edge_color}
                     if args.graph_label_edges:
-                        graph_gv.edge(step_node_name, namespaced_output_name, color=font_edge_color,
-                                      label=out_key_no_namespace)  # Is labeling necessary?
-                    else:
-                        graph_gv.edge(step_node_name, namespaced_output_name, color=font_edge_color)
+                        edge_attrs['label'] = out_key_no_namespace  # Is labeling necessary?
                     graph_nx.add_node(namespaced_output_name)
                     graph_nx.add_edge(step_node_name, namespaced_output_name)
                     graphdata.nodes.append((namespaced_output_name, attrs))
-                    graphdata.edges.append((step_node_name, namespaced_output_name, {}))
+                    graphdata.edges.append((step_node_name, namespaced_output_name, edge_attrs))
             # NOTE: Unless we are in the root workflow, we always need to
             # output everything. This is because while we are within a
             # subworkflow, we do not yet know if a subworkflow output will be used as
@@ -178,8 +176,8 @@ def get_workflow_outputs(args: argparse.Namespace,
                 # Promote scattered output types to arrays
                 out_dict['type'] = {'type': 'array', 'items': out_dict['type']}
 
-            out_name = f'{step_name_i}___{out_key}'  # Use triple underscore for namespacing so we can split later
-            out_var = f'{step_name_i}/{out_key}'
+            out_name = sys.intern(f'{step_name_i}___{out_key}')  # Use triple underscore for namespacing so we can split later
+            out_var = sys.intern(f'{step_name_i}/{out_key}')
             workflow_outputs.update({out_name: {**out_dict, 'outputSource': out_var}})
         #print('workflow_outputs', workflow_outputs)
     # NOTE: The fix_conflicts 'feature' of cwltool prevents files from being
@@ -223,6 +221,25 @@ def canonicalize_type(type_obj: Any) -> Any:
     return type_obj
 
 
+def hashable_type(type_obj: Any) -> Any:
+    """Converts a (canonical) CWL type: field into a hashable object, so that it can be used as a dict key.\n
+    Two types are equal if and only if their hashable types are equal.
+
+    Args:
+        type_obj (Any): An object that is a syntactic hodgepodge of valid CWL types.
+
+    Returns:
+        Any: A hashable object, where lists are replaced by tuples and dicts by frozensets.
+    """
+    if isinstance(type_obj, str):
+        return type_obj # Most types are simply str
+    if isinstance(type_obj, Dict):
+        return frozenset((key, hashable_type(val)) for key, val in type_obj.items())
+    if isinstance(type_obj, List):
+        return tuple(hashable_type(x) for x in type_obj)
+    return type_obj
+
+
 def copy_cwl_IO_dict(io_dict: Dict, removeQ: bool = False) -> Dict:
     """Copies the type, format, label, and doc entries. Does NOT copy inputBinding and outputBinding.
 
@@ -1,10 +1,11 @@
 import argparse
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Tuple
 
 import graphviz
+import networkx as nx
 
-from .wic_types import (GraphData, GraphReps, Json, Namespaces, Tool, Tools)
+from .wic_types import (GraphData, GraphReps, Json, Namespaces, NamespacePath, Tool, Tools, Yaml)
 
 
 def add_graph_edge(args: argparse.Namespace, graph: GraphReps,
@@ -20,7 +21,7 @@ def add_graph_edge(args: argparse.Namespace, graph: GraphReps,
 
     Args:
         args (argparse.Namespace): The command line arguments
-        graph (GraphReps): A tuple of a GraphViz DiGraph and a networkx DiGraph
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
         nss1 (Namespaces): The namespaces associated with the first node
         nss2 (Namespaces): The namespaces associated with the second node
         label (str): The edge label
@@ -28,25 +29,104 @@ def add_graph_edge(args: argparse.Namespace, graph: GraphReps,
     """
     if color == '':
         color = 'black' if args.graph_dark_theme else 'white'
-    nss1 = nss1[:(1 + args.graph_inline_depth)]
-    edge_node1 = '___'.join(nss1)
-    nss2 = nss2[:(1 + args.graph_inline_depth)]
-    edge_node2 = '___'.join(nss2)
-    graph_gv = graph.graphviz
+    # NOTE: The joined form of each NamespacePath is cached (and interned), so
+    # the edges share the strings of the nodes.
+    edge_node1 = str(NamespacePath.from_namespaces(nss1[:(1 + args.graph_inline_depth)]))
+    edge_node2 = str(NamespacePath.from_namespaces(nss2[:(1 + args.graph_inline_depth)]))
     graph_nx = graph.networkx
     graphdata = graph.graphdata
     attrs = {}
-    # Hide internal self-edges
+    # Hide internal self-edges (See graphdata_to_graphviz())
     if edge_node1 != edge_node2:
         attrs = {'color': color}
         if args.graph_label_edges:
             attrs['label'] = label
-
-        graph_gv.edge(edge_node1, edge_node2, **attrs)
     graph_nx.add_edge(edge_node1, edge_node2)
     graphdata.edges.append((edge_node1, edge_node2, attrs))
 
 
+# The lengths of the nodes, edges, subgraphs, and ranksame lists of the
+# GraphData. See checkpoint_graph()
+GraphCheckpoint = Tuple[int, int, int, int]
+# The corresponding slices of the lists (between two checkpoints).
+GraphAdditions = Tuple[List[Tuple[str, Dict]], List[Tuple[str, str, Dict]], List[Any], List[List[str]]]
+
+
+def checkpoint_graph(graph: GraphReps) -> GraphCheckpoint:
+    """Checkpoints the GraphData representation of a graph, so that any
+    subsequent additions can be rolled back using restore_graph().
+
+    Since our code only ever appends to the GraphData lists, we only need to
+    store the lengths, not copies.
+
+    Args:
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
+
+    Returns:
+        GraphCheckpoint: The checkpoint
+    """
+    graphdata = graph.graphdata
+    return (len(graphdata.nodes), len(graphdata.edges),
+            len(graphdata.subgraphs), len(graphdata.ranksame))
+
+
+def restore_graph(graph: GraphReps, graph_chk: GraphCheckpoint) -> None:
+    """Removes everything which has been added to the GraphData representation
+    of a graph since the given checkpoint. See checkpoint_graph()
+
+    NOTE: The networkx representation is NOT restored.
+
+    Args:
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
+        graph_chk (GraphCheckpoint): The checkpoint returned by checkpoint_graph()
+    """
+    (len_nodes, len_edges, len_subgraphs, len_ranksame) = graph_chk
+    graphdata = graph.graphdata
+    del graphdata.nodes[len_nodes:]
+    del graphdata.edges[len_edges:]
+    del graphdata.subgraphs[len_subgraphs:]
+    del graphdata.ranksame[len_ranksame:]
+
+
+def add_graph_additions(graph: GraphReps, graph_additions: GraphAdditions) -> None:
+    """Re-applies the additions made to a graph between two checkpoints to another graph. See checkpoint_graph()
+
+    Args:
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
+        graph_additions (GraphAdditions): The additions between two checkpoints
+    """
+    (nodes, edges, subgraphs, ranksame) = graph_additions
+    graphdata = graph.graphdata
+    graphdata.nodes.extend(nodes)
+    graphdata.edges.extend(edges)
+    graphdata.subgraphs.extend(subgraphs)
+    graphdata.ranksame.extend(ranksame)
+
+
+def get_subworkflow_graph(step_key: str, sub_yml: Yaml) -> GraphReps:
+    """Creates the (empty) graph of a subworkflow, with the label and style (if any) from the subworkflow
+
+    Args:
+        step_key (str): The name of the subworkflow step
+        sub_yml (Yaml): The yml AST of the subworkflow
+
+    Returns:
+        GraphReps: The graph of the subworkflow
+    """
+    # get the label (if any) from the subworkflow
+    step_i_wic_graphviz = sub_yml.get('wic', {}).get('graphviz', {})
+    label = step_i_wic_graphviz.get('label', step_key)
+    style = step_i_wic_graphviz.get('style', '')
+
+    subgraph_attrs = {'label': label, # str(path)
+                      'color': 'lightblue'} # color of outline
+    if style != '':
+        subgraph_attrs['style'] = style
+    subgraph_nx = nx.DiGraph()
+    subgraphdata = GraphData(step_key, attrs=subgraph_attrs)
+    return GraphReps(subgraph_nx, subgraphdata)
+
+
 def flatten_graphdata(graphdata: GraphData, parent: str = '') -> GraphData:
     """Flattens graphdata by recursively inlineing all subgraphs.
 
@@ -60,17 +140,9 @@ def flatten_graphdata(graphdata: GraphData, parent: str = '') -> GraphData:
     """
     subgraphs = [flatten_graphdata(subgraph, str(graphdata.name)) for subgraph in graphdata.subgraphs]
 
-    # NOTE: Even though all of the following default list arguments are [],
-    # you MUST explicitly supply the empty lists!!! Otherwise, after
-    # instantiation, the lists will contain values from previous instances!!!
-    # This shallow copy causes an infinite loop because as we copy nodes,
-    # they end up getting appended to the original lists!
-    # This makes absolutely no sense. Since the lists are defined at the
-    # instance level (NOT the class level), there should be zero sharing!
-    g_d = GraphData(str(graphdata.name), [], [], [], []) # This is fine
-    #g_d = GraphData(str(graphdata.name)) # This is NOT fine!
-    # i.e. The following statement will NOT print zeros (in the second case)!
-    #print(g_d.name, len(g_d.nodes), len(g_d.edges), len(g_d.subgraphs), len(g_d.ranksame))
+    # NOTE: GraphData used to have mutable default list arguments, which were
+    # shared by all instances, so the lists used to be explicitly supplied here.
+    g_d = GraphData(str(graphdata.name), [], [], [], [])
 
     for subgraph in subgraphs:
         # We need to add a placeholder node for each subgraph first
@@ -189,38 +261,61 @@ def add_subgraphs(args: argparse.Namespace,
                   namespaces: Namespaces,
                   step_1_names: List[str],
                   steps_ranksame: List[str]) -> None:
-    """Add all subgraphs to the current graph, except for GraphViz subgraphs
-    below a given depth, which allows us to hide irrelevant details.
+    """Add all subgraphs to the current graph. (The GraphViz subgraphs below a given
+    depth are hidden when materializing the GraphViz graph, see graphdata_to_graphviz())
 
     Args:
         args (argparse.Namespace): The command line arguments
-        graph (GraphReps): A tuple of a GraphViz DiGraph and a networkx DiGraph
+        graph (GraphReps): A tuple of a networkx DiGraph and a GraphData
         sibling_subgraphs (List[Graph]): The subgraphs of the immediate children of the current workflow
         namespaces (Namespaces): Specifies the path in the AST of the current subworkflow
         step_1_names (List[str]): The names of the first step
         steps_ranksame (List[str]): Additional node names to be aligned using ranksame
     """
-    graph_gv = graph.graphviz
     graph_nx = graph.networkx
-    # Add the cluster subgraphs to the main graph, but we need to add them in
-    # reverse order to trick the graphviz layout algorithm.
-    for sibling in sibling_subgraphs[::-1]: # Reverse!
-        (sib_graph_gv, sib_graph_nx, sib_graphdata) = sibling
-        if len(namespaces) < args.graph_inline_depth:
-            graph_gv.subgraph(sib_graph_gv)
+    for sibling in sibling_subgraphs:
+        (sib_graph_nx, sib_graphdata) = sibling
         graph_nx.add_nodes_from(sib_graph_nx.nodes)
         graph_nx.add_edges_from(sib_graph_nx.edges)
-    for sibling in sibling_subgraphs:
-        graph.graphdata.subgraphs.append(sibling.graphdata)
+        graph.graphdata.subgraphs.append(sib_graphdata)
     # Align the cluster subgraphs using the same rank as the first node of each subgraph.
     # See https://stackoverflow.com/questions/6824431/placing-clusters-on-the-same-rank-in-graphviz
     if len(namespaces) < args.graph_inline_depth:
-        step_1_names_display = [name for name in step_1_names if len(name.split('___')) < 2 + args.graph_inline_depth]
+        step_1_names_display = [name for name in step_1_names if NamespacePath.parse(name).depth < 2 + args.graph_inline_depth]
         if len(step_1_names_display) > 1:
-            nodes_same_rank = '\t{rank=same; ' + '; '.join(step_1_names_display) + '}\n'
-            graph_gv.body.append(nodes_same_rank)
-            graph.graphdata.ranksame = step_1_names_display
+            graph.graphdata.ranksame.append(step_1_names_display)
         if len(steps_ranksame) > 1:
-            nodes_same_rank = '\t{rank=same; ' + '; '.join(steps_ranksame) + '}\n'
+            graph.graphdata.ranksame.append(steps_ranksame)
+
+
+def graphdata_to_graphviz(graphdata: GraphData, graph_inline_depth: int, depth: int = 0) -> graphviz.Digraph:
+    """Materializes the GraphViz (cluster) subgraph corresponding to the given GraphData,
+    except for the subgraphs below the given depth, which allows us to hide irrelevant details.\n
+    This is only necessary for rendering, so it is done after compilation. (See --graph_render)
+
+    Args:
+        graphdata (GraphData): A data structure which contains recursive subgraphs and other metadata.
+        graph_inline_depth (int): See args.graph_inline_depth
+        depth (int, optional): The depth of the current subgraph, i.e. len(namespaces). Defaults to 0.
+
+    Returns:
+        graphviz.Digraph: A GraphViz cluster subgraph, i.e. for use with graphviz.Digraph.subgraph()
+    """
+    graph_gv = graphviz.Digraph(name=f'cluster_{graphdata.name}')
+    if graphdata.attrs:
+        graph_gv.attr(**graphdata.attrs)
+    for (node, attrs) in graphdata.nodes:
+        graph_gv.node(node, **attrs)
+    for (node1, node2, attrs) in graphdata.edges:
+        # Hide internal self-edges (See add_graph_edge())
+        if node1 != node2:
+            graph_gv.edge(node1, node2, **attrs)
+    if depth < graph_inline_depth:
+        # Add the cluster subgraphs to the main graph, but we need to add them in
+        # reverse order to trick the graphviz layout algorithm.
+        for subgraph in graphdata.subgraphs[::-1]: # Reverse!
+            graph_gv.subgraph(graphdata_to_graphviz(subgraph, graph_inline_depth, depth + 1))
+        for ranksame in graphdata.ranksame:
+            nodes_same_rank = '\t{rank=same; ' + '; '.join(ranksame) + '}\n'
             graph_gv.body.append(nodes_same_rank)
-            graph.graphdata.ranksame = steps_ranksame
+    return graph_gv
@@ -0,0 +1,111 @@
+import os
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+import yaml
+
+# Use the libyaml bindings when PyYAML was built with them; they are roughly an
+# order of magnitude faster than the pure-Python implementations. Otherwise,
+# transparently fall back to the pure-Python implementations. Both use the same
+# (Python) resolver and representer, so the parsed documents are identical.
+# NOTE: The emitters fold long double-quoted strings differently, so the dumped
+# yml files are not byte-for-byte identical, but they parse to the same document.
+try:
+    from yaml import CSafeDumper as SafeDumper, CSafeLoader as SafeLoader
+    from yaml import CDumper as Dumper
+except ImportError:
+    from yaml import SafeDumper, SafeLoader  # type: ignore
+    from yaml import Dumper  # type: ignore
+
+# NOTE: The yml ASTs (i.e. the _tree_raw.yml and _tree_merged.yml debugging files) contain
+# python objects (i.e. the StepId keys of wic: backends:) which SafeDumper cannot represent.
+# Use dump(..., Dumper=Dumper) for these.
+
+
+# snakeyaml (a cromwell dependency) refuses to parse yaml files with more than
+# 50 anchors/aliases to prevent Billion Laughs attacks.
+# See https://en.wikipedia.org/wiki/Billion_laughs_attack
+# Solution: Inline the contents of the aliases into the anchors.
+# See https://ttl255.com/yaml-anchors-and-aliases-and-how-to-disable-them/#override
+class NoAliasDumper(SafeDumper):
+    def ignore_aliases(self, data: Any) -> bool:
+        return True
+
+
+# The parsed contents of each yml file, keyed on the absolute path of the file
+# and validated using the (st_mtime_ns, st_size) of the file.
+YamlCache = Dict[str, Tuple[Tuple[int, int], Any]]
+yaml_cache: YamlCache = {}
+
+
+def safe_load(stream: Any) -> Any:
+    """Parses the given yml document using only the standard yaml tags (i.e. yaml.safe_load)
+
+    Args:
+        stream (Any): A str, bytes, or file object
+
+    Returns:
+        Any: The parsed yml document
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def dump(data: Any, **kwargs: Any) -> str:
+    """Serializes the given object using only the standard yaml tags (i.e. yaml.safe_dump)
+
+    Args:
+        data (Any): The object to be serialized
+        kwargs (Any): Any additional arguments to yaml.dump, i.e. sort_keys, indent, Dumper, etc.
+
+    Returns:
+        str: The yml document
+    """
+    kwargs.setdefault('Dumper', SafeDumper)
+    yaml_str: str = yaml.dump(data, **kwargs)
+    return yaml_str
+
+
+def copy_yaml(obj: Any) -> Any:
+    """Copies the dicts and lists of a parsed yml document. The scalars are
+    immutable, so they are shared. This is much faster than copy.deepcopy()
+
+    Args:
+        obj (Any): A parsed yml document
+
+    Returns:
+        Any: A copy of obj which can be safely modified.
+    """
+    if isinstance(obj, dict):
+        return {key: copy_yaml(val) for key, val in obj.items()}
+    if isinstance(obj, list):
+        return [copy_yaml(val) for val in obj]
+    return obj
+
+
+def load_file(yaml_path: Path, use_cache: bool = True) -> Any:
+    """Reads and parses the given yml file.\n
+    The same yml file is typically read many times, i.e. when a subworkflow
+    appears multiple times in a workflow, so the parsed contents are cached
+    (per process). Each entry is invalidated when the modification time or
+    size of the file changes.
+
+    Args:
+        yaml_path (Path): The path to the yml file
+        use_cache (bool): Reuse the parsed contents of the file from a previous call.
+
+    Returns:
+        Any: The parsed yml file. This is always a new copy which the caller can modify.
+    """
+    path_abs = os.path.abspath(yaml_path)
+    stat = os.stat(path_abs)
+    cache_key = (stat.st_mtime_ns, stat.st_size)
+    cached = yaml_cache.get(path_abs)
+    if use_cache and cached is not None and cached[0] == cache_key:
+        return copy_yaml(cached[1])
+
+    with open(path_abs, mode='r', encoding='utf-8') as y:
+        yaml_tree = safe_load(y.read())
+    if use_cache:
+        yaml_cache[path_abs] = (cache_key, yaml_tree)
+        return copy_yaml(yaml_tree)
+    return yaml_tree
@@ -1,4 +1,6 @@
-from typing import Any, Dict, List, NamedTuple, Tuple
+from pathlib import Path
+import sys
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 import networkx as nx
 
@@ -33,38 +35,191 @@ Tools = Dict[StepId, Tool]
 Namespace = str
 Namespaces = List[Namespace]
 
+class NamespacePath():
+    """The internal representation of a '___'-joined string of Namespaces.\n
+    Paths are hash-consed, i.e. there is exactly one instance per distinct
+    sequence of (interned) namespaces, so equality is identity and prefix tests
+    simply walk the parent pointers, without building or splitting any strings.
+    The '___'-joined string form is only constructed (once) when it is needed
+    for the CWL (or the graphs), i.e. str(path).
+
+    Use NamespacePath.root(), NamespacePath.from_namespaces(), or
+    NamespacePath.parse() instead of the constructor.\n
+    NOTE: The paths are shared between threads (see api.py), so new paths are only
+    ever added using dict.setdefault(), which is atomic, so that they stay unique.
+    """
+    # NOTE: There is one instance per distinct (prefix of a) namespaced name, so use __slots__
+    __slots__ = ('parent', 'segment', 'depth', '_children', '_joined')
+
+    _root: 'NamespacePath' # See below
+    # NOTE: The namespaced names are read back out of the CWL many times, so cache the parsing.
+    # Since the same process can compile many workflows (i.e. --serve, --yamls, and api.py),
+    # the cache is cleared when it is full. (The paths themselves are unique regardless.)
+    _parsed: Dict[str, 'NamespacePath'] = {}
+    _parsed_max_size = 1 << 16
+
+    def __init__(self, parent: Optional['NamespacePath'], segment: str) -> None:
+        self.parent = parent
+        self.segment = segment
+        self.depth: int = 0 if parent is None else parent.depth + 1
+        self._children: Dict[str, 'NamespacePath'] = {}
+        self._joined: Optional[str] = None
+
+    @classmethod
+    def root(cls) -> 'NamespacePath':
+        """Returns the empty path, i.e. the path with no namespaces"""
+        return cls._root
+
+    @classmethod
+    def from_namespaces(cls, namespaces: Namespaces) -> 'NamespacePath':
+        """Returns the path of the given namespaces, i.e. the inverse of namespaces()"""
+        path = cls.root()
+        for namespace in namespaces:
+            path = path.child(namespace)
+        return path
+
+    @classmethod
+    def parse(cls, namespaced_name: str) -> 'NamespacePath':
+        """Returns the path of a '___'-joined string, i.e. the inverse of str()"""
+        path = cls._parsed.get(namespaced_name)
+        if path is None:
+            if len(cls._parsed) >= cls._parsed_max_size:
+                cls._parsed.clear()
+            path = cls.from_namespaces(namespaced_name.split('___')) if namespaced_name else cls.root()
+            path = cls._parsed.setdefault(namespaced_name, path)
+        return path
+
+    def child(self, namespace: Namespace) -> 'NamespacePath':
+        """Returns the path with namespace appended (namespace may itself be '___'-joined)"""
+        path = self._children.get(namespace)
+        if path is None:
+            if '___' in namespace:
+                # NOTE: Split so that there is still exactly one instance per distinct path.
+                path = self
+                for namespace_ in namespace.split('___'):
+                    path = path.child(namespace_)
+            else:
+                path = NamespacePath(self, sys.intern(namespace))
+            # NOTE: If another thread added the same child first, use that one.
+            path = self._children.setdefault(namespace, path)
+        return path
+
+    def init(self) -> 'NamespacePath':
+        """Returns the path without its last namespace, i.e. namespaces[:-1]"""
+        return self if self.parent is None else self.parent
+
+    def ancestor(self, depth: int) -> 'NamespacePath':
+        """Returns the prefix of this path with the given depth (if shorter), i.e. namespaces[:depth]"""
+        path = self
+        while path.depth > depth:
+            path = path.parent # type: ignore
+        return path
+
+    def startswith(self, prefix: 'NamespacePath') -> bool:
+        """Returns True iff prefix is a (not necessarily proper) prefix of this path. O(depth)"""
+        return prefix.depth <= self.depth and self.ancestor(prefix.depth) is prefix
+
+    def rebase(self, old: 'NamespacePath', new: 'NamespacePath') -> 'NamespacePath':
+        """Returns this path with its prefix old replaced by new, or this path if old is not a prefix."""
+        if not self.startswith(old):
+            return self
+        segments = []
+        path = self
+        while path is not old:
+            segments.append(path.segment)
+            path = path.parent # type: ignore
+        for segment in reversed(segments):
+            new = new.child(segment)
+        return new
+
+    def namespaces(self) -> Namespaces:
+        """Returns the namespaces of this path, i.e. the inverse of from_namespaces()"""
+        namespaces: Namespaces = []
+        path = self
+        while path.parent is not None:
+            namespaces.append(path.segment)
+            path = path.parent
+        namespaces.reverse()
+        return namespaces
+
+    def __str__(self) -> str:
+        if self._joined is None:
+            if self.parent is None:
+                self._joined = ''
+            elif self.parent.parent is None:
+                self._joined = self.segment
+            else:
+                self._joined = sys.intern(f'{self.parent}___{self.segment}')
+        return self._joined
+
+    def __repr__(self) -> str:
+        return f'NamespacePath({str(self)!r})'
+
+# NOTE: Create the root eagerly, so that there is exactly one (even with threads).
+NamespacePath._root = NamespacePath(None, '')
+
 WorkflowInputs = Dict[str, Dict[str, str]]
 WorkflowInputsFile = Dict[str, Dict[str, str]]
 WorkflowOutputs = List[Yaml]
 InternalOutputs = List[str]
-ExplicitEdgeDef = Tuple[Namespaces, str]
+class ExplicitEdgeDef(NamedTuple):
+    namespaces: Namespaces # The namespaces of the step where the edge is defined (or called)
+    name: str # The name of the input (i.e. arg_key)
 ExplicitEdgeDefs = Dict[str, ExplicitEdgeDef]
 ExplicitEdgeCalls = Dict[str, ExplicitEdgeDef]
 PluginID = int
 StepName1 = str
-DiGraph = Any # graphviz.DiGraph
+
+# Edge inference compares the type and format of each input with the outputs of
+# the previous steps. Instead of re-scanning all of the outputs of all of the
+# previous steps for every input, index the outputs of each (compiled) step once.
+# See inference.index_step_outputs()
+TypeFormat = Tuple[Any, str] # (utils_cwl.hashable_type(), format)
+class StepOutputs(NamedTuple):
+    # (out_key, out_type, out_format) for each output that inference will attempt
+    # to match, i.e. in reverse order and truncated by any 'break' inference rule.
+    attempted: List[Tuple[str, Any, Any]]
+    # The (non-log) outputs, as (index into attempted, out_key)
+    matches: Dict[TypeFormat, List[Tuple[int, str]]]
+    is_break: bool
+class OutputsIndex(NamedTuple):
+    steps: List[StepOutputs] # One entry for each step that has been compiled.
+    matches: Dict[TypeFormat, List[int]] # The (increasing) step numbers with matching outputs
+    breaks: List[int] # The (increasing) step numbers with 'break' inference rules
+# (source format, target format) -> the file format conversions, in the order of Tools.
+# See inference.get_conversions_index()
+ConversionsIndex = Dict[Tuple[str, str], List[StepId]]
 
 class GraphData():
+    # NOTE: There is one instance per (sub)workflow, so use __slots__ to avoid
+    # the per-instance __dict__. (dataclass(slots=True) requires python 3.10)
+    __slots__ = ('name', 'nodes', 'edges', 'subgraphs', 'ranksame', 'attrs')
 
     def __init__(self,
                  name: str, # TODO: Should this be StepId?
-                 nodes: List[Tuple[str, Dict]] = [],
-                 edges: List[Tuple[str, str, Dict]] = [],
-                 subgraphs: List[Any] = [],
-                 ranksame: List[str] = []) -> None:
-        # NOTE: See comments in utils_graphs.flatten_graphdata() !!!
+                 nodes: Optional[List[Tuple[str, Dict]]] = None,
+                 edges: Optional[List[Tuple[str, str, Dict]]] = None,
+                 subgraphs: Optional[List[Any]] = None,
+                 ranksame: Optional[List[List[str]]] = None,
+                 attrs: Optional[Dict[str, str]] = None) -> None:
+        # NOTE: Do NOT use [] as the default arguments! Default arguments are
+        # evaluated once (when the function is defined), so all instances
+        # would share (and mutate) the same lists. See utils_graphs.flatten_graphdata()
         self.name = name
-        self.nodes = nodes
-        self.edges = edges
-        self.subgraphs = subgraphs
-        self.ranksame = ranksame
+        self.nodes = [] if nodes is None else nodes
+        self.edges = [] if edges is None else edges
+        self.subgraphs = [] if subgraphs is None else subgraphs
+        self.ranksame = [] if ranksame is None else ranksame # The groups of nodes with the same rank
+        self.attrs = {} if attrs is None else attrs # The (cluster) graph attributes, i.e. label
 
 
 # This groups together the classes which represent our graph.
 # Excluding --graph_inline_depth related code, all graph
 # operations should be performed on all representations.
+# NOTE: The GraphViz representation is no longer constructed during compilation.
+# Since it is only needed for rendering, it is materialized from the GraphData
+# afterwards (if at all, see --graph_render). See utils_graphs.graphdata_to_graphviz()
 class GraphReps(NamedTuple):
-    graphviz: DiGraph
     networkx: nx.DiGraph
     graphdata: GraphData
 YamlDSLArgs = Yaml
@@ -90,7 +245,8 @@ class NodeData(NamedTuple):
     name: str
     yml: Yaml # i.e. The AST that was compiled.
     # If this is not the AST that was passed in, then the compiler introduced
-    # some modifications (i.e. file format conversions) and you need to recompile
+    # some modifications (i.e. file format conversions) and compiled_cwl
+    # corresponds to this modified AST.
     compiled_cwl: Cwl
     workflow_inputs_file: WorkflowInputsFile
     explicit_edge_defs: ExplicitEdgeDefs
@@ -99,6 +255,171 @@ class NodeData(NamedTuple):
     inputs_workflow: WorkflowInputs
     step_name_1: StepName1
 
+# Distinguishes missing entries from entries whose value is None. See UndoableMapping
+_MISSING = object()
+
+class UndoableMapping(Dict[str, Any]):
+    """A dict which can roll back all of its modifications since a checkpoint.
+
+    The modifications are stored in an undo log, so checkpointing is O(1) and
+    rolling back is proportional to the number of modifications, instead of
+    copying the entire dict at each checkpoint. (See compile_workflow_once())
+    NOTE: Only the entries are logged, so the values must not be modified in-place.
+    """
+    __slots__ = ('undo_log',)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # NOTE: None means there is no checkpoint, so copies do not log their modifications.
+        self.undo_log: Optional[List[Tuple[str, Any]]] = None
+
+    def copy(self) -> 'UndoableMapping':
+        return UndoableMapping(self)
+
+    def __reduce__(self) -> Any:
+        # NOTE: The default pickling of dict subclasses calls __setitem__ before
+        # restoring the slots, so just pickle the contents (and not the undo log).
+        return (type(self), (dict(self),))
+
+    def checkpoint(self) -> None:
+        """Starts logging the modifications, discarding the previous checkpoint (if any)."""
+        self.undo_log = []
+
+    def restore(self) -> None:
+        """Rolls back all of the modifications since the last checkpoint(), and keeps the checkpoint.
+
+        NOTE: The entries are restored in-place, so the order of the keys is restored,
+        except for the order of any entries which were deleted since the checkpoint.
+        """
+        undo_log = self.undo_log or []
+        self.undo_log = None
+        for key, val in reversed(undo_log):
+            if val is _MISSING:
+                del self[key]
+            else:
+                self[key] = val
+        self.undo_log = []
+
+    def __setitem__(self, key: str, val: Any) -> None:
+        if self.undo_log is not None:
+            self.undo_log.append((key, dict.get(self, key, _MISSING)))
+        super().__setitem__(key, val)
+
+    def __delitem__(self, key: str) -> None:
+        if self.undo_log is not None:
+            self.undo_log.append((key, dict.__getitem__(self, key)))
+        super().__delitem__(key)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, val in dict(*args, **kwargs).items():
+            self[key] = val
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *args: Any) -> Any:
+        if key not in self:
+            return super().pop(key, *args)
+        val = self[key]
+        del self[key]
+        return val
+
+    def popitem(self) -> Any:
+        (key, val) = super().popitem()
+        if self.undo_log is not None:
+            self.undo_log.append((key, val))
+        return (key, val)
+
+    def clear(self) -> None:
+        if self.undo_log is not None:
+            self.undo_log.extend(reversed(self.items()))
+        super().clear()
+
+class IndexedMapping(UndoableMapping):
+    """A dict of namespaced names which also indexes its keys by the yml stem
+    of their first namespace, i.e. by the (sub)workflow whose step added them.
+    (See utils.step_name_str()) The keys which are not namespaced by a step
+    (i.e. the names of the workflow inputs and outputs) are indexed by ''.\n
+    This allows finding the entries which can affect the compilation of a
+    subworkflow without scanning all of the entries. See reuse.get_memo_key()
+    """
+    __slots__ = ('keys_by_stem',)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.keys_by_stem: Dict[str, Dict[str, None]] = {}
+        if len(args) == 1 and not kwargs and isinstance(args[0], IndexedMapping):
+            # NOTE: If we are copying another IndexedMapping, copy its index instead of re-indexing.
+            self.keys_by_stem = {stem: dict(keys) for stem, keys in args[0].keys_by_stem.items()}
+        else:
+            for key in self:
+                self.keys_by_stem.setdefault(IndexedMapping.get_stem(key), {})[key] = None
+
+    @staticmethod
+    def get_stem(key: str) -> str:
+        """Returns the yml stem of the first namespace of key, or '' if it is not namespaced by a step"""
+        step_name = key.split('___', 1)[0]
+        return step_name.split('__step__', 1)[0] if '__step__' in step_name else ''
+
+    def copy(self) -> 'IndexedMapping':
+        return IndexedMapping(self)
+
+    # NOTE: update, setdefault, and pop are implemented in terms of __setitem__ and __delitem__
+    def __setitem__(self, key: str, val: Any) -> None:
+        super().__setitem__(key, val)
+        self.keys_by_stem.setdefault(IndexedMapping.get_stem(key), {})[key] = None
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        del self.keys_by_stem[IndexedMapping.get_stem(key)][key]
+
+    def popitem(self) -> Any:
+        (key, val) = super().popitem()
+        del self.keys_by_stem[IndexedMapping.get_stem(key)][key]
+        return (key, val)
+
+    def clear(self) -> None:
+        super().clear()
+        self.keys_by_stem.clear()
+
+class ResolvedMapping(IndexedMapping):
+    """An IndexedMapping which also caches the (transitively) resolved value of each key.\n
+    The input and output mappings are chains of subworkflow boundaries, and
+    resolving a key follows the chain to its end (see utils.get_input_mappings()
+    and utils.get_output_mapping()). The resolved values are cached until the
+    mapping is modified, so resolving a key is amortized O(1).
+    """
+    __slots__ = ('resolved',)
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # NOTE: If we are copying another ResolvedMapping, its cache is still valid.
+        resolved = args[0].resolved if len(args) == 1 and not kwargs and isinstance(args[0], ResolvedMapping) else {}
+        self.resolved: Dict[str, Any] = dict(resolved)
+
+    def copy(self) -> 'ResolvedMapping':
+        return ResolvedMapping(self)
+
+    # NOTE: Any modification can change the resolution of any key, so clear the cache.
+    # (update, setdefault, and pop are implemented in terms of __setitem__ and __delitem__)
+    def __setitem__(self, key: str, val: Any) -> None:
+        self.resolved.clear()
+        super().__setitem__(key, val)
+
+    def __delitem__(self, key: str) -> None:
+        self.resolved.clear()
+        super().__delitem__(key)
+
+    def popitem(self) -> Any:
+        self.resolved.clear()
+        return super().popitem()
+
+    def clear(self) -> None:
+        self.resolved.clear()
+        super().clear()
+
 class EnvData(NamedTuple):
     input_mapping: Dict[str, List[str]]
     output_mapping: Dict[str, str]
@@ -124,6 +445,9 @@ class CompilerInfo(NamedTuple):
 class YamlTree(NamedTuple):
     step_id: StepId
     yml: Yaml
+# The validated, (recursively) read subworkflows, keyed on the resolved path of
+# the yml file. See ast.read_ast_from_disk()
+AstCache = Dict[Path, Yaml]
 class YamlForest(NamedTuple):
     yaml_tree: YamlTree
     sub_forests: List[Tuple[StepId, Any]] # Any = YamlForest
@@ -1,23 +1,35 @@
 import argparse
+import copy
+import json
+from concurrent.futures import ThreadPoolExecutor
+import stat
 import subprocess as sub
 import sys
+import time
 from pathlib import Path
-from unittest.mock import patch
-from typing import List
+from typing import Dict, List
 
-import graphviz
 import networkx as nx
 import pytest
 import yaml
+from jsonschema import Draft202012Validator, RefResolver
 from networkx.algorithms import isomorphism
 
+import wic.api
+import wic.batch
 import wic.cli
+import wic.client
 import wic.compiler
+import wic.reuse
 import wic.main
+import wic.speculation
+import wic.sweep
 import wic.utils
+import wic.utils_graphs
+import wic.utils_yaml
 from wic import auto_gen_header
 from wic.schemas import wic_schema
-from wic.wic_types import GraphData, GraphReps, NodeData, StepId, Yaml, YamlTree
+from wic.wic_types import GraphData, GraphReps, Json, NamespacePath, NodeData, StepId, Yaml, YamlTree
 
 
 def get_args(yml_path: str = '') -> argparse.Namespace:
@@ -26,11 +38,8 @@ def get_args(yml_path: str = '') -> argparse.Namespace:
     Returns:
         argparse.Namespace: The mocked command line arguments
     """
-    testargs = ['wic', '--yaml', yml_path, '--cwl_output_intermediate_files', 'True']  # ignore --yaml
     # For now, we need to enable --cwl_output_intermediate_files. See comment in compiler.py
-    with patch.object(sys, 'argv', testargs):
-        args: argparse.Namespace = wic.cli.parser.parse_args()
-    return args
+    return wic.cli.get_args(yml_path, ['--cwl_output_intermediate_files', 'True'])  # ignore --yaml
 
 
 tools_cwl = wic.main.get_tools_cwl(get_args().cwl_dirs_file)
@@ -59,8 +68,7 @@ def test_examples(yml_path_str: str, yml_path: Path) -> None:
     """
     # First compile the workflow.
     # Load the high-level yaml workflow file.
-    with open(yml_path, mode='r', encoding='utf-8') as y:
-        root_yaml_tree: Yaml = yaml.safe_load(y.read())
+    root_yaml_tree: Yaml = wic.utils_yaml.load_file(yml_path)
     Path('autogenerated/').mkdir(parents=True, exist_ok=True)
     wic_tag = {'wic': root_yaml_tree.get('wic', {})}
     plugin_ns = wic_tag['wic'].get('namespace', 'global')
@@ -74,11 +82,9 @@ def test_examples(yml_path_str: str, yml_path: Path) -> None:
         f.write(yaml.dump(yaml_tree.yml))
 
 
-    graph_gv = graphviz.Digraph(name=f'cluster_{yml_path}')
-    graph_gv.attr(newrank='True')
     graph_nx = nx.DiGraph()
     graphdata = GraphData(str(yml_path))
-    graph = GraphReps(graph_gv, graph_nx, graphdata)
+    graph = GraphReps(graph_nx, graphdata)
     compiler_info = wic.compiler.compile_workflow(yaml_tree, get_args(str(yml_path)), [], [graph], {}, {}, {}, {},
                                                     tools_cwl, True, relative_run_path=True, testing=True)
     rose_tree = compiler_info.rose
@@ -132,8 +138,7 @@ def test_cwl_embedding_independence(yml_path_str: str, yml_path: Path) -> None:
     that the embedded subworkflow DAGs and the re-compiled DAGs are isomorphic.
     """
     # Load the high-level yaml workflow file.
-    with open(yml_path, mode='r', encoding='utf-8') as y:
-        root_yaml_tree: Yaml = yaml.safe_load(y.read())
+    root_yaml_tree: Yaml = wic.utils_yaml.load_file(yml_path)
     # Write the combined workflow (with all subworkflows as children) to disk.
     Path('autogenerated/').mkdir(parents=True, exist_ok=True)
     wic_tag = {'wic': root_yaml_tree.get('wic', {})}
@@ -152,11 +157,9 @@ def test_cwl_embedding_independence(yml_path_str: str, yml_path: Path) -> None:
     yaml_forest = wic.ast.tree_to_forest(yaml_tree, tools_cwl)
     yaml_forest_lst =  wic.utils.flatten_forest(yaml_forest)
 
-    graph_gv = graphviz.Digraph(name=f'cluster_{yml_path}')
-    graph_gv.attr(newrank='True')
     graph_nx = nx.DiGraph()
     graphdata = GraphData(str(yml_path))
-    graph = GraphReps(graph_gv, graph_nx, graphdata)
+    graph = GraphReps(graph_nx, graphdata)
     is_root = True
     compiler_info = wic.compiler.compile_workflow(yaml_tree, get_args(str(yml_path)), [], [graph], {}, {}, {}, {},
                                                     tools_cwl, is_root, relative_run_path=False, testing=True)
@@ -180,11 +183,9 @@ def test_cwl_embedding_independence(yml_path_str: str, yml_path: Path) -> None:
         # If so, we will need to patch testargs depending on len(sub_node_data.namespaces)
         # (due to the various instances of `if len(namespaces) < args.graph_inline_depth`)
 
-        graph_fakeroot_gv = graphviz.Digraph(name=f'cluster_{sub_name}')
-        graph_fakeroot_gv.attr(newrank='True')
         graph_fakeroot_nx = nx.DiGraph()
         graphdata_fakeroot = GraphData(str(sub_name))
-        graph_fakeroot = GraphReps(graph_fakeroot_gv, graph_fakeroot_nx, graphdata_fakeroot)
+        graph_fakeroot = GraphReps(graph_fakeroot_nx, graphdata_fakeroot)
         fake_root = True
         compiler_info_fakeroot = wic.compiler.compile_workflow(sub_yaml_forest.yaml_tree, get_args(str(yml_path)),
             [], [graph_fakeroot], {}, {}, {}, {}, tools_cwl, fake_root, relative_run_path=False, testing=True)
@@ -237,8 +238,7 @@ def test_inline_subworkflows(yml_path_str: str, yml_path: Path) -> None:
     the original DAG and the inlined DAGs are isomorphic.
     """
     # Load the high-level yaml workflow file.
-    with open(yml_path, mode='r', encoding='utf-8') as y:
-        root_yaml_tree: Yaml = yaml.safe_load(y.read())
+    root_yaml_tree: Yaml = wic.utils_yaml.load_file(yml_path)
     Path('autogenerated/').mkdir(parents=True, exist_ok=True)
     wic_tag = {'wic': root_yaml_tree.get('wic', {})}
     plugin_ns = wic_tag['wic'].get('namespace', 'global')
@@ -255,11 +255,9 @@ def test_inline_subworkflows(yml_path_str: str, yml_path: Path) -> None:
     if namespaces_list == []:
         assert True # There's nothing to test
 
-    graph_gv = graphviz.Digraph(name=f'cluster_{yml_path}')
-    graph_gv.attr(newrank='True')
     graph_nx = nx.DiGraph()
     graphdata = GraphData(str(yml_path))
-    graph = GraphReps(graph_gv, graph_nx, graphdata)
+    graph = GraphReps(graph_nx, graphdata)
     compiler_info = wic.compiler.compile_workflow(yaml_tree, get_args(str(yml_path)), [], [graph], {}, {}, {}, {},
                                                     tools_cwl, True, relative_run_path=True, testing=True)
     rose_tree = compiler_info.rose
@@ -271,11 +269,9 @@ def test_inline_subworkflows(yml_path_str: str, yml_path: Path) -> None:
     for namespaces in namespaces_list:
         inline_yaml_tree = wic.ast.inline_subworkflow(yaml_tree, tools_cwl, namespaces)
 
-        inline_graph_gv = graphviz.Digraph(name=f'cluster_{yml_path}')
-        inline_graph_gv.attr(newrank='True')
         inline_graph_nx = nx.DiGraph()
         inline_graphdata = GraphData(str(yml_path))
-        inline_graph = GraphReps(inline_graph_gv, inline_graph_nx, inline_graphdata)
+        inline_graph = GraphReps(inline_graph_nx, inline_graphdata)
         inline_compiler_info = wic.compiler.compile_workflow(inline_yaml_tree, get_args(str(yml_path)),
             [], [inline_graph], {}, {}, {}, {}, tools_cwl, True, relative_run_path=True, testing=True)
         inline_rose_tree = inline_compiler_info.rose
@@ -288,3 +284,329 @@ def test_inline_subworkflows(yml_path_str: str, yml_path: Path) -> None:
         g_m = isomorphism.GraphMatcher(sub_graph_nx, sub_graph_fakeroot_nx)
         print('is_isomorphic()?', yml_path_str, namespaces)
         assert g_m.is_isomorphic() # See top-level comment above!
+
+
+@pytest.mark.fast
+def test_memoized_subworkflows(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    """Tests that reusing the compiled subworkflows which appear more than once in
+    a workflow (at different positions and depths) produces exactly the same CWL
+    files, inputs files, and graphs as compiling each of them.
+    """
+    ymls: Dict[str, Yaml] = {
+        'memo_sub': {'inputs': {'sub_message': {'type': 'string'}},
+                     'steps': [{'echo': {'in': {'message': '~sub_message'}}}, {'helloworld.yml': None}]},
+        'memo_wrap': {'steps': [{'memo_sub.yml': None}, {'echo': {'in': {'message': 'Wrap'}}}, {'memo_sub.yml': None}]},
+        'memo_root': {'steps': [{'memo_sub.yml': None}, {'memo_wrap.yml': None}, {'memo_wrap.yml': None},
+                                {'memo_sub.yml': None}]}}
+    yml_paths_memo = {**yml_paths, 'global': dict(yml_paths['global'])}
+    for stem, yml in ymls.items():
+        (tmp_path / f'{stem}.yml').write_text(wic.utils_yaml.dump(yml), encoding='utf-8')
+        yml_paths_memo['global'][stem] = tmp_path / f'{stem}.yml'
+    validator_memo = wic_schema.get_validator(tools_cwl, yaml_stems + list(ymls))
+
+    yml_path = tmp_path / 'memo_root.yml'
+    y_t = YamlTree(StepId('memo_root', 'global'), ymls['memo_root'])
+    yaml_tree_raw = wic.ast.read_ast_from_disk(y_t, yml_paths_memo, tools_cwl, validator_memo)
+    yaml_tree = wic.ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
+
+    def compile_files(relative_run_path: bool) -> List[str]:
+        graph = GraphReps(nx.DiGraph(), GraphData(str(yml_path)))
+        args = get_args(str(yml_path))
+        compiler_info = wic.compiler.compile_workflow(yaml_tree, args, [], [graph], {}, {}, {}, {},
+                                                      tools_cwl, True, relative_run_path, testing=False)
+        node_datas: List[NodeData] = wic.utils.flatten_rose_tree(compiler_info.rose)
+        files = [yaml.dump([node.namespaces, node.compiled_cwl, node.workflow_inputs_file,
+                            node.explicit_edge_defs, node.explicit_edge_calls],
+                           sort_keys=False, Dumper=wic.utils_yaml.NoAliasDumper) for node in node_datas]
+        graph_nx = compiler_info.rose.data.graph.networkx
+        graph_gv = wic.utils_graphs.graphdata_to_graphviz(graph.graphdata, args.graph_inline_depth)
+        env = compiler_info.env
+        return files + [graph_gv.source, yaml.dump([list(graph_nx.nodes), list(graph_nx.edges)]),
+                        yaml.dump([dict(env.input_mapping), dict(env.output_mapping), dict(env.inputs_file_workflow)])]
+
+    for relative_run_path in [True, False]:
+        files_memoized = compile_files(relative_run_path)
+        assert 'reusing' in capsys.readouterr().out
+        token = wic.reuse.memoize_subworkflows.set(False)
+        try:
+            files = compile_files(relative_run_path)
+        finally:
+            wic.reuse.memoize_subworkflows.reset(token)
+        assert 'reusing' not in capsys.readouterr().out
+        assert files_memoized == files
+
+
+@pytest.mark.fast
+@pytest.mark.parametrize("yml_path_str, yml_path", yml_paths_tuples_not_large)
+def test_compile_jobs_determinism(yml_path_str: str, yml_path: Path) -> None:
+    """Tests that compiling independent subworkflows in parallel (--compile_jobs)
+    produces exactly the same CWL files and inputs files as compiling serially.
+    """
+    # Load the high-level yaml workflow file.
+    root_yaml_tree: Yaml = wic.utils_yaml.load_file(yml_path)
+    wic_tag = {'wic': root_yaml_tree.get('wic', {})}
+    plugin_ns = wic_tag['wic'].get('namespace', 'global')
+    step_id = StepId(yml_path_str, plugin_ns)
+    y_t = YamlTree(step_id, root_yaml_tree)
+    yaml_tree_raw = wic.ast.read_ast_from_disk(y_t, yml_paths, tools_cwl, validator)
+    yaml_tree = wic.ast.merge_yml_trees(yaml_tree_raw, {}, tools_cwl)
+
+    def compile_files() -> List[str]:
+        graph = GraphReps(nx.DiGraph(), GraphData(str(yml_path)))
+        compiler_info = wic.compiler.compile_workflow(yaml_tree, get_args(str(yml_path)), [], [graph], {}, {}, {}, {},
+                                                      tools_cwl, True, relative_run_path=True, testing=True)
+        node_datas: List[NodeData] = wic.utils.flatten_rose_tree(compiler_info.rose)
+        return [yaml.dump(node.compiled_cwl) + yaml.dump(node.workflow_inputs_file) for node in node_datas]
+
+    files_serial = compile_files()
+    with wic.speculation.parallel_compilation(2, tools_cwl):
+        files_parallel = compile_files()
+
+    assert files_serial == files_parallel
+
+
+@pytest.mark.fast
+def test_collect_provenance_output_files(tmp_path: Path) -> None:
+    """Tests that the output files are copied into outdir/ using subdirectories
+    and that filename collisions (i.e. when scattering) are renamed _2, _3, etc.
+    """
+    provenance_dir = tmp_path / 'provenance' / 'workflow'
+    (tmp_path / 'provenance' / 'data').mkdir(parents=True)
+    provenance_dir.mkdir()
+    for i in range(3):
+        (tmp_path / 'provenance' / 'data' / f'{i}.pdb').write_text(str(i), encoding='utf-8')
+    output_json = {'wf__step__1__scatter___output_pdb_path':
+                   [{'class': 'File', 'location': f'../data/{i}.pdb', 'basename': 'out.pdb'} for i in range(3)]}
+    files = wic.utils.parse_provenance_output_files(output_json)
+
+    for hardlink in [False, True]:
+        outdir = tmp_path / f'outdir_{hardlink}'
+        dests = wic.utils.collect_provenance_output_files(files, provenance_dir, outdir, hardlink, 2)
+        assert dests[0] == outdir / 'wf' / 'step 1 scatter' / 'output_pdb_path' / 'out.pdb'
+        assert [dest.name for dest in dests] == ['out.pdb', 'out_2.pdb', 'out_3.pdb']
+        assert [dest.read_text(encoding='utf-8') for dest in dests] == ['0', '1', '2']
+
+
+@pytest.mark.fast
+def test_compile_server(tmp_path: Path) -> None:
+    """Tests that compiling using the compile server (--serve and --client)
+    produces exactly the same CWL files and inputs files as compiling directly.
+    """
+    argv = ['--yaml', str(yml_paths['global']['helloworld']), '--graph_render', 'none']
+    files = [Path('autogenerated/helloworld.cwl'), Path('autogenerated/helloworld_inputs.yml')]
+
+    sub.run([sys.executable, '-m', 'wic.main'] + argv, check=True)
+    contents_direct = [file.read_text(encoding='utf-8') for file in files]
+    for file in files:
+        file.unlink()
+
+    socket_path = tmp_path / 'wic.sock'
+    with sub.Popen([sys.executable, '-m', 'wic.main', '--serve', '--socket', str(socket_path)]) as proc:
+        try:
+            while not socket_path.exists():
+                assert proc.poll() is None
+                time.sleep(0.1)
+            # A bad request should not take down the server.
+            assert wic.client.run_client(['--yaml', 'does_not_exist.yml'], socket_path) == 1
+            assert wic.client.run_client(argv + ['--run_local'], socket_path) == 2
+            assert wic.client.run_client(argv, socket_path) == 0
+        finally:
+            proc.terminate()
+    assert not socket_path.exists()
+    assert [file.read_text(encoding='utf-8') for file in files] == contents_direct
+
+
+@pytest.mark.fast
+def test_api_compiler_threads() -> None:
+    """Tests that wic.api.Compiler produces exactly the same CWL files and inputs
+    files when compiling many workflows concurrently (in threads) as serially.
+    """
+    wic_compiler = wic.api.Compiler(tools_cwl, yml_paths)
+
+    def compile_files(yml: Path) -> List[str]:
+        rose_tree = wic_compiler.compile(yml)
+        node_datas: List[NodeData] = wic.utils.flatten_rose_tree(rose_tree)
+        return [yaml.dump(node.compiled_cwl) + yaml.dump(node.workflow_inputs_file) for node in node_datas]
+
+    files_serial = {}
+    for yml_path_str, yml_path in yml_paths_tuples_not_large:
+        try:
+            files_serial[yml_path] = compile_files(yml_path)
+        except (Exception, SystemExit):
+            pass  # i.e. some of the examples require tools which are not installed.
+    assert len(files_serial) > 0
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        files_threads = dict(zip(files_serial, executor.map(compile_files, files_serial)))
+    assert files_threads == files_serial
+
+    # Compiling the contents of a yml file should be equivalent to compiling the file.
+    yml_path = yml_paths['global']['helloworld']
+    rose_tree = wic_compiler.compile(wic.utils_yaml.load_file(yml_path), str(yml_path))
+    node_datas: List[NodeData] = wic.utils.flatten_rose_tree(rose_tree)
+    assert [yaml.dump(node.compiled_cwl) + yaml.dump(node.workflow_inputs_file)
+            for node in node_datas] == files_serial[yml_path]
+
+
+@pytest.mark.fast
+def test_namespace_path_threads() -> None:
+    """Tests that NamespacePath is still hash-consed (i.e. there is exactly one instance
+    per path) when paths are created concurrently (in threads), and that the cache of
+    parsed names is bounded.
+    """
+    names = [f'threads__step__{i}__a.yml___a__step__{j}__b' for i in range(64) for j in range(64)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(lambda names_: [NamespacePath.parse(name) for name in names_], [names] * 8))
+    for paths_ in paths:
+        assert all(path is path_ for path, path_ in zip(paths[0], paths_))
+    assert [str(path) for path in paths[0]] == names
+    assert len(NamespacePath._parsed) <= NamespacePath._parsed_max_size
+
+
+@pytest.mark.slow
+def test_wic_steps_dispatch() -> None:
+    """Tests that the validator which dispatches each workflow step on its name (see
+    wic_schema.wic_steps_keyword()) accepts exactly the same yml files as the anyOf
+    over all of the tools and workflows in wic.json, including invalid yml files.
+    """
+    ymls: List[Yaml] = []
+    for yml_path_str, yml_path in yml_paths_tuples:
+        # NOTE: Validating the wic: tag is expensive (for both validators) and does
+        # not involve the workflow steps, so only validate the rest of the yml file.
+        yml = {key: val for key, val in wic.utils_yaml.load_file(yml_path).items() if key != 'wic'}
+        ymls.append(yml)
+        steps = yml.get('steps', [])
+        if not (isinstance(steps, list) and steps and isinstance(steps[0], dict) and len(steps[0]) == 1):
+            continue
+        step_key = list(steps[0])[0]
+        step_val = steps[0][step_key] if isinstance(steps[0][step_key], dict) else {}
+        # i.e. An unknown step, a bad in: value, and a step which is not a single key.
+        mutations = [{'steps': [*steps, {'not_a_tool_or_workflow': None}]},
+                     {'steps': [{step_key: {**step_val, 'in': 42}}, *steps[1:]]},
+                     {'steps': [{**steps[0], 'extra_key': None}, *steps[1:]]}]
+        ymls += [{**copy.deepcopy(yml), **mutation} for mutation in mutations]
+
+    # The placeholder workflow schemas (see assemble_schema_store()) match any step, so also
+    # use workflow schemas which only match their own name, i.e. like the generated schemas.
+    named_schemas = {f'workflows/{yml_stem}.json': wic_schema.named_empty_schema(f'{yml_stem}.yml')
+                     for yml_stem in yaml_stems}
+    workflow_schemas: List[Dict[str, Json]] = [{}, named_schemas]
+    for schema_store in workflow_schemas:
+        wic_schema.assemble_schema_store(tools_cwl, yaml_stems, schema_store)
+        validator_dispatch = wic_schema.get_validator_from_schema_store(schema_store)
+        schema = schema_store['wic_main']
+        validator_any_of = Draft202012Validator(schema, resolver=RefResolver.from_schema(schema, store=schema_store))
+
+        results = [validator_any_of.is_valid(yml) for yml in ymls]
+        assert [validator_dispatch.is_valid(yml) for yml in ymls] == results
+        assert any(results) and (schema_store is workflow_schemas[0] or not all(results))
+
+
+def get_yml_paths_absolute() -> Dict[str, Dict[str, Path]]:
+    """Returns yml_paths with absolute paths, i.e. for tests which change the current working directory.
+
+    Returns:
+        Dict[str, Dict[str, Path]]: The absolute paths of the yml workflow definitions.
+    """
+    return {ns: {stem: path.absolute() for stem, path in paths.items()} for ns, paths in yml_paths.items()}
+
+
+@pytest.mark.fast
+def test_batch_compilation(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that compiling many root workflows using --yamls (which shares
+    the compiled subworkflows between the root workflows) produces exactly
+    the same CWL files and inputs files as compiling each using --yaml.
+    """
+    yml_paths_abs = get_yml_paths_absolute()
+    # NOTE: The compiled files are written to autogenerated/ (in the current working directory).
+    monkeypatch.chdir(tmp_path)
+    root_yml = {'steps': [{'echo': {'in': {'message': 'Root'}}}, {'helloworld.yml': None}]}
+    yaml_paths = []
+    for stem in ['batch_a', 'batch_b']:
+        (tmp_path / f'{stem}.yml').write_text(wic.utils_yaml.dump(root_yml), encoding='utf-8')
+        yaml_paths.append(str(tmp_path / f'{stem}.yml'))
+    files = [Path(f'autogenerated/{Path(yaml_path).stem}{suffix}')
+             for yaml_path in yaml_paths
+             for suffix in ['.cwl', '_inputs.yml', '__step__2__helloworld.yml/helloworld.cwl']]
+
+    for yaml_path in yaml_paths:
+        wic.main.compile_root_workflow(wic.cli.get_args(yaml_path, ['--graph_render', 'none']),
+                                       tools_cwl, yml_paths_abs, validator)
+    contents_direct = [file.read_text(encoding='utf-8') for file in files]
+
+    for jobs in ['1', '2']:
+        for file in files:
+            file.unlink()
+        args = wic.cli.get_args('', ['--yamls'] + yaml_paths + ['--graph_render', 'none', '--batch_jobs', jobs])
+        assert wic.batch.run_batch(args, tools_cwl, yml_paths_abs, validator) == 0
+        assert [file.read_text(encoding='utf-8') for file in files] == contents_direct
+        batch_summary = json.loads(wic.batch.batch_summary_file.read_text(encoding='utf-8'))
+        assert batch_summary['num_failed'] == 0
+        assert batch_summary['num_shared_subworkflows'] == 1
+
+
+@pytest.mark.fast
+def test_sweep(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Tests that --sweep_file writes one inputs file per row, which is the
+    compiled inputs file with the values of the row (if any) replaced.
+    """
+    # NOTE: The compiled files and the inputs files are written to autogenerated/
+    monkeypatch.chdir(tmp_path)
+    root_yml = {'inputs': {'msg': {'type': 'string'}},
+                'steps': [{'echo': {'in': {'message': '~msg'}}}, {'echo': {'in': {'message': 'Constant'}}}]}
+    yaml_path = tmp_path / 'sweep_hello.yml'
+    yaml_path.write_text(wic.utils_yaml.dump(root_yml), encoding='utf-8')
+    sweep_file = tmp_path / 'rows.csv'
+    sweep_file.write_text('msg,sweep_hello__step__2__echo___message\nhello 1,\nhello 2,override\n', encoding='utf-8')
+
+    args = wic.cli.get_args(str(yaml_path), ['--sweep_file', str(sweep_file), '--graph_render', 'none'])
+    rose_tree = wic.main.compile_root_workflow(args, tools_cwl, get_yml_paths_absolute(), validator)
+    assert wic.sweep.run_sweep(args, rose_tree) == 0
+    rows = [wic.utils_yaml.load_file(Path(f'autogenerated/sweep_hello_inputs_{i}.yml'), False) for i in [1, 2]]
+    assert rows == [{'msg': 'hello 1', 'sweep_hello__step__2__echo___message': 'Constant'},
+                    {'msg': 'hello 2', 'sweep_hello__step__2__echo___message': 'override'}]
+
+    # Unknown inputs and missing required inputs are errors.
+    for contents in ['msg,bogus\nhello,1\n', '{"sweep_hello__step__2__echo___message": "x"}\n']:
+        sweep_file = tmp_path / ('rows.csv' if contents.startswith('msg') else 'rows.jsonl')
+        sweep_file.write_text(contents, encoding='utf-8')
+        args.sweep_file = str(sweep_file)
+        assert wic.sweep.run_sweep(args, rose_tree) == 1
+
+
+@pytest.mark.fast
+def test_write_to_disk_unchanged(tmp_path: Path) -> None:
+    """Tests that write_to_disk() only writes the files whose contents have changed,
+    and that the files it writes have the usual (or their existing) permissions.
+    """
+    yml_path = yml_paths['global']['helloworld']
+    rose_tree = wic.api.Compiler(tools_cwl, yml_paths).compile(yml_path)
+    files = [tmp_path / 'helloworld.cwl', tmp_path / 'helloworld_inputs.yml']
+
+    assert wic.utils.write_to_disk(rose_tree, tmp_path, relative_run_path=True) == (2, 0)
+    assert [stat.S_IMODE(file.stat().st_mode) for file in files] == [0o666 & ~wic.utils.umask] * 2
+    mtimes = [file.stat().st_mtime_ns for file in files]
+    assert wic.utils.write_to_disk(rose_tree, tmp_path, relative_run_path=True, max_workers=2) == (0, 2)
+    assert [file.stat().st_mtime_ns for file in files] == mtimes
+
+    # Files which were modified (or deleted) since they were written are written again.
+    files[0].write_text('modified', encoding='utf-8')
+    files[0].chmod(0o640)
+    files[1].unlink()
+    assert wic.utils.write_to_disk(rose_tree, tmp_path, relative_run_path=True) == (2, 0)
+    assert files[0].read_text(encoding='utf-8').startswith('#!/usr/bin/env cwl-runner')
+    assert stat.S_IMODE(files[0].stat().st_mode) == 0o640
+
+
+@pytest.mark.fast
+def test_compile_root_workflow_backends() -> None:
+    """Tests that compile_root_workflow() (which also writes the _tree_raw.yml and
+    _tree_merged.yml debugging files) works for workflows which use backends,
+    i.e. whose yml ASTs contain StepId keys.
+    """
+    yml_path = yml_paths['global']['cwl_watcher_analysis']
+    args = wic.cli.get_args(str(yml_path), ['--graph_render', 'none'])
+    rose_tree = wic.main.compile_root_workflow(args, tools_cwl, yml_paths, validator)
+    assert Path('autogenerated/cwl_watcher_analysis.cwl').exists()
+    assert Path('autogenerated/cwl_watcher_analysis_inputs.yml').exists()
+    assert rose_tree.data.name == 'cwl_watcher_analysis'